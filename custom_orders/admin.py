@@ -6,6 +6,7 @@ from django import forms
 from django.db.models import DecimalField
 from decimal import Decimal, InvalidOperation
 import re
+from spiritbead.paginators import EstimatedCountPaginator
 from .models import CustomOrderRequest
 from .utils import send_approval_email, send_rejection_email, send_shipped_email
 
@@ -106,13 +107,21 @@ class CustomOrderRequestAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'email', 'status', 'quoted_price', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['name', 'email', 'description']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'images_display', 'completion_images_display', 'stripe_payment_link']
+    readonly_fields = [
+        'id', 'created_at', 'updated_at', 'images_display', 'original_images_display',
+        'completion_images_display', 'stripe_payment_link',
+    ]
+    # A select of every order would load the whole orders table on each change page
+    raw_id_fields = ['related_order']
+    list_select_related = ['related_order']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         ('Customer Information', {
             'fields': ('name', 'email')
         }),
         ('Request Details', {
-            'fields': ('description', 'colors', 'images_display')
+            'fields': ('description', 'colors', 'images_display', 'original_images_display')
         }),
         ('Completion Photos', {
             'fields': ('completion_images', 'completion_images_display'),
@@ -149,6 +158,21 @@ class CustomOrderRequestAdmin(admin.ModelAdmin):
         return mark_safe(images_html)
     images_display.short_description = 'Images'
 
+    def original_images_display(self, obj):
+        if obj.images_pending:
+            return "Images are being optimized"
+        if not obj.original_images:
+            return "No originals (images were not optimized)"
+        images_html = ""
+        for i, img in enumerate(obj.original_images):
+            if isinstance(img, str):
+                images_html += format_html('<div style="margin: 5px;"><a href="{}" target="_blank" rel="noopener">Original {}</a></div>', img, i + 1)
+            else:
+                images_html += format_html('<div style="margin: 5px;">Original {} (invalid format)</div>', i + 1)
+        from django.utils.safestring import mark_safe
+        return mark_safe(images_html)
+    original_images_display.short_description = 'Original Uploads'
+
     def completion_images_display(self, obj):
         if not obj.completion_images:
             return "No completion photos"
@@ -188,8 +212,7 @@ class CustomOrderRequestAdmin(admin.ModelAdmin):
             # Generate Stripe payment link
             try:
                 from django.conf import settings
-                import stripe
-                stripe.api_key = settings.STRIPE_SECRET_KEY
+                from payments.stripe import stripe
 
                 # Create a Payment Link in Stripe
                 payment_link = stripe.PaymentLink.create(
@@ -0,0 +1,174 @@
+"""
+Optimized copies of custom order reference photos.
+
+Uploads are stored as sent (often multi-megabyte phone JPEGs with EXIF). The
+process_custom_order_images worker re-encodes each request's images in a
+process pool: auto-oriented, stripped of metadata, downsized to
+CUSTOM_ORDER_IMAGE_MAX_SIZE and saved as WebP under custom_orders/optimized/.
+Requests are claimed with a short lease (CUSTOM_ORDER_IMAGE_CLAIM_LEASE) and
+their images processed outside any transaction. Then, in one short transaction
+per request, ``images`` are pointed at the copies, ``original_images`` keep the
+uploads and the admin notification (with the small copies attached) is queued.
+"""
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import CustomOrderRequest
+from .utils import send_new_request_notification
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZED_DIR = 'custom_orders/optimized'
+
+
+def _render_webp(source, max_size, quality):
+    """Decode ``source`` at reduced size and return it as WebP bytes, without metadata."""
+    with Image.open(source) as img:
+        # For JPEGs, let the decoder downscale while reading instead of decoding full size
+        img.draft('RGB', (max_size, max_size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_size, max_size))
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        output = BytesIO()
+        # No exif/icc_profile arguments, so none of the upload's metadata is kept
+        img.save(output, format='WEBP', quality=quality, method=4)
+        return output.getvalue()
+
+
+def optimize_image(name, max_size, quality):
+    """
+    Write the optimized copy of stored image ``name`` and return its storage name.
+    Runs in a worker process.
+    """
+    with default_storage.open(name, 'rb') as source:
+        content = _render_webp(source, max_size, quality)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return default_storage.save(f"{OPTIMIZED_DIR}/{stem}.webp", ContentFile(content))
+
+
+def _storage_name(url):
+    """Storage name of an uploaded image URL, or None if it isn't one of ours."""
+    if url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
+    return None
+
+
+def claim_pending_requests(limit):
+    """
+    Claim up to ``limit`` requests whose images are waiting, oldest first.
+
+    Claimed requests are leased for CUSTOM_ORDER_IMAGE_CLAIM_LEASE seconds; if a
+    worker dies mid-batch they become claimable again when the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        requests = list(
+            CustomOrderRequest.objects.select_for_update(skip_locked=True)
+            .filter(images_pending=True)
+            .filter(Q(images_claimed_until__isnull=True) | Q(images_claimed_until__lte=now))
+            .order_by('created_at')[:limit]
+        )
+        CustomOrderRequest.objects.filter(pk__in=[r.pk for r in requests]).update(
+            images_claimed_until=now + timedelta(seconds=settings.CUSTOM_ORDER_IMAGE_CLAIM_LEASE),
+        )
+    return requests
+
+
+def _finish_request(request_id, optimized):
+    """
+    Point a request's images at their optimized copies (``optimized`` maps
+    upload URL to copy URL, or None if it failed) and notify the admin.
+    Returns (images, failed) counts, or None if another worker already did it.
+    """
+    with transaction.atomic():
+        custom_request = (
+            CustomOrderRequest.objects.select_for_update()
+            .filter(pk=request_id, images_pending=True)
+            .first()
+        )
+        if custom_request is None:
+            # Finished by a worker that claimed it after this one's lease ran out
+            return None
+
+        images = failed = 0
+        urls = []
+        for url in custom_request.images:
+            if optimized.get(url):
+                urls.append(optimized[url])
+                images += 1
+                continue
+            # Not one of our uploads, or it couldn't be processed: keep the original
+            urls.append(url)
+            if url in optimized:
+                failed += 1
+
+        custom_request.original_images = custom_request.images
+        custom_request.images = urls
+        custom_request.images_pending = False
+        custom_request.images_claimed_until = None
+        custom_request.save(
+            update_fields=['images', 'original_images', 'images_pending', 'images_claimed_until', 'updated_at']
+        )
+        send_new_request_notification(custom_request)
+    return images, failed
+
+
+def process_pending_requests(pool, batch_size=20):
+    """
+    Optimize the images of up to ``batch_size`` requests waiting for it, using
+    the ``pool`` executor, then notify the admin of each request.
+
+    No transaction is open while the pool works: the requests are claimed
+    first, and each one's results written afterwards. An image that can't be
+    processed keeps its original URL. Returns a dict of counts: requests,
+    images and failed.
+    """
+    max_size = settings.CUSTOM_ORDER_IMAGE_MAX_SIZE
+    quality = settings.CUSTOM_ORDER_IMAGE_QUALITY
+    stats = {'requests': 0, 'images': 0, 'failed': 0}
+
+    requests = claim_pending_requests(batch_size)
+    if not requests:
+        return stats
+
+    # Every image of the batch goes to the pool at once
+    futures = {}
+    for custom_request in requests:
+        for url in custom_request.images:
+            name = _storage_name(url)
+            if name and url not in futures:
+                futures[url] = pool.submit(optimize_image, name, max_size, quality)
+
+    optimized = {}
+    for url, future in futures.items():
+        try:
+            optimized[url] = f"{settings.MEDIA_URL}{future.result()}"
+        except Exception as e:
+            logger.warning(f"Could not optimize custom order image {url}: {e}")
+            optimized[url] = None
+
+    for custom_request in requests:
+        counts = _finish_request(custom_request.pk, optimized)
+        if counts is None:
+            continue
+        stats['requests'] += 1
+        stats['images'] += counts[0]
+        stats['failed'] += counts[1]
+
+    logger.info(
+        f"Optimized {stats['images']} image(s) of {stats['requests']} custom order request(s), "
+        f"{stats['failed']} failed"
+    )
+    return stats
@@ -0,0 +1,79 @@
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from custom_orders import views
+from custom_orders.uploads import MAX_FILE_SIZE, MAX_FILES
+
+JPEG_HEADER = b'\xFF\xD8\xFF\xE0\x00\x10JFIF\x00'
+
+
+class Command(BaseCommand):
+    help = 'Measure peak Python memory of a custom order request with the maximum number and size of images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--files',
+            type=int,
+            default=MAX_FILES,
+            help=f'Images per request (default: {MAX_FILES})'
+        )
+        parser.add_argument(
+            '--file-size',
+            type=int,
+            default=MAX_FILE_SIZE,
+            help=f'Bytes per image; also run at an eighth of this to show peak memory does not grow with it '
+                 f'(default: {MAX_FILE_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['files'] <= MAX_FILES:
+            raise CommandError(f"--files must be between 1 and {MAX_FILES}")
+        if not len(JPEG_HEADER) <= options['file_size'] <= MAX_FILE_SIZE:
+            raise CommandError(f"--file-size must be between {len(JPEG_HEADER)} and {MAX_FILE_SIZE}")
+
+        for file_size in (options['file_size'] // 8, options['file_size']):
+            file_size = max(file_size, len(JPEG_HEADER))
+            peak, elapsed = self.measure(options['files'], file_size)
+            upload = options['files'] * file_size
+            self.stdout.write(
+                f"{options['files']} x {file_size / (1024 * 1024):4.1f}MB images ({upload / (1024 * 1024):5.1f}MB): "
+                f"peak {peak / (1024 * 1024):5.2f}MB ({peak / upload:6.1%} of the upload) in {elapsed:5.2f}s"
+            )
+
+    def measure(self, files, file_size):
+        content = JPEG_HEADER + bytes(file_size - len(JPEG_HEADER))
+        body = encode_multipart(BOUNDARY, {
+            'name': 'Benchmark',
+            'email': 'bench@example.com',
+            'description': 'Upload memory benchmark request',
+            'images': [SimpleUploadedFile(f'photo{i}.jpg', content, 'image/jpeg') for i in range(files)],
+        })
+        del content
+        # The request body itself (held by the test client's fake input) is allocated before measuring
+        request = RequestFactory().generic('POST', '/api/custom-orders/', body, content_type=MULTIPART_CONTENT)
+        del body
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(views, 'send_new_request_notification'), transaction.atomic():
+            tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                response = views.submit_custom_order_request(request)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+                # As the request cycle does: closes the (already moved) temporary files
+                request.close()
+                transaction.set_rollback(True)
+            if response.status_code != 201:
+                raise CommandError(f"Upload failed: {response.data}")
+        return peak, elapsed
@@ -0,0 +1,66 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from custom_orders.images import process_pending_requests
+
+
+class Command(BaseCommand):
+    help = 'Optimize uploaded custom order images (WebP, resized, no metadata) and notify the admin of new requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.CUSTOM_ORDER_IMAGE_WORKERS,
+            help=f'Processes decoding and encoding images (default: {settings.CUSTOM_ORDER_IMAGE_WORKERS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Maximum requests processed per poll (default: 20)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait when no request is waiting (default: 5.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the requests that are currently waiting, then exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        self.stdout.write(f"Optimizing custom order images with {options['workers']} process(es)...")
+
+        requests = images = failed = 0
+        # Fresh interpreters rather than forks of this one (and its database connection)
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            while True:
+                stats = process_pending_requests(pool, batch_size=options['batch_size'])
+                requests += stats['requests']
+                images += stats['images']
+                failed += stats['failed']
+                if stats['requests']:
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Optimized {images} image(s) of {requests} request(s), {failed} failed"
+        ))
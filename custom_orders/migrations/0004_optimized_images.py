@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_orders", "0003_customorderrequest_completion_images"),
+        ("orders", "0013_shipping_address_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customorderrequest",
+            name="images_pending",
+            field=models.BooleanField(
+                default=False,
+                help_text="Uploaded images are waiting to be optimized (and the admin notified)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="customorderrequest",
+            name="original_images",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Image URLs as uploaded, kept for archival once images point at the optimized copies",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customorderrequest",
+            index=models.Index(
+                condition=models.Q(("images_pending", True)),
+                fields=["created_at"],
+                name="custom_order_pending_img_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_orders", "0004_optimized_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customorderrequest",
+            name="images_claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Lease of the image worker processing the images; claimable again once it passes",
+                null=True,
+            ),
+        ),
+    ]
@@ -20,6 +20,21 @@ class CustomOrderRequest(models.Model):
     description = models.TextField()
     colors = models.CharField(max_length=200, blank=True, null=True)
     images = models.JSONField(default=list, help_text="List of image URLs")
+    original_images = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Image URLs as uploaded, kept for archival once images point at the optimized copies"
+    )
+    images_pending = models.BooleanField(
+        default=False,
+        help_text="Uploaded images are waiting to be optimized (and the admin notified)"
+    )
+    images_claimed_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Lease of the image worker processing the images; claimable again once it passes"
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
@@ -63,6 +78,14 @@ class CustomOrderRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The image worker's queue
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(images_pending=True),
+                name='custom_order_pending_img_idx',
+            ),
+        ]
         verbose_name = 'Custom Order Request'
         verbose_name_plural = 'Custom Order Requests'
 
@@ -1,3 +1,230 @@
-from django.test import TestCase
+import os
+import tempfile
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from notifications.models import OutboundEmail
+from orders.models import Order
+from . import views
+from .images import claim_pending_requests, process_pending_requests
+from .models import CustomOrderRequest
+from .uploads import MAX_FILE_SIZE, MAX_FILES
+
+
+class CustomOrderRequestAdminQueryCountTests(TestCase):
+    """The custom order changelist and change page run a fixed number of queries however many rows exist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def make_request(self):
+        order = Order.objects.create(
+            id=uuid.uuid4(),
+            stripe_session_id=f'cs_test_{uuid.uuid4().hex}',
+            amount_total=4000,
+            is_custom_order=True,
+        )
+        return CustomOrderRequest.objects.create(
+            name='Sam', email='sam@example.com', description='Blue and gold beads',
+            status='paid', related_order=order,
+        )
+
+    def count_queries(self, url):
+        self.client.get(url)  # Warm per-process caches such as content types
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:custom_orders_customorderrequest_changelist')
+        self.make_request()
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_request()
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_change_page_queries_do_not_grow_with_orders(self):
+        custom_order = self.make_request()
+        url = reverse('admin:custom_orders_customorderrequest_change', args=[custom_order.pk])
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_request()
+        self.assertEqual(self.count_queries(url), few)
+
+
+class CustomOrderUploadTests(TestCase):
+    """Images are checked as they stream in and never held in memory whole."""
+
+    JPEG = b'\xFF\xD8\xFF\xE0\x00\x10JFIF\x00'
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root.name
+
+    def form(self, *images):
+        return {
+            'name': 'Sam',
+            'email': 'sam@example.com',
+            'description': 'Blue and gold beads please',
+            'images': [SimpleUploadedFile(f'photo{i}.jpg', content) for i, content in enumerate(images)],
+        }
+
+    def submit(self, *images):
+        return self.client.post(reverse('submit_custom_order_request'), self.form(*images))
+
+    def saved_files(self):
+        directory = os.path.join(self.media_root, 'custom_orders')
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def test_saves_images_by_sniffed_type(self):
+        response = self.submit(self.JPEG + b'rest', b'GIF89a' + bytes(100))
+        self.assertEqual(response.status_code, 201)
+        custom_request = CustomOrderRequest.objects.get()
+        self.assertEqual([os.path.splitext(url)[1] for url in custom_request.images], ['.jpg', '.gif'])
+        self.assertEqual(len(self.saved_files()), 2)
+
+    def test_rejects_bad_images_before_saving(self):
+        cases = [
+            ((self.JPEG, b'<html>not an image</html>'), "Image 2 is not a valid image type"),
+            ((self.JPEG + bytes(MAX_FILE_SIZE),), "Image 1 exceeds 7MB limit"),
+            ((self.JPEG,) * (MAX_FILES + 1), f"Maximum {MAX_FILES} images allowed"),
+        ]
+        for images, error in cases:
+            with self.subTest(error=error):
+                response = self.submit(*images)
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.json()['error'].startswith(error))
+        self.assertFalse(CustomOrderRequest.objects.exists())
+        self.assertEqual(self.saved_files(), [])
+
+    def test_peak_memory_does_not_grow_with_file_size(self):
+        def peak(file_size):
+            body = encode_multipart(BOUNDARY, self.form(*[self.JPEG + bytes(file_size)] * 3))
+            request = RequestFactory().generic('POST', '/api/custom-orders/', body, content_type=MULTIPART_CONTENT)
+            del body
+            tracemalloc.start()
+            try:
+                response = views.submit_custom_order_request(request)
+                _, peak_bytes = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+                request.close()
+            self.assertEqual(response.status_code, 201)
+            return peak_bytes
+
+        small, large = peak(256 * 1024), peak(MAX_FILE_SIZE - 1024)
+        self.assertLess(large, 2 * 1024 * 1024)
+        self.assertLess(large, small * 2)
+
+
+@override_settings(CUSTOM_ORDER_IMAGE_MAX_SIZE=800, CUSTOM_ORDER_IMAGE_QUALITY=80)
+class CustomOrderImageOptimizationTests(TestCase):
+    """Uploaded images are replaced by small WebP copies before the admin is notified."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root.name
+        # Threads rather than processes, so the workers see the settings overrides
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+
+    def phone_photo(self):
+        """A landscape-encoded JPEG whose EXIF says to rotate it to portrait."""
+        img = Image.effect_noise((2000, 1500), 64).convert('RGB')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 clockwise
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=95, exif=exif)
+        return output.getvalue()
+
+    def submit(self, *images):
+        return self.client.post(reverse('submit_custom_order_request'), {
+            'name': 'Sam',
+            'email': 'sam@example.com',
+            'description': 'Blue and gold beads please',
+            'images': [SimpleUploadedFile(f'photo{i}.jpg', content) for i, content in enumerate(images)],
+        })
+
+    def path(self, url):
+        return os.path.join(self.media_root, url[len('/media/'):])
+
+    def test_images_are_optimized_before_notifying(self):
+        photo = self.phone_photo()
+        self.assertEqual(self.submit(photo, b'GIF89a' + bytes(100)).status_code, 201)
+        custom_request = CustomOrderRequest.objects.get()
+        self.assertTrue(custom_request.images_pending)
+        self.assertFalse(OutboundEmail.objects.exists())
+        uploads = custom_request.images
+
+        stats = process_pending_requests(self.pool)
+
+        # The GIF is only a header, so it keeps its original URL
+        self.assertEqual(stats, {'requests': 1, 'images': 1, 'failed': 1})
+        custom_request.refresh_from_db()
+        self.assertFalse(custom_request.images_pending)
+        self.assertEqual(custom_request.original_images, uploads)
+        self.assertEqual(custom_request.images[1], uploads[1])
+
+        optimized = custom_request.images[0]
+        self.assertTrue(optimized.startswith('/media/custom_orders/optimized/'))
+        self.assertTrue(optimized.endswith('.webp'))
+        with Image.open(self.path(optimized)) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.size, (600, 800))
+            self.assertNotIn('exif', img.info)
+        self.assertLess(os.path.getsize(self.path(optimized)), len(photo) / 4)
+        # The upload itself is kept
+        with open(self.path(uploads[0]), 'rb') as f:
+            self.assertEqual(f.read(), photo)
+
+        email = OutboundEmail.objects.get(kind='custom_new_request')
+        self.assertIn(optimized, email.html_body)
+        self.assertEqual([a['filename'] for a in email.attachments][:1], [os.path.basename(optimized)])
+
+        # Nothing is left waiting
+        self.assertEqual(process_pending_requests(self.pool), {'requests': 0, 'images': 0, 'failed': 0})
+
+    def test_claimed_requests_are_leased(self):
+        self.submit(self.phone_photo())
+        self.assertEqual(len(claim_pending_requests(10)), 1)
+        # Another worker skips it while the lease lasts
+        self.assertEqual(claim_pending_requests(10), [])
+        self.assertEqual(process_pending_requests(self.pool), {'requests': 0, 'images': 0, 'failed': 0})
+
+        # A worker that died leaves it to be claimed again once the lease runs out
+        CustomOrderRequest.objects.update(images_claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(process_pending_requests(self.pool), {'requests': 1, 'images': 1, 'failed': 0})
+        custom_request = CustomOrderRequest.objects.get()
+        self.assertFalse(custom_request.images_pending)
+        self.assertIsNone(custom_request.images_claimed_until)
+
+    def test_requests_without_images_are_notified_immediately(self):
+        self.assertEqual(self.submit().status_code, 201)
+        self.assertFalse(CustomOrderRequest.objects.get().images_pending)
+        self.assertTrue(OutboundEmail.objects.filter(kind='custom_new_request').exists())
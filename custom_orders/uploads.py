@@ -0,0 +1,128 @@
+"""
+Streaming upload handling for custom order reference images.
+
+ImageUploadHandler replaces Django's upload handlers for the custom order
+form. Each image is spooled to a temporary file a chunk at a time and
+checked as its bytes arrive: the type is sniffed from the first few bytes and
+the size and number of files are enforced as they grow, so a bad file is
+rejected (and the rest of it discarded unread) without ever being held in
+memory. The view then hands the temporary files to storage, which moves or
+copies them in chunks, so peak memory doesn't depend on the file sizes.
+"""
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+MAX_FILE_SIZE = 7 * 1024 * 1024  # 7MB per file
+MAX_FILES = 10
+# Room for the text fields and multipart framing on top of the images
+MAX_FORM_OVERHEAD = 1024 * 1024
+
+ALLOWED_IMAGE_TYPES = {
+    'jpeg': '.jpg',
+    'png': '.png',
+    'webp': '.webp',
+    'gif': '.gif',
+}
+
+# Bytes needed to tell the allowed types apart (WebP's marker is at 8-11)
+HEADER_SIZE = 12
+
+
+def detect_image_type(file_content):
+    """Detect image type from file header bytes."""
+    # Image file signatures (magic numbers)
+    signatures = {
+        b'\xFF\xD8\xFF': 'jpeg',
+        b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A': 'png',
+        b'RIFF': 'webp',  # WebP starts with RIFF and has WEBP in bytes 8-11
+        b'GIF87a': 'gif',
+        b'GIF89a': 'gif',
+    }
+
+    for signature, img_type in signatures.items():
+        if file_content.startswith(signature):
+            # Additional check for WebP
+            if img_type == 'webp' and len(file_content) >= 12:
+                if file_content[8:12] != b'WEBP':
+                    continue
+            return img_type
+
+    return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools files from the ``images`` field to disk, rejecting them as soon as
+    they break a limit. Problems are collected in ``errors`` (messages for
+    the client) rather than raised, and rejected files are left out of
+    request.FILES. Accepted files get an ``image_type`` attribute.
+    """
+    field_name = 'images'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.errors = []
+        self.file_count = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > MAX_FILES * MAX_FILE_SIZE + MAX_FORM_OVERHEAD:
+            self.errors.append(
+                f"The upload is too large: at most {MAX_FILES} images of {MAX_FILE_SIZE // (1024*1024)}MB each"
+            )
+            # Treat the body as empty rather than reading any of it
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, *args, **kwargs):
+        # The parser closes (deleting) whatever ``file`` refers to when a file is skipped,
+        # so don't leave the previous, accepted file there
+        if hasattr(self, 'file'):
+            del self.file
+        if field_name != self.field_name:
+            raise SkipFile()
+
+        self.file_count += 1
+        if self.file_count > MAX_FILES:
+            self._reject(f"Maximum {MAX_FILES} images allowed")
+        super().new_file(field_name, *args, **kwargs)
+        self.header = b''
+        self.image_type = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_FILE_SIZE:
+            self._reject(f"Image {self.file_count} exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit")
+
+        if self.image_type is None and len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE and not self._check_type():
+                self._reject(self._type_error())
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        # Files shorter than the header are only checked now
+        if self.image_type is None and not self._check_type():
+            self.errors.append(self._type_error())
+            self.file.close()
+            return None
+        uploaded = super().file_complete(file_size)
+        uploaded.image_type = self.image_type
+        return uploaded
+
+    def _check_type(self):
+        image_type = detect_image_type(self.header)
+        if image_type in ALLOWED_IMAGE_TYPES:
+            self.image_type = image_type
+        return self.image_type is not None
+
+    def _type_error(self):
+        return (
+            f"Image {self.file_count} is not a valid image type. "
+            f"Allowed: {', '.join(ALLOWED_IMAGE_TYPES.keys())}"
+        )
+
+    def _reject(self, message):
+        self.errors.append(message)
+        # The parser closes (and so deletes) the partial file and discards the rest of it unread
+        raise SkipFile()
@@ -1,13 +1,27 @@
-import mimetypes
 import os
 
-from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
 
+from notifications.outbox import file_attachment, queue_email
+
+
+def _media_attachments(image_urls):
+    """Attachments for uploaded images referenced by MEDIA_URL that exist on disk."""
+    attachments = []
+    for image_path in image_urls or []:
+        # Convert /media/custom_orders/filename.jpg to absolute path
+        if image_path.startswith(settings.MEDIA_URL):
+            relative_path = image_path[len(settings.MEDIA_URL):]
+            absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+
+            if os.path.exists(absolute_path):
+                attachments.append(file_attachment(absolute_path))
+    return attachments
+
 
 def send_new_request_notification(custom_request):
-    """Send email notification to admin about new custom order request"""
+    """Queue email notification to admin about new custom order request"""
     subject = f'New Custom Order Request from {custom_request.name}'
 
     html_message = render_to_string('custom_orders/new_request_email.html', {
@@ -18,32 +32,18 @@ def send_new_request_notification(custom_request):
         'images': custom_request.images,
     })
 
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
+    return queue_email(
+        'custom_new_request',
+        subject,
+        html_message,
         to=[settings.DEFAULT_FROM_EMAIL],  # Admin receives notification
+        # Attach images if they exist
+        attachments=_media_attachments(custom_request.images),
     )
-    email.content_subtype = 'html'
-
-    # Attach images if they exist
-    for image_path in custom_request.images or []:
-        # Convert /media/custom_orders/filename.jpg to absolute path
-        if image_path.startswith(settings.MEDIA_URL):
-            relative_path = image_path[len(settings.MEDIA_URL):]
-            absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-
-            if os.path.exists(absolute_path):
-                filename = os.path.basename(absolute_path)
-                mime_type, _ = mimetypes.guess_type(absolute_path)
-                with open(absolute_path, 'rb') as f:
-                    email.attach(filename, f.read(), mime_type or 'application/octet-stream')
-
-    email.send(fail_silently=False)
 
 
 def send_approval_email(custom_request):
-    """Send email to customer when custom order is approved with payment link"""
+    """Queue email to customer when custom order is approved with payment link"""
     subject = f'Your Custom Order Request Has Been Approved!'
 
     html_message = render_to_string('custom_orders/approved_email.html', {
@@ -55,18 +55,11 @@ def send_approval_email(custom_request):
         'reference_images': custom_request.images,  # Reference images from original request
     })
 
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[custom_request.email],
-    )
-    email.content_subtype = 'html'
-    email.send(fail_silently=False)
+    return queue_email('custom_approved', subject, html_message, to=[custom_request.email])
 
 
 def send_payment_confirmation_email(custom_request, order):
-    """Send email to customer confirming payment was received"""
+    """Queue email to customer confirming payment was received"""
     subject = 'Payment Received - Your Custom Order is in Production!'
 
     html_message = render_to_string('custom_orders/payment_received_email.html', {
@@ -79,18 +72,11 @@ def send_payment_confirmation_email(custom_request, order):
         'product_image': None,  # Product doesn't exist yet - custom piece to be made
     })
 
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[custom_request.email],
-    )
-    email.content_subtype = 'html'
-    email.send(fail_silently=False)
+    return queue_email('custom_payment_received', subject, html_message, to=[custom_request.email])
 
 
 def send_rejection_email(custom_request):
-    """Send email to customer when custom order is rejected"""
+    """Queue email to customer when custom order is rejected"""
     subject = 'Update on Your Custom Order Request'
 
     html_message = render_to_string('custom_orders/rejected_email.html', {
@@ -100,18 +86,11 @@ def send_rejection_email(custom_request):
         'rejection_reason': custom_request.admin_notes,
     })
 
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[custom_request.email],
-    )
-    email.content_subtype = 'html'
-    email.send(fail_silently=False)
+    return queue_email('custom_rejected', subject, html_message, to=[custom_request.email])
 
 
 def send_shipped_email(custom_request, order, tracking_number=None, carrier='USPS'):
-    """Send email to customer when custom order ships"""
+    """Queue email to customer when custom order ships"""
     subject = 'Your Custom Order Has Shipped!'
 
     html_message = render_to_string('custom_orders/shipped_email.html', {
@@ -125,24 +104,11 @@ def send_shipped_email(custom_request, order, tracking_number=None, carrier='USP
         'product_image': custom_request.completion_images if custom_request.completion_images else None,
     })
 
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
+    return queue_email(
+        'custom_shipped',
+        subject,
+        html_message,
         to=[custom_request.email],
+        # Attach completion photos if they exist
+        attachments=_media_attachments(custom_request.completion_images),
     )
-    email.content_subtype = 'html'
-
-    # Attach completion photos if they exist
-    for image_path in custom_request.completion_images or []:
-        if image_path.startswith(settings.MEDIA_URL):
-            relative_path = image_path[len(settings.MEDIA_URL):]
-            absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-
-            if os.path.exists(absolute_path):
-                filename = os.path.basename(absolute_path)
-                mime_type, _ = mimetypes.guess_type(absolute_path)
-                with open(absolute_path, 'rb') as f:
-                    email.attach(filename, f.read(), mime_type or 'application/octet-stream')
-
-    email.send(fail_silently=False)
@@ -8,30 +8,12 @@ from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.conf import settings
 from .models import CustomOrderRequest
+from .uploads import ALLOWED_IMAGE_TYPES, ImageUploadHandler
 from .utils import send_new_request_notification
 import json
+import logging
 
-
-def detect_image_type(file_content):
-    """Detect image type from file header bytes."""
-    # Image file signatures (magic numbers)
-    signatures = {
-        b'\xFF\xD8\xFF': 'jpeg',
-        b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A': 'png',
-        b'RIFF': 'webp',  # WebP starts with RIFF and has WEBP in bytes 8-11
-        b'GIF87a': 'gif',
-        b'GIF89a': 'gif',
-    }
-
-    for signature, img_type in signatures.items():
-        if file_content.startswith(signature):
-            # Additional check for WebP
-            if img_type == 'webp' and len(file_content) >= 12:
-                if file_content[8:12] != b'WEBP':
-                    continue
-            return img_type
-
-    return None
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -54,16 +36,21 @@ def submit_custom_order_request(request):
     content_type = request.content_type or ''
 
     if 'multipart/form-data' in content_type:
-        # Handle file uploads via FormData
-        return _handle_formdata_upload(request)
+        # Handle file uploads via FormData, streamed to disk and checked as they arrive
+        upload_handler = ImageUploadHandler(request)
+        request.upload_handlers = [upload_handler]
+        return _handle_formdata_upload(request, upload_handler)
     else:
         # Handle JSON payload (backward compatibility)
         return _handle_json_upload(request)
 
 
-def _handle_formdata_upload(request):
+def _handle_formdata_upload(request, upload_handler):
     """Handle multipart/form-data file uploads"""
-    from django.core.files.uploadedfile import InMemoryUploadedFile
+    # Parsing the form runs the upload handler, which spools and checks the images
+    uploaded_files = request.FILES.getlist('images')
+    if upload_handler.errors:
+        return Response({"error": upload_handler.errors[0]}, status=400)
 
     # Validate required fields
     required_fields = ['name', 'email', 'description']
@@ -92,45 +79,9 @@ def _handle_formdata_upload(request):
 
     # Handle file uploads
     images = []
-    uploaded_files = request.FILES.getlist('images')
-
-    # File upload restrictions
-    MAX_FILE_SIZE = 7 * 1024 * 1024  # 7MB per file
-    MAX_FILES = 10
-    ALLOWED_IMAGE_TYPES = {
-        'jpeg': '.jpg',
-        'png': '.png',
-        'webp': '.webp',
-        'gif': '.gif',
-    }
-
-    if len(uploaded_files) > MAX_FILES:
-        return Response(
-            {"error": f"Maximum {MAX_FILES} images allowed"},
-            status=400
-        )
-
     for i, uploaded_file in enumerate(uploaded_files):
-        # Check file size
-        if uploaded_file.size > MAX_FILE_SIZE:
-            return Response(
-                {"error": f"Image {i+1} exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit"},
-                status=400
-            )
-
-        # Validate image type by reading file content
-        file_content = uploaded_file.read()
-        uploaded_file.seek(0)  # Reset pointer
-
-        image_type = detect_image_type(file_content)
-        if image_type not in ALLOWED_IMAGE_TYPES:
-            return Response(
-                {"error": f"Image {i+1} is not a valid image type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES.keys())}"},
-                status=400
-            )
-
-        # Save file to media/custom_orders/
-        filename = f"{uuid.uuid4()}{ALLOWED_IMAGE_TYPES[image_type]}"
+        # Save file to media/custom_orders/; storage moves or copies the spooled file in chunks
+        filename = f"{uuid.uuid4()}{ALLOWED_IMAGE_TYPES[uploaded_file.image_type]}"
         save_path = os.path.join('custom_orders', filename)
 
         try:
@@ -138,7 +89,7 @@ def _handle_formdata_upload(request):
             # Store relative URL that can be accessed via MEDIA_URL
             images.append(f"{settings.MEDIA_URL}{saved_path}")
         except Exception as e:
-            print(f"Error saving image {i+1}: {e}")
+            logger.exception(f"Error saving custom order image {i+1}: {e}")
             return Response(
                 {"error": f"Failed to save image {i+1}"},
                 status=500
@@ -153,21 +104,24 @@ def _handle_formdata_upload(request):
             description=description,
             colors=colors,
             images=images,
+            # process_custom_order_images optimizes them, then notifies the admin
+            images_pending=bool(images),
             status='pending'
         )
     except Exception as e:
-        print(f"Error creating custom order request: {e}")
+        logger.exception(f"Error creating custom order request: {e}")
         return Response(
             {"error": "Failed to create request", "details": str(e)},
             status=500
         )
 
-    # Send email notification to admin
-    try:
-        send_new_request_notification(custom_request)
-    except Exception as e:
-        print(f"Error sending email notification: {e}")
-        # Don't fail the request if email fails
+    # Send email notification to admin (requests with images are notified once they're optimized)
+    if not custom_request.images_pending:
+        try:
+            send_new_request_notification(custom_request)
+        except Exception as e:
+            logger.exception(f"Error sending new request notification for {custom_request.id}: {e}")
+            # Don't fail the request if email fails
 
     return Response({
         "success": True,
@@ -238,7 +192,7 @@ def _handle_json_upload(request):
             status='pending'
         )
     except Exception as e:
-        print(f"Error creating custom order request: {e}")
+        logger.exception(f"Error creating custom order request: {e}")
         return Response(
             {"error": "Failed to create request", "details": str(e)},
             status=500
@@ -248,7 +202,7 @@ def _handle_json_upload(request):
     try:
         send_new_request_notification(custom_request)
     except Exception as e:
-        print(f"Error sending email notification: {e}")
+        logger.exception(f"Error sending new request notification for {custom_request.id}: {e}")
         # Don't fail the request if email fails
 
     return Response({
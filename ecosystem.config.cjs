@@ -9,12 +9,87 @@ module.exports = {
     watch: false,
     max_memory_restart: '1G',
     env: {
-      DJANGO_SETTINGS_MODULE: 'spiritbead.settings'
+      DJANGO_SETTINGS_MODULE: 'spiritbead.settings',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
     },
     log_file: '/var/www/spirit-bead-backend/logs/combined.log',
     out_file: '/var/www/spirit-bead-backend/logs/out.log',
     error_file: '/var/www/spirit-bead-backend/logs/error.log',
     log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
     merge_logs: true
+  }, {
+    name: 'spirit-bead-webhooks',
+    script: '/var/www/spirit-bead-backend/venv/bin/python',
+    args: 'manage.py process_webhook_events',
+    cwd: '/var/www/spirit-bead-backend',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      DJANGO_SETTINGS_MODULE: 'spiritbead.settings',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    },
+    log_file: '/var/www/spirit-bead-backend/logs/webhooks-combined.log',
+    out_file: '/var/www/spirit-bead-backend/logs/webhooks-out.log',
+    error_file: '/var/www/spirit-bead-backend/logs/webhooks-error.log',
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true
+  }, {
+    name: 'spirit-bead-emails',
+    script: '/var/www/spirit-bead-backend/venv/bin/python',
+    args: 'manage.py send_queued_emails',
+    cwd: '/var/www/spirit-bead-backend',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      DJANGO_SETTINGS_MODULE: 'spiritbead.settings',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    },
+    log_file: '/var/www/spirit-bead-backend/logs/emails-combined.log',
+    out_file: '/var/www/spirit-bead-backend/logs/emails-out.log',
+    error_file: '/var/www/spirit-bead-backend/logs/emails-error.log',
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true
+  }, {
+    name: 'spirit-bead-view-counts',
+    script: '/var/www/spirit-bead-backend/venv/bin/python',
+    args: 'manage.py flush_view_counts',
+    cwd: '/var/www/spirit-bead-backend',
+    instances: 1,
+    autorestart: true,
+    // Exits with 0 when there's no shared cache (REDIS_URL) to flush from; don't restart it then
+    stop_exit_codes: [0],
+    watch: false,
+    max_memory_restart: '256M',
+    env: {
+      DJANGO_SETTINGS_MODULE: 'spiritbead.settings',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    },
+    log_file: '/var/www/spirit-bead-backend/logs/view-counts-combined.log',
+    out_file: '/var/www/spirit-bead-backend/logs/view-counts-out.log',
+    error_file: '/var/www/spirit-bead-backend/logs/view-counts-error.log',
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true
+  }, {
+    name: 'spirit-bead-custom-order-images',
+    script: '/var/www/spirit-bead-backend/venv/bin/python',
+    args: 'manage.py process_custom_order_images',
+    cwd: '/var/www/spirit-bead-backend',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      DJANGO_SETTINGS_MODULE: 'spiritbead.settings',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    },
+    log_file: '/var/www/spirit-bead-backend/logs/custom-order-images-combined.log',
+    out_file: '/var/www/spirit-bead-backend/logs/custom-order-images-out.log',
+    error_file: '/var/www/spirit-bead-backend/logs/custom-order-images-error.log',
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true
   }]
 };
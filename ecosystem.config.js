@@ -9,7 +9,62 @@ module.exports = {
     watch: false,
     max_memory_restart: '1G',
     env: {
-      NODE_ENV: 'production'
+      NODE_ENV: 'production',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    }
+  }, {
+    name: 'spirit-beads-webhooks',
+    script: './venv/bin/python',
+    args: 'manage.py process_webhook_events',
+    cwd: '/var/www/spirit-beads-service',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      NODE_ENV: 'production',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    }
+  }, {
+    name: 'spirit-beads-emails',
+    script: './venv/bin/python',
+    args: 'manage.py send_queued_emails',
+    cwd: '/var/www/spirit-beads-service',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      NODE_ENV: 'production',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    }
+  }, {
+    name: 'spirit-beads-view-counts',
+    script: './venv/bin/python',
+    args: 'manage.py flush_view_counts',
+    cwd: '/var/www/spirit-beads-service',
+    instances: 1,
+    autorestart: true,
+    // Exits with 0 when there's no shared cache (REDIS_URL) to flush from; don't restart it then
+    stop_exit_codes: [0],
+    watch: false,
+    max_memory_restart: '256M',
+    env: {
+      NODE_ENV: 'production',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
+    }
+  }, {
+    name: 'spirit-beads-custom-order-images',
+    script: './venv/bin/python',
+    args: 'manage.py process_custom_order_images',
+    cwd: '/var/www/spirit-beads-service',
+    instances: 1,
+    autorestart: true,
+    watch: false,
+    max_memory_restart: '512M',
+    env: {
+      NODE_ENV: 'production',
+      MEDIA_BASE_URL: 'https://spirit-beads.keycasey.com'
     }
   }]
 };
@@ -0,0 +1,47 @@
+from django.contrib import admin
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import OutboundEmail
+from .outbox import render_merge
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'recipients', 'subject', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['subject', 'message_id']
+    readonly_fields = [
+        'kind', 'subject', 'from_email', 'to', 'cc', 'attachments', 'html_preview', 'batch_key', 'status',
+        'attempts', 'last_error', 'message_id', 'created_at', 'next_attempt_at', 'sent_at',
+    ]
+    exclude = ['html_body', 'merge_data']
+    actions = ['retry_emails']
+
+    def has_add_permission(self, request):
+        return False
+
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+    recipients.short_description = 'To'
+
+    def html_preview(self, obj):
+        return format_html(
+            '<iframe srcdoc="{}" style="width: 100%; height: 500px; border: 1px solid #ccc;"></iframe>',
+            render_merge(obj.html_body, obj.merge_data)
+        )
+    html_preview.short_description = 'Body'
+
+    def retry_emails(self, request, queryset):
+        """Requeue failed or dead-lettered emails for immediate delivery"""
+        count = queryset.filter(status__in=['failed', 'dead']).update(
+            status='queued',
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(
+            request,
+            f"Requeued {count} email(s)",
+            messages.SUCCESS if count > 0 else messages.WARNING
+        )
+    retry_emails.short_description = "Retry selected failed/dead-lettered emails"
@@ -0,0 +1,40 @@
+import copy
+
+from django.core.mail.backends.locmem import EmailBackend
+
+from .outbox import render_merge
+
+# Every send call made through BatchRecordingBackend: {'subject', 'to', 'merge_data'}
+batches = []
+
+
+class BatchRecordingBackend(EmailBackend):
+    """
+    Local stand-in for the Mailgun batch transport, for tests and development.
+
+    Each send call is recorded in ``notifications.backends.batches``; batch
+    messages are then expanded into one message per recipient (placeholders
+    filled from ``merge_data``, as Mailgun does) and stored in ``mail.outbox``.
+    """
+    supports_merge_data = True
+
+    def send_messages(self, messages):
+        expanded = []
+        for message in messages:
+            merge_data = getattr(message, 'merge_data', None)
+            batches.append({
+                'subject': message.subject,
+                'to': list(message.to),
+                'merge_data': merge_data,
+            })
+            if not merge_data:
+                expanded.append(message)
+                continue
+            for recipient in message.to:
+                single = copy.copy(message)
+                single.to = [recipient]
+                single.body = render_merge(message.body, merge_data.get(recipient, {}))
+                single.merge_data = None
+                expanded.append(single)
+        super().send_messages(expanded)
+        return len(messages)
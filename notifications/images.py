@@ -0,0 +1,104 @@
+"""
+Email-sized copies of product and order photos.
+
+Emails reference small derivatives by absolute URL (or embed them, when there
+is no public media URL) instead of attaching the full-size uploads. Each derivative is generated once, named by the hash of its
+contents (so its URL never serves different bytes and can be cached forever),
+and remembered in the cache keyed by the source file's name, size and mtime.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .outbox import file_attachment
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'email'
+
+
+def _render_thumbnail(source, max_size):
+    """Decode ``source`` at reduced size and return (bytes, extension) for the email copy."""
+    with Image.open(source) as img:
+        # For JPEGs, let the decoder downscale while reading instead of decoding full size
+        img.draft('RGB', (max_size, max_size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_size, max_size))
+
+        output = BytesIO()
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha:
+            img.save(output, format='PNG', optimize=True)
+            return output.getvalue(), 'png'
+        img.convert('RGB').save(output, format='JPEG', quality=82, optimize=True, progressive=True)
+        return output.getvalue(), 'jpg'
+
+
+def email_thumbnail(image_field):
+    """
+    Storage name of the email-sized copy of an ImageField file, creating it if needed.
+    Returns None if there is no image or it can't be read.
+    """
+    if not image_field:
+        return None
+
+    max_size = settings.EMAIL_IMAGE_MAX_SIZE
+    storage = image_field.storage
+    try:
+        modified = storage.get_modified_time(image_field.name).timestamp()
+        size = storage.size(image_field.name)
+    except (OSError, NotImplementedError) as e:
+        logger.warning(f"Email image source {image_field.name} unavailable: {e}")
+        return None
+
+    cache_key = f"email-thumbnail:{image_field.name}:{size}:{modified}:{max_size}"
+    name = cache.get(cache_key)
+    if name and default_storage.exists(name):
+        return name
+
+    try:
+        with storage.open(image_field.name, 'rb') as source:
+            content, extension = _render_thumbnail(source, max_size)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not make email image from {image_field.name}: {e}")
+        return None
+
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    name = f"{THUMBNAIL_DIR}/{digest}.{extension}"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    cache.set(cache_key, name, None)
+    return name
+
+
+def absolute_media_url(name):
+    """Public URL of a stored file, for use outside the site (e.g. in email)."""
+    url = default_storage.url(name)
+    if url.startswith(('http://', 'https://')):
+        return url
+    return f"{settings.MEDIA_BASE_URL.rstrip('/')}{url}"
+
+
+def email_image(image_field, content_id):
+    """
+    Image reference for an email template.
+
+    Returns ``(src, attachment)``: normally the thumbnail's absolute URL and no
+    attachment. With EMAIL_EMBED_IMAGES, or when there is no MEDIA_BASE_URL to
+    link to, the thumbnail is embedded instead: ``cid:<content_id>`` plus the
+    attachment to queue with the email. Returns ``(None, None)`` when there is
+    no usable image.
+    """
+    name = email_thumbnail(image_field)
+    if name is None:
+        return None, None
+
+    if settings.EMAIL_EMBED_IMAGES or not settings.MEDIA_BASE_URL:
+        return f'cid:{content_id}', file_attachment(default_storage.path(name), content_id=content_id)
+    return absolute_media_url(name), None
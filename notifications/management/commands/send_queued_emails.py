@@ -0,0 +1,80 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.outbox import claim_due_emails, deliver_batch, plan_batches
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued transactional emails from the outbox, with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EMAIL_WORKERS,
+            help=f'Maximum emails sent concurrently, one backend connection each (default: {settings.EMAIL_WORKERS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Maximum emails claimed per poll; emails sharing a template are batch-sent together (default: 1000)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the outbox is empty (default: 2.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send the emails that are currently due, then exit'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.stdout.write(f"Sending queued emails with {workers} worker(s)...")
+
+        # Connections stay open across sends so the HTTP session to the provider is reused
+        connections = queue.Queue()
+        for _ in range(workers):
+            connection = get_connection()
+            connection.open()
+            connections.put(connection)
+
+        def send(batch):
+            connection = connections.get()
+            try:
+                return deliver_batch(batch, connection)
+            finally:
+                connections.put(connection)
+                close_old_connections()
+
+        sent = failed = calls = 0
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email') as pool:
+                while True:
+                    emails = claim_due_emails(options['batch_size'])
+                    if emails:
+                        batches = plan_batches(emails)
+                        for batch, batch_sent in zip(batches, pool.map(send, batches)):
+                            sent += batch_sent
+                            failed += len(batch) - batch_sent
+                        calls += len(batches)
+                        continue
+
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        finally:
+            while not connections.empty():
+                connections.get().close()
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} email(s) in {calls} batch(es), {failed} failed"))
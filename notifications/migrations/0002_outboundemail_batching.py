@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboundemail",
+            name="batch_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Emails with the same key share a body and can be sent in one batch call",
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboundemail",
+            name="merge_data",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Per-recipient values for the body's %recipient.<field>% placeholders",
+            ),
+        ),
+    ]
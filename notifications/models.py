@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox of rendered transactional emails.
+
+    Request paths only insert here (in the same transaction as the change that
+    triggered the email); send_queued_emails delivers them in the background
+    with retries, and records the outcome per message.
+    """
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed - will retry"),
+        ("dead", "Dead-lettered"),
+    )
+
+    kind = models.CharField(max_length=50, help_text="Which email this is, e.g. order_confirmation")
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list, blank=True)
+    html_body = models.TextField()
+    attachments = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Files read at send time: [{path, filename, mimetype, content_id}]; "
+                  "entries with a content_id are embedded inline"
+    )
+
+    batch_key = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Emails with the same key share a body and can be sent in one batch call"
+    )
+    merge_data = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Per-recipient values for the body's %recipient.<field>% placeholders"
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    message_id = models.CharField(max_length=255, blank=True, help_text="Id assigned by the email provider")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {', '.join(self.to)} - {self.status}"
@@ -0,0 +1,298 @@
+"""
+Transactional email outbox.
+
+Code that sends mail renders the message and calls ``queue_email``, which only
+inserts an OutboundEmail row; nothing on a request path talks to Mailgun.
+The send_queued_emails worker claims due rows, delivers them over a small pool
+of long-lived email backend connections, and retries failures with backoff.
+
+Emails queued with ``queue_templated_email`` are rendered with
+``%recipient.<field>%`` placeholders for the values that differ per recipient,
+so ones that come out identical share a batch key. The worker sends each such
+group as one Mailgun batch send (Anymail ``merge_data``), up to
+EMAIL_BATCH_SIZE recipients per API call.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from datetime import timedelta
+from email.mime.image import MIMEImage
+
+from anymail.backends.base import AnymailBaseBackend
+from anymail.exceptions import AnymailInvalidAddress, AnymailRecipientsRefused
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import conditional_escape
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Retrying these can't succeed, so they are dead-lettered straight away
+PERMANENT_ERRORS = (AnymailInvalidAddress, AnymailRecipientsRefused)
+
+
+def file_attachment(path, content_id=None):
+    """Describe a file to attach at send time; with a content_id it is embedded inline as cid:<content_id>."""
+    mime_type, _ = mimetypes.guess_type(path)
+    return {
+        'path': path,
+        'filename': os.path.basename(path),
+        'mimetype': mime_type or 'application/octet-stream',
+        'content_id': content_id,
+    }
+
+
+def queue_email(kind, subject, html_body, to, cc=None, attachments=None, from_email=None,
+                batch_key='', merge_data=None, commit=True):
+    """
+    Store a rendered HTML email for background delivery.
+    Returns the OutboundEmail, or None if there is no one to send it to.
+    With ``commit=False`` the email is returned unsaved, for ``queue_emails``.
+    """
+    to = [address for address in to if address]
+    if not to:
+        logger.warning(f"Not queueing {kind} email: no recipient")
+        return None
+
+    outbound = OutboundEmail(
+        kind=kind,
+        subject=subject,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=to,
+        cc=[address for address in cc or [] if address],
+        html_body=html_body,
+        attachments=list(attachments or []),
+        batch_key=batch_key,
+        merge_data=merge_data or {},
+    )
+    if commit:
+        outbound.save()
+        logger.info(f"Queued {kind} email {outbound.id}")
+    return outbound
+
+
+def queue_emails(emails, batch_size=500):
+    """Queue many unsaved emails (from ``commit=False``) with bulk inserts. Returns the number queued."""
+    emails = [outbound for outbound in emails if outbound is not None]
+    OutboundEmail.objects.bulk_create(emails, batch_size=batch_size)
+    if emails:
+        logger.info(f"Queued {len(emails)} {emails[0].kind} email(s)")
+    return len(emails)
+
+
+_MERGE_FIELD = re.compile(r'%recipient\.(\w+)%')
+
+
+def render_merge(text, merge_data):
+    """Fill in %recipient.<field>% placeholders, as Mailgun does for batch sends."""
+    return _MERGE_FIELD.sub(lambda match: str(merge_data.get(match.group(1), '')), text)
+
+
+def queue_templated_email(kind, subject, template_name, context, to, merge_fields=(), attachments=None,
+                          commit=True):
+    """
+    Queue an email that can go out in a batch with others rendered from the same template.
+
+    Truthy values of ``merge_fields`` are rendered as %recipient.<field>%
+    placeholders and stored (HTML-escaped) as the email's merge data; falsy ones
+    are rendered as-is so ``{% if %}`` blocks still work. Emails whose
+    placeholder bodies come out identical share a batch key. Emails with more
+    than one recipient or with attachments are never batched.
+    """
+    to = [address for address in to if address]
+    merge_data = {
+        field: str(conditional_escape(context[field]))
+        for field in merge_fields
+        if context.get(field)
+    }
+    placeholders = {field: f'%recipient.{field}%' for field in merge_data}
+    html_body = render_to_string(template_name, {**context, **placeholders})
+
+    batch_key = ''
+    if len(to) == 1 and not attachments:
+        digest = hashlib.sha256(f"{subject}\0{html_body}".encode()).hexdigest()[:32]
+        batch_key = f"{kind}:{digest}"
+
+    return queue_email(
+        kind, subject, html_body, to,
+        attachments=attachments, batch_key=batch_key, merge_data=merge_data, commit=commit,
+    )
+
+
+def build_message(outbound, connection=None):
+    """Turn an outbox row back into an EmailMessage, reading its attachments from disk."""
+    email = EmailMessage(
+        subject=outbound.subject,
+        body=render_merge(outbound.html_body, outbound.merge_data),
+        from_email=outbound.from_email,
+        to=outbound.to,
+        cc=outbound.cc,
+        connection=connection,
+    )
+    email.content_subtype = 'html'
+
+    for attachment in outbound.attachments:
+        path = attachment['path']
+        if not os.path.exists(path):
+            logger.warning(f"Attachment {path} for email {outbound.id} no longer exists - skipping it")
+            continue
+        with open(path, 'rb') as f:
+            content = f.read()
+        if attachment.get('content_id'):
+            img = MIMEImage(content)
+            img.add_header('Content-ID', f"<{attachment['content_id']}>")
+            img.add_header('Content-Disposition', 'inline', filename=attachment['filename'])
+            email.attach(img)
+        else:
+            email.attach(attachment['filename'], content, attachment['mimetype'])
+
+    return email
+
+
+def _retry_delay(attempts):
+    # Exponential backoff: 1m, 2m, 4m ... capped at one hour
+    return timedelta(seconds=min(60 * (2 ** (attempts - 1)), 3600))
+
+
+def claim_due_emails(limit):
+    """
+    Claim up to ``limit`` emails that are due, oldest first.
+
+    Claimed rows are leased for EMAIL_CLAIM_LEASE seconds; rows left in
+    "sending" by a worker that died become due again when the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=("queued", "failed", "sending"), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:limit]
+        )
+        OutboundEmail.objects.filter(pk__in=[e.pk for e in emails]).update(
+            status="sending",
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_CLAIM_LEASE),
+        )
+    return emails
+
+
+def _record_sent(outbound, message_id):
+    outbound.message_id = (message_id or '')[:255]
+    outbound.status = "sent"
+    outbound.sent_at = timezone.now()
+    outbound.last_error = ""
+    outbound.save(update_fields=["attempts", "status", "sent_at", "last_error", "message_id"])
+
+
+def _record_failure(outbound, error, permanent=False):
+    outbound.last_error = error
+    if permanent or outbound.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        outbound.status = "dead"
+    else:
+        outbound.status = "failed"
+        outbound.next_attempt_at = timezone.now() + _retry_delay(outbound.attempts)
+    outbound.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def _message_id(status):
+    # Anymail reports one id, or a set when recipients were given different ids
+    message_id = getattr(status, 'message_id', None)
+    if isinstance(message_id, set):
+        message_id = ','.join(sorted(message_id))
+    return message_id
+
+
+def deliver(outbound, connection):
+    """
+    Send one claimed email over an open backend connection and record the outcome.
+    Returns True if it was sent; failures are rescheduled or dead-lettered.
+    """
+    outbound.attempts += 1
+    try:
+        message = build_message(outbound, connection)
+        message.send(fail_silently=False)
+    except Exception as e:
+        logger.exception(f"Sending {outbound.kind} email {outbound.id} failed: {e}")
+        _record_failure(outbound, f"{type(e).__name__}: {e}", permanent=isinstance(e, PERMANENT_ERRORS))
+        return False
+
+    _record_sent(outbound, _message_id(getattr(message, 'anymail_status', None)))
+    return True
+
+
+def supports_batch_send(connection):
+    """Whether the backend sends one message per recipient from ``merge_data`` (Anymail, or a test stand-in)."""
+    return getattr(connection, 'supports_merge_data', isinstance(connection, AnymailBaseBackend))
+
+
+def plan_batches(emails, batch_size=None):
+    """
+    Split claimed emails into send calls: lists of emails that share a batch key,
+    with at most ``batch_size`` recipients and no recipient twice (merge data is
+    keyed by address), and single-email lists for everything else.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    calls = []
+    open_batches = {}
+    for outbound in emails:
+        if not outbound.batch_key:
+            calls.append([outbound])
+            continue
+        recipient = outbound.to[0]
+        for batch in open_batches.setdefault(outbound.batch_key, []):
+            if len(batch) < batch_size and all(other.to[0] != recipient for other in batch):
+                batch.append(outbound)
+                break
+        else:
+            batch = [outbound]
+            open_batches[outbound.batch_key].append(batch)
+            calls.append(batch)
+    return calls
+
+
+def deliver_batch(emails, connection):
+    """
+    Send emails sharing a batch key as one batch call and record each outcome.
+    Falls back to one send per email when the backend can't batch.
+    Returns the number of emails sent.
+    """
+    if len(emails) == 1 or not supports_batch_send(connection):
+        return sum(deliver(outbound, connection) for outbound in emails)
+
+    first = emails[0]
+    for outbound in emails:
+        outbound.attempts += 1
+    try:
+        message = EmailMessage(
+            subject=first.subject,
+            body=first.html_body,  # Placeholders are filled in by the provider per recipient
+            from_email=first.from_email,
+            to=[outbound.to[0] for outbound in emails],
+            connection=connection,
+        )
+        message.content_subtype = 'html'
+        message.merge_data = {outbound.to[0]: outbound.merge_data for outbound in emails}
+        message.send(fail_silently=False)
+    except Exception as e:
+        logger.exception(f"Batch send of {len(emails)} {first.kind} email(s) failed: {e}")
+        for outbound in emails:
+            _record_failure(outbound, f"{type(e).__name__}: {e}", permanent=isinstance(e, PERMANENT_ERRORS))
+        return 0
+
+    status = getattr(message, 'anymail_status', None)
+    recipients = getattr(status, 'recipients', None) or {}
+    sent = 0
+    for outbound in emails:
+        recipient_status = recipients.get(outbound.to[0])
+        if recipient_status is not None and recipient_status.status in ('rejected', 'invalid', 'failed'):
+            _record_failure(outbound, f"Recipient {recipient_status.status}", permanent=True)
+            continue
+        _record_sent(outbound, getattr(recipient_status, 'message_id', None) or _message_id(status))
+        sent += 1
+    logger.info(f"Batch sent {sent}/{len(emails)} {first.kind} email(s) in one call")
+    return sent
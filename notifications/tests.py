@@ -0,0 +1,207 @@
+import tempfile
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from anymail.exceptions import AnymailInvalidAddress
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from notifications import backends
+from notifications.images import email_image
+from notifications.outbox import claim_due_emails, deliver, queue_email
+from notifications.models import OutboundEmail
+from orders.models import Order, OrderItem
+from orders.utils import send_order_shipped_email
+from products.models import Product
+
+
+@override_settings(EMAIL_BACKEND='notifications.backends.BatchRecordingBackend', EMAIL_BATCH_SIZE=100)
+class ShippedEmailBatchingTests(TransactionTestCase):
+    ORDER_COUNT = 250
+
+    def setUp(self):
+        backends.batches.clear()
+        mail.outbox = []
+        product = Product.objects.bulk_create([
+            Product(id='batch-product', name='Sunset Lighter Case', slug='batch-product', price=4000)
+        ])[0]
+        emails = [f'customer{i}@example.com' for i in range(self.ORDER_COUNT)]
+        # One customer has two orders shipping the same day
+        emails.append(emails[0])
+        self.orders = Order.objects.bulk_create([
+            Order(
+                id=uuid.uuid4(),
+                stripe_session_id=f'cs_batch_{i}',
+                amount_total=4000,
+                status='shipped',
+                customer_email=email,
+                shipping_address={'name': f'Customer <{i}>'},
+                tracking_number=f'9400TRACK{i:05d}',
+                shipped_at=timezone.now(),
+            )
+            for i, email in enumerate(emails)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, unit_price=4000, quantity=1 + i % 3)
+            for i, order in enumerate(self.orders)
+        ])
+
+    def test_shipped_emails_go_out_in_batch_sends(self):
+        for order in self.orders:
+            send_order_shipped_email(order)
+        self.assertEqual(OutboundEmail.objects.values('batch_key').distinct().count(), 1)
+
+        call_command('send_queued_emails', once=True, workers=2, stdout=StringIO())
+
+        self.assertEqual(len(backends.batches), 3)
+        for batch in backends.batches:
+            self.assertLessEqual(len(batch['to']), 100)
+            self.assertEqual(len(set(batch['to'])), len(batch['to']))
+        self.assertEqual(OutboundEmail.objects.filter(status='sent').count(), len(self.orders))
+
+        self.assertEqual(len(mail.outbox), len(self.orders))
+        for message in mail.outbox:
+            self.assertNotIn('%recipient.', message.body)
+        tracking_numbers = sorted(
+            order.tracking_number for order in self.orders if order.customer_email == 'customer0@example.com'
+        )
+        bodies = [message.body for message in mail.outbox if message.to == ['customer0@example.com']]
+        self.assertEqual(len(bodies), 2)
+        for tracking_number in tracking_numbers:
+            self.assertEqual(sum(tracking_number in body for body in bodies), 1)
+        # Per-recipient values are escaped before the provider substitutes them
+        self.assertTrue(any('Customer &lt;1&gt;' in message.body for message in mail.outbox))
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_backends_without_batch_support_send_individually(self):
+        for order in self.orders[:5]:
+            send_order_shipped_email(order)
+
+        call_command('send_queued_emails', once=True, workers=1, stdout=StringIO())
+
+        self.assertEqual(backends.batches, [])
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn(self.orders[3].tracking_number, mail.outbox[3].body)
+        self.assertNotIn('%recipient.', mail.outbox[3].body)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_CLAIM_LEASE=300,
+                   EMAIL_MAX_ATTEMPTS=3)
+class OutboxTests(TransactionTestCase):
+    """Queued emails are claimed under a lease, sent once, and retried with backoff until dead-lettered."""
+
+    def setUp(self):
+        mail.outbox = []
+
+    def queue(self, to='customer@example.com'):
+        return queue_email('order_confirmation', 'Your order', '<p>Thanks</p>', to=[to])
+
+    def failing_connection(self, error):
+        return mock.Mock(send_messages=mock.Mock(side_effect=error))
+
+    def test_claims_are_leased(self):
+        outbound = self.queue()
+
+        self.assertEqual(claim_due_emails(10), [outbound])
+        outbound.refresh_from_db()
+        self.assertEqual(outbound.status, 'sending')
+        self.assertAlmostEqual(
+            (outbound.next_attempt_at - timezone.now()).total_seconds(), 300, delta=5
+        )
+        # Still leased to the first worker
+        self.assertEqual(claim_due_emails(10), [])
+
+        # The worker died: once the lease runs out the email is claimed again
+        OutboundEmail.objects.filter(pk=outbound.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_due_emails(10), [outbound])
+
+    def test_send_failures_back_off_then_dead_letter(self):
+        outbound = self.queue()
+        connection = self.failing_connection(ConnectionError('mailgun down'))
+
+        delays = []
+        for _ in range(3):
+            before = timezone.now()
+            self.assertFalse(deliver(outbound, connection))
+            delays.append(round((outbound.next_attempt_at - before).total_seconds()))
+
+        outbound.refresh_from_db()
+        self.assertEqual(delays[:2], [60, 120])
+        self.assertEqual((outbound.status, outbound.attempts), ('dead', 3))
+        self.assertEqual(outbound.last_error, 'ConnectionError: mailgun down')
+        # Not due any more
+        self.assertEqual(claim_due_emails(10), [])
+
+    def test_invalid_addresses_are_dead_lettered_at_once(self):
+        outbound = self.queue()
+
+        self.assertFalse(deliver(outbound, self.failing_connection(AnymailInvalidAddress('bad address'))))
+
+        outbound.refresh_from_db()
+        self.assertEqual((outbound.status, outbound.attempts), ('dead', 1))
+
+    def test_worker_sends_due_emails_once(self):
+        outbound = self.queue()
+        retry_later = self.queue('later@example.com')
+        OutboundEmail.objects.filter(pk=retry_later.pk).update(
+            status='failed', next_attempt_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        for _ in range(2):
+            call_command('send_queued_emails', once=True, workers=1, stdout=StringIO())
+
+        outbound.refresh_from_db()
+        self.assertEqual((outbound.status, outbound.attempts, outbound.last_error), ('sent', 1, ''))
+        self.assertIsNotNone(outbound.sent_at)
+        self.assertEqual([message.to for message in mail.outbox], [['customer@example.com']])
+        self.assertEqual(OutboundEmail.objects.get(pk=retry_later.pk).status, 'failed')
+
+    def test_rolled_back_emails_are_never_sent(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.queue()
+            raise RuntimeError('order could not be saved')
+
+        call_command('send_queued_emails', once=True, workers=1, stdout=StringIO())
+
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual(mail.outbox, [])
+
+
+class EmailImageTests(TestCase):
+    """Email images link to MEDIA_BASE_URL, and are embedded when EMAIL_EMBED_IMAGES opts in or it is unset."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        photo = BytesIO()
+        Image.new('RGB', (1200, 900), 'orange').save(photo, format='JPEG')
+        self.product = Product(id='image-product', name='Image', slug='image-product', price=4000)
+        self.product.primary_image.save('photo.jpg', SimpleUploadedFile('photo.jpg', photo.getvalue()), save=False)
+
+    def test_links_to_media_base_url(self):
+        with override_settings(MEDIA_BASE_URL='https://api.example.com', EMAIL_EMBED_IMAGES=False):
+            src, attachment = email_image(self.product.primary_image, content_id='product0')
+        self.assertTrue(src.startswith('https://api.example.com/media/email/'))
+        self.assertIsNone(attachment)
+
+    def test_embeds_when_opted_in(self):
+        with override_settings(MEDIA_BASE_URL='https://api.example.com', EMAIL_EMBED_IMAGES=True):
+            src, attachment = email_image(self.product.primary_image, content_id='product0')
+        self.assertEqual(src, 'cid:product0')
+        self.assertEqual(attachment['content_id'], 'product0')
+
+    def test_embeds_when_there_is_no_base_url(self):
+        with override_settings(MEDIA_BASE_URL='', EMAIL_EMBED_IMAGES=False):
+            src, attachment = email_image(self.product.primary_image, content_id='product0')
+        self.assertEqual(src, 'cid:product0')
+        self.assertTrue(attachment['path'].endswith('.jpg'))
@@ -1,7 +1,30 @@
+from django import forms
 from django.contrib import admin
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
-from .models import Order, OrderItem
+from spiritbead.paginators import EstimatedCountPaginator
+from .models import ArchivedOrder, Order, OrderItem
+from .services.lookup import search_orders
+from .services.shipping import TrackingImportError, TrackingUpdate, read_tracking_csv, ship_orders
+
+# Rows listed back when an import is rejected
+MAX_REPORTED_ERRORS = 50
+
+
+class TrackingImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label='CSV file',
+        help_text='Columns: order_id, tracking_number and optionally carrier (default USPS)'
+    )
+    notify = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Email customers whose orders are newly shipped'
+    )
 
 
 class OrderItemInline(admin.TabularInline):
@@ -10,14 +33,25 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['product', 'unit_price', 'quantity']
     can_delete = False
 
+    def get_queryset(self, request):
+        # Each row renders str(item) (product and order) and str(product) (its category)
+        return super().get_queryset(request).select_related('order', 'product__category')
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'customer_email', 'status', 'amount_total_display', 'is_custom_order', 'created_at', 'shipped_at']
-    list_filter = ['status', 'is_custom_order', 'created_at', 'shipped_at']
-    search_fields = ['id', 'customer_email', 'stripe_payment_intent']
-    readonly_fields = ['id', 'stripe_session_id', 'stripe_payment_intent', 'amount_total', 'created_at']
+    list_filter = ['status', 'is_custom_order', 'shipping_country', 'created_at', 'shipped_at']
+    # Searched with indexed exact/prefix matches, see get_search_results
+    search_fields = ['id', 'customer_email', 'stripe_payment_intent', 'stripe_session_id']
+    search_help_text = 'Order id, email (or its start), payment intent (pi_...) or Checkout Session (cs_...) id'
+    readonly_fields = [
+        'id', 'stripe_session_id', 'stripe_payment_intent', 'amount_total', 'created_at',
+        'shipping_country', 'shipping_state', 'shipping_postal_code',
+    ]
     inlines = [OrderItemInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         ('Order Information', {
@@ -28,7 +62,7 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Shipping Information', {
-            'fields': ('shipping_address', 'shipped_at', 'tracking_number', 'shipping_carrier', 'product_image')
+            'fields': ('shipping_address', 'shipping_country', 'shipping_state', 'shipping_postal_code', 'shipped_at', 'tracking_number', 'shipping_carrier', 'product_image')
         }),
         ('System Information', {
             'fields': ('id', 'created_at'),
@@ -43,52 +77,109 @@ class OrderAdmin(admin.ModelAdmin):
         return f"${obj.amount_total / 100:.2f}"
     amount_total_display.short_description = 'Total'
 
-    def mark_as_shipped(self, request, queryset):
-        """Mark selected orders as shipped and send notification emails"""
-        from django.utils import timezone
-        from .utils import send_order_shipped_email
-        import os
-        from email.mime.image import MIMEImage
-        from django.core.mail import EmailMessage
-        from django.template.loader import render_to_string
-        from django.conf import settings
-
-        count = 0
-        for order in queryset.filter(status='paid'):
-            # Check if tracking number is set
-            if not order.tracking_number:
-                self.message_user(
-                    request,
-                    f"Cannot mark order {order.id} as shipped: No tracking number set. Please add tracking info first.",
-                    messages.WARNING
-                )
-                continue
+    def get_search_results(self, request, queryset, search_term):
+        # Instead of LIKE '%term%' over every search field, which can't use an index
+        return search_orders(queryset, search_term), False
 
-            # Update status and shipped_at
-            order.status = 'shipped'
-            order.shipped_at = timezone.now()
-            order.save()
+    def get_urls(self):
+        urls = [
+            path(
+                'import-tracking/',
+                self.admin_site.admin_view(self.import_tracking_view),
+                name='orders_order_import_tracking',
+            ),
+        ]
+        return urls + super().get_urls()
 
-            # Send shipping notification email
+    def import_tracking_view(self, request):
+        """Upload a CSV of tracking numbers and ship all the listed orders at once"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = TrackingImportForm(request.POST or None, request.FILES or None)
+        errors = []
+        if request.method == 'POST' and form.is_valid():
             try:
-                send_order_shipped_email(order)
-                count += 1
+                updates = read_tracking_csv(form.cleaned_data['csv_file'].file)
+                result = ship_orders(updates, notify=form.cleaned_data['notify'])
+            except TrackingImportError as e:
+                errors = e.errors
+            else:
                 self.message_user(
                     request,
-                    f"Marked order {order.id} as shipped and emailed customer",
+                    f"Marked {result['shipped']} order(s) as shipped, updated tracking on {result['updated']} "
+                    f"and queued {result['emails']} shipped email(s)",
                     messages.SUCCESS
                 )
-            except Exception as e:
-                self.message_user(
-                    request,
-                    f"Error sending shipped email for order {order.id}: {str(e)}",
-                    messages.ERROR
-                )
+                return redirect('admin:orders_order_changelist')
 
-        if count > 0:
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import tracking numbers',
+            'form': form,
+            'errors': errors[:MAX_REPORTED_ERRORS],
+            'more_errors': max(len(errors) - MAX_REPORTED_ERRORS, 0),
+        }
+        return TemplateResponse(request, 'admin/orders/order/import_tracking.html', context)
+
+    def mark_as_shipped(self, request, queryset):
+        """Mark selected orders as shipped and send notification emails"""
+        orders = list(queryset.filter(status='paid').only('id', 'tracking_number', 'shipping_carrier'))
+
+        # Check if tracking number is set
+        missing = [order for order in orders if not order.tracking_number]
+        if missing:
+            listed = ', '.join(str(order.id) for order in missing[:10])
             self.message_user(
                 request,
-                f"Successfully marked {count} order(s) as shipped",
-                messages.SUCCESS
+                f"Cannot mark {len(missing)} order(s) as shipped: No tracking number set ({listed}). "
+                f"Please add tracking info first.",
+                messages.WARNING
             )
+
+        updates = {
+            order.id: TrackingUpdate(None, order.tracking_number, order.shipping_carrier)
+            for order in orders if order.tracking_number
+        }
+        if not updates:
+            return
+
+        try:
+            result = ship_orders(updates)
+        except TrackingImportError as e:
+            for _, message in e.errors[:MAX_REPORTED_ERRORS]:
+                self.message_user(request, message, messages.ERROR)
+            return
+
+        self.message_user(
+            request,
+            f"Successfully marked {result['shipped']} order(s) as shipped and queued {result['emails']} email(s)",
+            messages.SUCCESS
+        )
     mark_as_shipped.short_description = "Mark as shipped and notify customer"
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only view of orders moved out of the live tables by archive_orders"""
+    list_display = ['id', 'customer_email', 'status', 'amount_total_display', 'is_custom_order', 'created_at', 'shipped_at']
+    list_filter = ['status', 'is_custom_order']
+    search_fields = ['=id', 'customer_email', 'stripe_session_id', 'stripe_payment_intent', 'tracking_number']
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def amount_total_display(self, obj):
+        """Display amount in dollars"""
+        return f"${obj.amount_total / 100:.2f}"
+    amount_total_display.short_description = 'Total'
@@ -0,0 +1,115 @@
+"""
+Order export for bookkeeping.
+
+Orders are read with a server-side cursor (``iterator(chunk_size=...)``) and
+their items and products are prefetched per chunk, so an export costs a few
+queries per chunk and holds one chunk in memory however many orders it covers.
+The writers are generators, for StreamingHttpResponse or a file.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem
+
+CHUNK_SIZE = 2000
+
+# One CSV row per order item; custom orders (no items) get one row with the item columns blank.
+# Amounts are integer cents in the order's currency.
+CSV_COLUMNS = [
+    'order_id', 'created_at', 'status', 'is_custom_order', 'customer_email', 'currency',
+    'amount_total_cents', 'shipping_country', 'shipped_at', 'tracking_number',
+    'product_id', 'product_name', 'unit_price_cents', 'quantity', 'line_total_cents',
+]
+
+FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+ORDER_FIELDS = [
+    'id', 'created_at', 'status', 'is_custom_order', 'customer_email', 'currency',
+    'amount_total', 'shipping_country', 'shipped_at', 'tracking_number',
+]
+
+
+def export_orders(since=None, until=None, status=None):
+    """Orders created in [since, until), oldest first, with items and products prefetched."""
+    orders = Order.objects.only(*ORDER_FIELDS).prefetch_related(
+        Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('product').only(
+                'order', 'unit_price', 'quantity', 'product__id', 'product__name',
+            ).order_by('id'),
+        )
+    ).order_by('created_at', 'id')
+    if since:
+        orders = orders.filter(created_at__gte=since)
+    if until:
+        orders = orders.filter(created_at__lt=until)
+    if status:
+        orders = orders.filter(status__in=status)
+    return orders
+
+
+def _order_record(order):
+    return {
+        'order_id': str(order.id),
+        'created_at': order.created_at.isoformat(),
+        'status': order.status,
+        'is_custom_order': order.is_custom_order,
+        'customer_email': order.customer_email or '',
+        'currency': order.currency,
+        'amount_total_cents': order.amount_total,
+        'shipping_country': order.shipping_country,
+        'shipped_at': order.shipped_at.isoformat() if order.shipped_at else '',
+        'tracking_number': order.tracking_number or '',
+    }
+
+
+def _item_record(item):
+    return {
+        'product_id': item.product.id,
+        'product_name': item.product.name,
+        'unit_price_cents': item.unit_price,
+        'quantity': item.quantity,
+        'line_total_cents': item.unit_price * item.quantity,
+    }
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders, chunk_size=CHUNK_SIZE):
+    """Yield the export as CSV text, a line at a time, starting with the header."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order in orders.iterator(chunk_size=chunk_size):
+        record = _order_record(order)
+        items = order.items.all()
+        if not items:
+            yield writer.writerow([record.get(column, '') for column in CSV_COLUMNS])
+        for item in items:
+            row = {**record, **_item_record(item)}
+            yield writer.writerow([row[column] for column in CSV_COLUMNS])
+
+
+def ndjson_lines(orders, chunk_size=CHUNK_SIZE):
+    """Yield the export as newline-delimited JSON, one order (with its items) per line."""
+    for order in orders.iterator(chunk_size=chunk_size):
+        record = _order_record(order)
+        record['items'] = [_item_record(item) for item in order.items.all()]
+        yield json.dumps(record) + '\n'
+
+
+WRITERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
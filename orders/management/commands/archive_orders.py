@@ -0,0 +1,68 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.services.archive import archive_orders, export_archived_months, month_start
+
+
+class Command(BaseCommand):
+    help = 'Move old finished orders out of the live tables, and optionally export old archive months to gzip files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=12,
+            help='Archive shipped, expired and failed orders created before the start of the month '
+                 'this many months ago (default: 12)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Orders moved per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--export-dir',
+            help='Also write archived orders older than --export-older-than-months to '
+                 'orders-YYYY-MM.ndjson.gz files in this directory and remove them from the database'
+        )
+        parser.add_argument(
+            '--export-older-than-months',
+            type=int,
+            default=36,
+            help='Months of archived orders kept in the database when exporting (default: 36)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count what would be archived or exported without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options['export_dir'] and not os.path.isdir(options['export_dir']):
+            raise CommandError(f"Export directory {options['export_dir']} does not exist")
+
+        today = timezone.localdate()
+        prefix = '[dry run] ' if options['dry_run'] else ''
+
+        before = month_start(today, options['older_than_months'])
+        stats = archive_orders(before, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Archived {stats['archived']} order(s) created before {before:%Y-%m-%d} "
+            f"in {stats['batches']} batch(es)"
+        ))
+
+        if options['export_dir']:
+            export_before = month_start(today, options['export_older_than_months'])
+            exported = export_archived_months(
+                options['export_dir'], export_before, dry_run=options['dry_run'],
+            )
+            for path, count in exported:
+                self.stdout.write(f"{prefix}{path}: {count} order(s)")
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix}Exported {len(exported)} month(s) of archived orders created before {export_before:%Y-%m-%d}"
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.services.addresses import backfill_shipping_columns
+
+
+class Command(BaseCommand):
+    help = "Fill orders' shipping country, state and postal code columns from their shipping addresses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Orders checked per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the orders that would be updated without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        stats = backfill_shipping_columns(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Updated {stats['updated']} of {stats['checked']} order(s) with a shipping address "
+            f"in {stats['batches']} batch(es)"
+        ))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.services.expiry import expire_stale_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Mark abandoned pending orders as expired in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-hours',
+            type=float,
+            default=settings.PENDING_ORDER_EXPIRY_HOURS,
+            help=f'Expire pending orders older than this many hours (default: {settings.PENDING_ORDER_EXPIRY_HOURS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of orders updated per batch (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count stale orders without changing them'
+        )
+
+    def handle(self, *args, **options):
+        stats = expire_stale_pending_orders(
+            older_than=options['older_than_hours'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Scanned {stats['scanned']} stale pending order(s), "
+            f"expired {stats['expired']} in {stats['batches']} batch(es)"
+        ))
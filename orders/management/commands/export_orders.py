@@ -0,0 +1,63 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from orders.export import CHUNK_SIZE, FORMATS, WRITERS, export_orders
+from payments.management.utils import parse_when
+
+
+class Command(BaseCommand):
+    help = 'Export orders with their items as CSV or NDJSON for bookkeeping'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            help='Output format: one row per item (csv) or one order per line (ndjson) (default: csv)'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only orders created at or after this ISO date/datetime'
+        )
+        parser.add_argument(
+            '--until',
+            help='Only orders created before this ISO date/datetime'
+        )
+        parser.add_argument(
+            '--status',
+            action='append',
+            help='Only orders with this status; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write (default: standard output)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Orders fetched per database round trip (default: {CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        orders = export_orders(
+            since=parse_when(options['since']),
+            until=parse_when(options['until']),
+            status=options['status'],
+        )
+        lines = WRITERS[options['format']](orders, chunk_size=options['chunk_size'])
+
+        count = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                for line in lines:
+                    f.write(line)
+                    count += 1
+        else:
+            for line in lines:
+                sys.stdout.write(line)
+                count += 1
+
+        # Keep standard output for the export itself
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} line(s) as {options['format']}"))
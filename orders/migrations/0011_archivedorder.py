@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0010_order_expired_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("stripe_session_id", models.CharField(max_length=255, unique=True)),
+                (
+                    "stripe_payment_intent",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("amount_total", models.IntegerField()),
+                ("currency", models.CharField(default="usd", max_length=10)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("paid", "Paid"),
+                            ("shipped", "Shipped"),
+                            ("failed", "Failed"),
+                            ("expired", "Expired"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "customer_email",
+                    models.EmailField(blank=True, max_length=254, null=True),
+                ),
+                ("shipping_address", models.JSONField(blank=True, null=True)),
+                ("is_custom_order", models.BooleanField(default=False)),
+                ("shipped_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "tracking_number",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("shipping_carrier", models.CharField(default="USPS", max_length=50)),
+                ("product_image", models.CharField(blank=True, max_length=255)),
+                (
+                    "items",
+                    models.JSONField(
+                        default=list,
+                        help_text="Snapshot of the order items: [{product_id, product_name, unit_price, quantity}]",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["created_at", "id"], name="archived_order_created_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:13
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0011_archivedorder"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="stripe_payment_intent",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=255, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Lower("customer_email"),
+                    name="text_pattern_ops",
+                ),
+                name="order_email_lower_idx",
+            ),
+        ),
+    ]
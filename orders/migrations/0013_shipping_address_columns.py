@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0012_customer_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="shipping_country",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=2
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shipping_postal_code",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=20
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shipping_state",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=100
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["shipping_country", "shipping_state"],
+                name="order_ship_region_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["shipping_postal_code"], name="order_ship_postal_idx"
+            ),
+        ),
+    ]
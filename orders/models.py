@@ -1,18 +1,30 @@
+import logging
+
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Lower
 from products.models import Product
+from products.services.inventory import apply_sale
 from decimal import Decimal
 
+logger = logging.getLogger(__name__)
+
+# Order columns maintained from shipping_address
+SHIPPING_COLUMNS = ('shipping_country', 'shipping_state', 'shipping_postal_code')
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ("pending", "Pending"),
         ("paid", "Paid"),
         ("shipped", "Shipped"),
         ("failed", "Failed"),
+        ("expired", "Expired"),
     )
 
     id = models.UUIDField(primary_key=True, editable=False)
     stripe_session_id = models.CharField(max_length=255, unique=True)
-    stripe_payment_intent = models.CharField(max_length=255, blank=True, null=True)
+    # Indexed for exact and prefix lookups (admin search, reconciliation)
+    stripe_payment_intent = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     amount_total = models.IntegerField()  # cents
     currency = models.CharField(max_length=10, default="usd")
@@ -26,6 +38,11 @@ class Order(models.Model):
     customer_email = models.EmailField(blank=True, null=True)
 
     shipping_address = models.JSONField(blank=True, null=True)
+    # Copied out of shipping_address on save (see set_shipping_columns) so orders can be
+    # filtered by destination with an index instead of parsing every row's JSON
+    shipping_country = models.CharField(max_length=2, blank=True, default="", editable=False)
+    shipping_state = models.CharField(max_length=100, blank=True, default="", editable=False)
+    shipping_postal_code = models.CharField(max_length=20, blank=True, default="", editable=False)
 
     is_custom_order = models.BooleanField(default=False, help_text="Whether this is a custom order")
 
@@ -42,39 +59,59 @@ class Order(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Used by the pending-order sweeper's keyset scan
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+            # Case-insensitive exact and prefix email lookups: lower(customer_email) = / LIKE 'x%'
+            models.Index(
+                OpClass(Lower('customer_email'), name='text_pattern_ops'),
+                name='order_email_lower_idx',
+            ),
+            # Customs batches and shipping-cost reports: by country, or country and state
+            models.Index(fields=['shipping_country', 'shipping_state'], name='order_ship_region_idx'),
+            models.Index(fields=['shipping_postal_code'], name='order_ship_postal_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
+    def set_shipping_columns(self):
+        """Copy country, state and postal code out of shipping_address into their own columns."""
+        address = self.shipping_address or {}
+        self.shipping_country = str(address.get('country') or '').strip().upper()[:2]
+        self.shipping_state = str(address.get('state') or '').strip()[:100]
+        self.shipping_postal_code = str(address.get('postal_code') or '').strip()[:20]
+
     def save(self, *args, **kwargs):
+        self.set_shipping_columns()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'shipping_address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *SHIPPING_COLUMNS}
+
         # Check if status is being changed to 'paid'
         if self.pk and self.status == 'paid':  # Only for existing orders being marked as paid
             try:
                 old_order = Order.objects.get(pk=self.pk)
                 if old_order.status != 'paid':
-                    print(f"Order {self.id} status changed from {old_order.status} to paid - updating inventory")
+                    logger.info(f"Order {self.id} status changed from {old_order.status} to paid - updating inventory")
                     self._update_inventory()
                 else:
-                    print(f"Order {self.id} already paid - no inventory update")
+                    logger.debug(f"Order {self.id} already paid - no inventory update")
             except Order.DoesNotExist:
                 pass  # Handle case where order doesn't exist yet
         super().save(*args, **kwargs)
 
     def _update_inventory(self):
-        """Update product inventory when order is paid"""
-        print(f"Updating inventory for order {self.id}")
+        """Take the order's items off product stock (recorded in the stock ledger) when it's paid"""
         for item in self.items.all():
-            product = item.product
-            print(f"Updating product {product.name}: current inventory {product.inventory_count}, quantity {item.quantity}")
-            product.inventory_count -= item.quantity
-            
-            # Mark as sold out if inventory reaches 0
-            if product.inventory_count <= 0:
-                product.inventory_count = 0
-                product.is_sold_out = True
-                print(f"Product {product.name} marked as sold out")
-            
-            product.save()
-            print(f"Product {product.name} updated: new inventory {product.inventory_count}, sold_out: {product.is_sold_out}")
+            remaining = apply_sale(item.product_id, item.quantity, reference=self.id)
+            if remaining == 0:
+                logger.info(f"Product {item.product_id} marked as sold out")
+            logger.debug(
+                f"Product {item.product_id} inventory now {remaining} after order {self.id}",
+                extra={"product_id": item.product_id, "quantity": item.quantity, "sold_out": remaining == 0},
+            )
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -94,3 +131,70 @@ class OrderItem(models.Model):
     def unit_price_decimal(self):
         """Convert cents to decimal for display purposes"""
         return Decimal(self.unit_price) / Decimal(100)
+
+
+class ArchivedOrder(models.Model):
+    """
+    A finished order moved out of the live orders tables by the archive_orders command.
+
+    Keeps the order's columns plus a snapshot of its items, so the live
+    tables (and every scan of them) only hold recent and open orders.
+    Product images stay in storage; product_image keeps the file name.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    stripe_session_id = models.CharField(max_length=255, unique=True)
+    stripe_payment_intent = models.CharField(max_length=255, blank=True, null=True)
+    amount_total = models.IntegerField()  # cents
+    currency = models.CharField(max_length=10, default="usd")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    customer_email = models.EmailField(blank=True, null=True)
+    shipping_address = models.JSONField(blank=True, null=True)
+    is_custom_order = models.BooleanField(default=False)
+    shipped_at = models.DateTimeField(blank=True, null=True)
+    tracking_number = models.CharField(max_length=255, blank=True, null=True)
+    shipping_carrier = models.CharField(max_length=50, default="USPS")
+    product_image = models.CharField(max_length=255, blank=True)
+    items = models.JSONField(
+        default=list,
+        help_text="Snapshot of the order items: [{product_id, product_name, unit_price, quantity}]"
+    )
+
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='archived_order_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.status}"
+
+    @classmethod
+    def from_order(cls, order):
+        """Archive copy of an order whose items (with products) are loaded."""
+        return cls(
+            id=order.id,
+            stripe_session_id=order.stripe_session_id,
+            stripe_payment_intent=order.stripe_payment_intent,
+            amount_total=order.amount_total,
+            currency=order.currency,
+            status=order.status,
+            customer_email=order.customer_email,
+            shipping_address=order.shipping_address,
+            is_custom_order=order.is_custom_order,
+            shipped_at=order.shipped_at,
+            tracking_number=order.tracking_number,
+            shipping_carrier=order.shipping_carrier,
+            product_image=order.product_image.name if order.product_image else '',
+            items=[
+                {
+                    'product_id': item.product_id,
+                    'product_name': item.product.name,
+                    'unit_price': item.unit_price,
+                    'quantity': item.quantity,
+                }
+                for item in order.items.all()
+            ],
+            created_at=order.created_at,
+        )
@@ -0,0 +1,22 @@
+from rest_framework import serializers
+from .models import Order, OrderItem
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'product_name', 'unit_price', 'quantity']
+
+
+class CustomerOrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'created_at', 'status', 'is_custom_order', 'amount_total', 'currency',
+            'stripe_payment_intent', 'shipping_address', 'shipped_at', 'shipping_carrier', 'tracking_number',
+            'items',
+        ]
@@ -0,0 +1,46 @@
+import logging
+
+from django.db import transaction
+
+from orders.models import SHIPPING_COLUMNS, Order
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_shipping_columns(batch_size=1000, dry_run=False):
+    """
+    Fill the shipping country, state and postal code columns of orders saved
+    before they existed, from shipping_address.
+
+    Walks the orders in primary key order, each batch in its own short
+    transaction with the rows locked, and only writes orders whose columns
+    are out of date. Returns a dict of counts: checked, updated and batches.
+    """
+    stats = {'checked': 0, 'updated': 0, 'batches': 0}
+    orders = Order.objects.filter(shipping_address__isnull=False).only('id', 'shipping_address', *SHIPPING_COLUMNS)
+    last_id = None
+
+    while True:
+        with transaction.atomic():
+            batch = orders.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch.select_for_update()[:batch_size])
+            if not batch:
+                break
+
+            changed = []
+            for order in batch:
+                before = [getattr(order, column) for column in SHIPPING_COLUMNS]
+                order.set_shipping_columns()
+                if [getattr(order, column) for column in SHIPPING_COLUMNS] != before:
+                    changed.append(order)
+            if changed and not dry_run:
+                Order.objects.bulk_update(changed, SHIPPING_COLUMNS)
+
+        last_id = batch[-1].id
+        stats['checked'] += len(batch)
+        stats['updated'] += len(changed)
+        stats['batches'] += 1
+        logger.info(f"Backfilled shipping columns of {len(changed)} of {len(batch)} order(s) up to {last_id}")
+    return stats
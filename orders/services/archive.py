@@ -0,0 +1,101 @@
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Orders in these states won't change again; paid orders still need shipping
+ARCHIVABLE_STATUSES = ('shipped', 'expired', 'failed')
+
+
+def month_start(day, months_back=0):
+    """Aware midnight on the first of the month ``months_back`` months before ``day``'s month."""
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return timezone.make_aware(datetime(month_index // 12, month_index % 12 + 1, 1))
+
+
+def archive_orders(before, batch_size=500, dry_run=False):
+    """
+    Move finished orders created before ``before`` into ArchivedOrder.
+
+    Each batch is its own short transaction: lock up to ``batch_size`` orders
+    (skipping rows another transaction holds), copy them and their items into
+    the archive and delete them from the live tables. Orders still linked to a
+    custom order request stay live.
+
+    Returns a dict of counts: archived and batches.
+    """
+    candidates = Order.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        created_at__lt=before,
+        custom_request__isnull=True,
+    )
+    stats = {'archived': 0, 'batches': 0}
+    if dry_run:
+        stats['archived'] = candidates.count()
+        return stats
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                candidates.select_for_update(skip_locked=True, of=('self',))
+                .order_by('created_at', 'id')
+                .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product')))
+                [:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedOrder.objects.bulk_create([ArchivedOrder.from_order(order) for order in batch])
+            Order.objects.filter(pk__in=[order.pk for order in batch]).delete()
+
+        stats['archived'] += len(batch)
+        stats['batches'] += 1
+        logger.info(f"Archived {len(batch)} order(s) created up to {batch[-1].created_at:%Y-%m-%d}")
+    return stats
+
+
+def export_archived_months(directory, before, batch_size=1000, dry_run=False):
+    """
+    Write archived orders of each whole month before ``before`` to a gzipped
+    NDJSON file in ``directory`` (orders-YYYY-MM.ndjson.gz), then delete them
+    from the archive table in batches.
+
+    A month's rows are only deleted once its file has been completely written.
+    Returns a list of (path, orders) per month exported.
+    """
+    exported = []
+    months = ArchivedOrder.objects.filter(created_at__lt=before).dates('created_at', 'month')
+    for month in months:
+        start = month_start(month)
+        end = month_start(month, months_back=-1)
+        rows = ArchivedOrder.objects.filter(created_at__gte=start, created_at__lt=end)
+        path = os.path.join(directory, f"orders-{month:%Y-%m}.ndjson.gz")
+        if dry_run:
+            exported.append((path, rows.count()))
+            continue
+
+        fields = [field.attname for field in ArchivedOrder._meta.concrete_fields]
+        count = 0
+        partial = f"{path}.partial"
+        with gzip.open(partial, 'wt', encoding='utf-8') as f:
+            for record in rows.order_by('created_at', 'id').values(*fields).iterator(chunk_size=batch_size):
+                f.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+                count += 1
+        os.replace(partial, path)
+
+        ids = list(rows.values_list('pk', flat=True))
+        for offset in range(0, len(ids), batch_size):
+            ArchivedOrder.objects.filter(pk__in=ids[offset:offset + batch_size]).delete()
+
+        exported.append((path, count))
+        logger.info(f"Exported {count} archived order(s) for {month:%Y-%m} to {path}")
+    return exported
@@ -0,0 +1,65 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.models import Order
+from payments.order_status import forget_order_status
+
+logger = logging.getLogger(__name__)
+
+
+def expire_stale_pending_orders(older_than, batch_size=500, dry_run=False, now=None):
+    """
+    Mark abandoned pending orders as expired.
+
+    Walks pending orders created before the cutoff in (created_at, id) keyset order,
+    one chunk per UPDATE, so the sweep never holds long locks or rescans rows it has
+    already seen. The UPDATE re-checks status, so an order paid by a webhook while the
+    sweep runs is left alone.
+
+    Returns a dict of counts: scanned, expired and batches.
+    """
+    if isinstance(older_than, (int, float)):
+        older_than = timedelta(hours=older_than)
+    cutoff = (now or timezone.now()) - older_than
+
+    stats = {'scanned': 0, 'expired': 0, 'batches': 0}
+    stale = Order.objects.filter(status='pending', created_at__lt=cutoff)
+    last_created_at, last_id = None, None
+
+    while True:
+        chunk = stale
+        if last_created_at is not None:
+            chunk = chunk.filter(
+                Q(created_at__gt=last_created_at) | Q(created_at=last_created_at, id__gt=last_id)
+            )
+        rows = list(
+            chunk.order_by('created_at', 'id').values_list('id', 'created_at', 'stripe_session_id')[:batch_size]
+        )
+        if not rows:
+            break
+
+        last_id, last_created_at, _ = rows[-1]
+        ids = [order_id for order_id, _, _ in rows]
+
+        stats['batches'] += 1
+        stats['scanned'] += len(ids)
+        if not dry_run:
+            stats['expired'] += Order.objects.filter(id__in=ids, status='pending').update(status='expired')
+            forget_order_status(session_id for _, _, session_id in rows)
+
+    logger.info(
+        f"Pending order sweep (cutoff {cutoff.isoformat()}, dry_run={dry_run}): "
+        f"scanned {stats['scanned']}, expired {stats['expired']} in {stats['batches']} batch(es)"
+    )
+    return stats
+
+
+def expire_order_for_session(session_id):
+    """Expire the pending order for a Checkout Session Stripe reported as expired."""
+    expired = Order.objects.filter(stripe_session_id=session_id, status='pending').update(status='expired')
+    if expired:
+        forget_order_status([session_id])
+    return expired
@@ -0,0 +1,45 @@
+"""
+Indexed order lookups for customer support.
+
+Admin search and the customer order history API only use exact or prefix
+matches that the order indexes can answer: the primary key for order ids,
+the pattern indexes on stripe_payment_intent and stripe_session_id, and the
+lower(customer_email) index for emails.
+"""
+import uuid
+
+from django.db.models import Prefetch
+from django.db.models.functions import Lower
+
+from orders.models import Order, OrderItem
+
+
+def search_orders(queryset, term):
+    """
+    Filter orders by an admin search term:
+    an order id (exact), a Stripe payment intent (pi_...) or Checkout
+    Session (cs_...) id (prefix), or otherwise an email address (prefix,
+    case-insensitive, so a full address matches exactly).
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+    try:
+        return queryset.filter(id=uuid.UUID(term))
+    except ValueError:
+        pass
+    if term.startswith('pi_'):
+        return queryset.filter(stripe_payment_intent__startswith=term)
+    if term.startswith('cs_'):
+        return queryset.filter(stripe_session_id__startswith=term)
+    return queryset.alias(email_lower=Lower('customer_email')).filter(email_lower__startswith=term.lower())
+
+
+def customer_orders(email):
+    """A customer's orders, newest first, with items and products: two queries when evaluated."""
+    return (
+        Order.objects.alias(email_lower=Lower('customer_email'))
+        .filter(email_lower=email.strip().lower())
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id')))
+        .order_by('-created_at')
+    )
@@ -0,0 +1,168 @@
+import csv
+import io
+import logging
+import uuid
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.outbox import queue_emails
+from orders.models import Order
+from orders.utils import send_order_shipped_email
+from payments.order_status import forget_order_status
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CARRIER = Order._meta.get_field('shipping_carrier').default
+
+ORDER_ID_COLUMNS = ('order_id', 'order', 'id')
+TRACKING_COLUMNS = ('tracking_number', 'tracking')
+CARRIER_COLUMNS = ('carrier', 'shipping_carrier')
+
+# One validated CSV row; ``line`` is None for updates that didn't come from a file
+TrackingUpdate = namedtuple('TrackingUpdate', ['line', 'tracking_number', 'carrier'])
+
+
+class TrackingImportError(Exception):
+    """A tracking import was rejected; ``errors`` lists (line, message) pairs."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} problem(s) with the tracking numbers")
+
+
+def _column(columns, names):
+    return next((columns.index(name) for name in names if name in columns), None)
+
+
+def read_tracking_csv(f):
+    """
+    Parse and validate a CSV of order id, tracking number and (optional) carrier.
+
+    Reads the binary file ``f`` a row at a time, so memory is bounded by the number
+    of orders rather than the file size. Returns {order_id: TrackingUpdate}; raises
+    TrackingImportError listing every bad row.
+    """
+    text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            raise TrackingImportError([(1, "The file is empty")])
+
+        columns = [name.strip().lower() for name in header]
+        id_index = _column(columns, ORDER_ID_COLUMNS)
+        tracking_index = _column(columns, TRACKING_COLUMNS)
+        carrier_index = _column(columns, CARRIER_COLUMNS)
+        if id_index is None or tracking_index is None:
+            raise TrackingImportError([(1, "The header must have order_id and tracking_number columns")])
+
+        updates = {}
+        errors = []
+        for row in reader:
+            line = reader.line_num
+            if not any(cell.strip() for cell in row):
+                continue
+
+            def cell(index):
+                return row[index].strip() if index is not None and index < len(row) else ''
+
+            raw_id = cell(id_index)
+            try:
+                order_id = uuid.UUID(raw_id)
+            except ValueError:
+                errors.append((line, f"'{raw_id}' is not an order id"))
+                continue
+
+            tracking_number = cell(tracking_index)
+            carrier = cell(carrier_index) or DEFAULT_CARRIER
+            if not tracking_number:
+                errors.append((line, f"No tracking number for order {order_id}"))
+            elif len(tracking_number) > 255:
+                errors.append((line, f"Tracking number for order {order_id} is longer than 255 characters"))
+            elif len(carrier) > 50:
+                errors.append((line, f"Carrier for order {order_id} is longer than 50 characters"))
+            elif order_id in updates:
+                errors.append((line, f"Order {order_id} is already on line {updates[order_id].line}"))
+            else:
+                updates[order_id] = TrackingUpdate(line, tracking_number, carrier)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise TrackingImportError([(None, f"Could not read the file as UTF-8 CSV: {e}")])
+    finally:
+        # Leave the upload open for its owner
+        text.detach()
+
+    if errors:
+        raise TrackingImportError(errors)
+    return updates
+
+
+def ship_orders(updates, notify=True, batch_size=500):
+    """
+    Apply tracking details to orders and mark the paid ones as shipped.
+
+    ``updates`` maps order id to TrackingUpdate. Paid orders become shipped and, with
+    ``notify``, get a shipped email; orders that are already shipped only have their
+    tracking details corrected. Unknown orders or orders in any other status reject
+    the whole batch with TrackingImportError.
+
+    Everything happens in one transaction: the orders are locked and loaded in
+    chunks, written back with a single bulk_update (Order.save's pre-read isn't
+    needed since none of them is becoming paid) and the emails are bulk-inserted
+    into the outbox, so the worker sends them only if the import commits.
+
+    Returns a dict of counts: shipped, updated and emails.
+    """
+    ids = list(updates)
+    now = timezone.now()
+
+    with transaction.atomic():
+        orders = (
+            Order.objects.select_for_update(of=('self',))
+            .select_related('custom_request')
+            .prefetch_related('items__product')
+        )
+        found = {}
+        for start in range(0, len(ids), batch_size):
+            for order in orders.filter(id__in=ids[start:start + batch_size]):
+                found[order.id] = order
+
+        shipped, updated, errors = [], [], []
+        for order_id, update in updates.items():
+            order = found.get(order_id)
+            if order is None:
+                errors.append((update.line, f"Order {order_id} does not exist"))
+                continue
+            if order.status not in ('paid', 'shipped'):
+                errors.append((update.line, f"Order {order_id} is {order.status}, not paid"))
+                continue
+
+            order.tracking_number = update.tracking_number
+            order.shipping_carrier = update.carrier
+            if order.status == 'paid':
+                order.status = 'shipped'
+                order.shipped_at = now
+                shipped.append(order)
+            else:
+                updated.append(order)
+
+        if errors:
+            raise TrackingImportError(errors)
+
+        Order.objects.bulk_update(
+            shipped + updated,
+            ['tracking_number', 'shipping_carrier', 'status', 'shipped_at'],
+            batch_size=batch_size,
+        )
+        emails = 0
+        if notify:
+            emails = queue_emails(
+                (send_order_shipped_email(order, commit=False) for order in shipped),
+                batch_size=batch_size,
+            )
+
+    # The success page would otherwise keep showing these orders as paid
+    forget_order_status(order.stripe_session_id for order in shipped)
+    logger.info(f"Shipped {len(shipped)} order(s), updated tracking on {len(updated)}, queued {emails} email(s)")
+    return {'shipped': len(shipped), 'updated': len(updated), 'emails': emails}
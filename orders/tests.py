@@ -1,3 +1,421 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from custom_orders.models import CustomOrderRequest
+from notifications.models import OutboundEmail
+from payments.stripe import stripe
+from payments.webhooks import handle_checkout_session_expired
+from products.models import Category, Product
+from .export import csv_lines, export_orders
+from .models import ArchivedOrder, Order, OrderItem
+from .services.archive import archive_orders, export_archived_months
+from .services.expiry import expire_stale_pending_orders
+
+
+class OrderAdminQueryCountTests(TestCase):
+    """The order changelist and change page run a fixed number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.category = Category.objects.create(name='Lighter Cases', slug='lighter-cases')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def make_order(self, items):
+        order = Order.objects.create(
+            id=uuid.uuid4(),
+            stripe_session_id=f'cs_test_{uuid.uuid4().hex}',
+            amount_total=2500 * items,
+            customer_email='buyer@example.com',
+        )
+        for _ in range(items):
+            suffix = uuid.uuid4().hex[:12]
+            product = Product.objects.create(
+                id=f'prod_{suffix}', name=f'Case {suffix}', slug=f'case-{suffix}',
+                price=2500, category=self.category,
+            )
+            OrderItem.objects.create(order=order, product=product, unit_price=2500, quantity=1)
+        return order
+
+    def count_queries(self, url):
+        self.client.get(url)  # Warm per-process caches such as content types
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:orders_order_changelist')
+        self.make_order(1)
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_order(1)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_change_page_queries_do_not_grow_with_items(self):
+        small = self.make_order(1)
+        large = self.make_order(25)
+        few = self.count_queries(reverse('admin:orders_order_change', args=[small.pk]))
+        self.assertEqual(self.count_queries(reverse('admin:orders_order_change', args=[large.pk])), few)
+
+
+class TrackingImportTests(TestCase):
+    """Importing a tracking CSV ships thousands of orders with a bounded number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Lighter Cases', slug='lighter-cases')
+        cls.product = Product.objects.create(
+            id='prod_import', name='Sunset Case', slug='sunset-case', price=2500, category=category,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:orders_order_import_tracking')
+
+    def make_orders(self, count, status='paid'):
+        orders = Order.objects.bulk_create([
+            Order(
+                id=uuid.uuid4(),
+                stripe_session_id=f'cs_test_{uuid.uuid4().hex}',
+                amount_total=2500,
+                status=status,
+                customer_email=f'buyer{i}@example.com',
+                shipping_address={'name': f'Buyer {i}', 'country': 'US'},
+            )
+            for i in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.product, unit_price=2500, quantity=1) for order in orders
+        ])
+        return orders
+
+    def upload(self, rows, notify=True):
+        content = 'order_id,tracking_number,carrier\n' + ''.join(f'{row}\n' for row in rows)
+        data = {'csv_file': SimpleUploadedFile('tracking.csv', content.encode(), content_type='text/csv')}
+        if notify:
+            data['notify'] = 'on'
+        return self.client.post(self.url, data)
+
+    def test_imports_thousands_of_rows(self):
+        orders = self.make_orders(2000)
+        rows = [f'{order.id},9400{i:018d},UPS' for i, order in enumerate(orders)]
+
+        started = time.monotonic()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(rows)
+        elapsed = time.monotonic() - started
+
+        self.assertRedirects(response, reverse('admin:orders_order_changelist'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.filter(status='shipped', shipping_carrier='UPS').count(), 2000)
+        self.assertEqual(OutboundEmail.objects.filter(kind='order_shipped').count(), 2000)
+        self.assertEqual(
+            Order.objects.get(pk=orders[7].pk).tracking_number, '9400000000000000000007'
+        )
+        # Chunked reads and writes, not a few queries per order
+        self.assertLess(len(queries), 100)
+        self.assertLess(elapsed, 30)
+
+    def test_already_shipped_orders_get_new_tracking_without_email(self):
+        order = self.make_orders(1, status='shipped')[0]
+        self.upload([f'{order.id},1Z999,UPS'])
+        order.refresh_from_db()
+        self.assertEqual(order.tracking_number, '1Z999')
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_any_bad_row_rejects_the_whole_file(self):
+        paid = self.make_orders(2)
+        pending = self.make_orders(1, status='pending')[0]
+        response = self.upload([
+            f'{paid[0].id},1Z001,UPS',
+            'not-an-id,1Z002,UPS',
+            f'{paid[1].id},,UPS',
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Line 3:')
+        self.assertContains(response, 'Line 4:')
+
+        response = self.upload([f'{paid[0].id},1Z001,UPS', f'{pending.id},1Z003,UPS'])
+        self.assertContains(response, 'is pending, not paid')
+        self.assertFalse(Order.objects.filter(status='shipped').exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+class OrderExportTests(TestCase):
+    """Exports stream every order and item with a few queries per chunk, not per order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Lighter Cases', slug='lighter-cases')
+        products = [
+            Product.objects.create(id=f'prod_{i}', name=f'Case {i}', slug=f'case-{i}', price=2500, category=category)
+            for i in range(3)
+        ]
+        cls.orders = Order.objects.bulk_create([
+            Order(
+                id=uuid.uuid4(),
+                stripe_session_id=f'cs_test_{i}',
+                amount_total=5000,
+                status='paid' if i % 5 else 'pending',
+                shipping_address={'country': 'US'},
+                # bulk_create skips save(), which fills this in
+                shipping_country='US',
+                is_custom_order=i == 0,
+            )
+            for i in range(250)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, unit_price=2500, quantity=1)
+            for order in cls.orders[1:] for product in products[:2]
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('export_orders', args=[export_format]), params)
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(response.streaming_content).decode()
+        return content, len(queries)
+
+    def test_csv_has_a_row_per_item(self):
+        content, queries = self.export('csv')
+        rows = list(csv.DictReader(content.splitlines()))
+        # Two items for each regular order, one blank-item row for the custom order
+        self.assertEqual(len(rows), 249 * 2 + 1)
+        self.assertEqual(rows[-1]['line_total_cents'], '2500')
+        self.assertEqual(rows[-1]['shipping_country'], 'US')
+        # Orders, then items with their products, per chunk of 2000 orders
+        self.assertLessEqual(queries, 3)
+
+    def test_ndjson_has_a_line_per_order(self):
+        content, _ = self.export('ndjson', status='pending')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 50)
+        self.assertEqual({record['status'] for record in records}, {'pending'})
+        self.assertEqual(len(records[-1]['items']), 2)
+
+    def test_query_count_grows_with_chunks_not_orders(self):
+        with CaptureQueriesContext(connection) as queries:
+            lines = sum(1 for _ in csv_lines(export_orders(), chunk_size=100))
+        self.assertEqual(lines, 1 + 249 * 2 + 1)
+        self.assertLessEqual(len(queries), 3 * 2)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('export_orders', args=['csv'])).status_code, 403)
+
+
+class ArchiveOrdersTests(TestCase):
+    """Old finished orders move to the archive in batches; open and recent ones stay live."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(id='prod_archive', name='Old Case', slug='old-case', price=2500)
+
+    def make_order(self, status, created_at):
+        order = Order.objects.create(
+            id=uuid.uuid4(),
+            stripe_session_id=f'cs_test_{uuid.uuid4().hex}',
+            amount_total=2500,
+            status=status,
+            shipping_address={'country': 'US'},
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        OrderItem.objects.create(order=order, product=self.product, unit_price=2500, quantity=2)
+        return order
+
+    def test_archives_old_finished_orders_in_batches(self):
+
+        old = datetime(2024, 1, 15, tzinfo=dt_timezone.utc)
+        finished = [self.make_order(status, old) for status in ['shipped', 'expired', 'failed'] * 5]
+        still_paid = self.make_order('paid', old)
+        recent = self.make_order('shipped', datetime(2024, 6, 1, tzinfo=dt_timezone.utc))
+        linked = self.make_order('shipped', old)
+        CustomOrderRequest.objects.create(name='Sam', email='sam@example.com', description='Beads', related_order=linked)
+
+        stats = archive_orders(datetime(2024, 2, 1, tzinfo=dt_timezone.utc), batch_size=4)
+
+        self.assertEqual(stats, {'archived': 15, 'batches': 4})
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {still_paid.pk, recent.pk, linked.pk}
+        )
+        self.assertEqual(OrderItem.objects.count(), 3)
+        archived = ArchivedOrder.objects.get(pk=finished[0].pk)
+        self.assertEqual(archived.created_at, old)
+        self.assertEqual(archived.items, [
+            {'product_id': 'prod_archive', 'product_name': 'Old Case', 'unit_price': 2500, 'quantity': 2},
+        ])
+
+    def test_exports_old_archive_months(self):
+
+        for day in (3, 20):
+            self.make_order('shipped', datetime(2023, 1, day, tzinfo=dt_timezone.utc))
+        self.make_order('shipped', datetime(2023, 2, 1, tzinfo=dt_timezone.utc))
+        archive_orders(datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+
+        with tempfile.TemporaryDirectory() as directory:
+            exported = export_archived_months(directory, datetime(2023, 2, 1, tzinfo=dt_timezone.utc))
+            self.assertEqual([count for _, count in exported], [2])
+            with gzip.open(exported[0][0], 'rt') as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([record['created_at'][:10] for record in records], ['2023-01-03', '2023-01-20'])
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+
+
+class CustomerLookupTests(TestCase):
+    """Admin search and the customer history API use exact/prefix matches."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        product = Product.objects.create(id='prod_lookup', name='Moon Case', slug='moon-case', price=2500)
+        cls.orders = []
+        for i, email in enumerate(['Jane.Doe@Example.com', 'jane.doe@example.com', 'janet@example.com', 'bob@example.com']):
+            order = Order.objects.create(
+                id=uuid.uuid4(),
+                stripe_session_id=f'cs_test_lookup{i}',
+                stripe_payment_intent=f'pi_lookup{i}',
+                amount_total=2500,
+                status='paid',
+                customer_email=email,
+            )
+            OrderItem.objects.create(order=order, product=product, unit_price=2500, quantity=i + 1)
+            cls.orders.append(order)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:orders_order_changelist'), {'q': term})
+        return {order.pk for order in response.context['cl'].result_list}
+
+    def test_admin_search(self):
+        jane, jane_lower, janet, bob = self.orders
+        self.assertEqual(self.search('JANE.DOE@example.com'), {jane.pk, jane_lower.pk})
+        self.assertEqual(self.search('jane'), {jane.pk, jane_lower.pk, janet.pk})
+        self.assertEqual(self.search(str(bob.id)), {bob.pk})
+        self.assertEqual(self.search('pi_lookup2'), {janet.pk})
+        self.assertEqual(self.search('cs_test_lookup3'), {bob.pk})
+        # No substring matches
+        self.assertEqual(self.search('example.com'), set())
+
+    def test_customer_history_in_two_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('customer_order_history'), {'email': ' JANE.doe@example.COM '})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([item['product_name'] for order in data['orders'] for item in order['items']], ['Moon Case'] * 2)
+        order_queries = [query for query in queries.captured_queries if 'orders_order' in query['sql']]
+        self.assertEqual(len(order_queries), 2)
+
+    def test_customer_history_is_staff_only(self):
+        self.client.logout()
+        response = self.client.get(reverse('customer_order_history'), {'email': 'bob@example.com'})
+        self.assertEqual(response.status_code, 403)
+
+
+class ShippingColumnsTests(TestCase):
+    """Country, state and postal code are kept in their own columns for filtering."""
+
+    def make_order(self, address):
+        return Order.objects.create(
+            id=uuid.uuid4(), stripe_session_id=f'cs_test_{uuid.uuid4().hex}', amount_total=2500,
+            status='paid', shipping_address=address,
+        )
+
+    def test_columns_follow_the_address(self):
+        order = self.make_order({'country': 'ca', 'state': 'BC', 'postal_code': ' V5K 0A1 '})
+        self.assertEqual((order.shipping_country, order.shipping_state, order.shipping_postal_code), ('CA', 'BC', 'V5K 0A1'))
+
+        order.shipping_address = {'country': 'US', 'state': 'OR', 'postal_code': '97201'}
+        order.save(update_fields=['shipping_address'])
+        order.refresh_from_db()
+        self.assertEqual((order.shipping_country, order.shipping_state, order.shipping_postal_code), ('US', 'OR', '97201'))
+
+    def test_backfill_fills_old_orders(self):
+        orders = [self.make_order({'country': 'US', 'state': 'WA', 'postal_code': f'9810{i}'}) for i in range(5)]
+        without_address = self.make_order(None)
+        Order.objects.update(shipping_country='', shipping_state='', shipping_postal_code='')
+
+        call_command('backfill_shipping_columns', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(Order.objects.filter(shipping_country='US', shipping_state='WA').count(), len(orders))
+        self.assertEqual(Order.objects.get(pk=orders[3].pk).shipping_postal_code, '98103')
+        self.assertEqual(Order.objects.get(pk=without_address.pk).shipping_country, '')
+
+    def test_admin_filters_by_country(self):
+        us = self.make_order({'country': 'US'})
+        self.make_order({'country': 'GB'})
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:orders_order_changelist'), {'shipping_country': 'US'})
+        self.assertEqual([order.pk for order in response.context['cl'].result_list], [us.pk])
+
+
+class PendingOrderExpiryTests(TestCase):
+    """Abandoned pending orders are expired in keyset batches; paid and recent ones are left alone."""
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def make_order(self, status='pending', age=timedelta(days=2), session_id=None):
+        order = Order.objects.create(
+            id=uuid.uuid4(), stripe_session_id=session_id or f'cs_test_{uuid.uuid4().hex}', amount_total=4000,
+            status=status,
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=self.now - age)
+        return order
+
+    def test_sweeps_every_stale_order_across_batches(self):
+        # Orders sharing a created_at straddle the batch boundaries, so the keyset needs the id tiebreak
+        stale = [self.make_order() for _ in range(5)] + [self.make_order(age=timedelta(days=3)) for _ in range(2)]
+        paid = self.make_order(status='paid')
+        recent = self.make_order(age=timedelta(hours=1))
+
+        stats = expire_stale_pending_orders(timedelta(hours=24), batch_size=2, now=self.now)
+
+        self.assertEqual(stats, {'scanned': 7, 'expired': 7, 'batches': 4})
+        self.assertEqual(
+            set(Order.objects.filter(status='expired').values_list('pk', flat=True)), {order.pk for order in stale}
+        )
+        paid.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((paid.status, recent.status), ('paid', 'pending'))
+
+    def test_dry_run_changes_nothing(self):
+        self.make_order()
+        stats = expire_stale_pending_orders(24, dry_run=True, now=self.now)
+        self.assertEqual(stats, {'scanned': 1, 'expired': 0, 'batches': 1})
+        self.assertFalse(Order.objects.filter(status='expired').exists())
+
+    def test_expired_checkout_session_webhook(self):
+        pending = self.make_order(age=timedelta(minutes=5), session_id='cs_expired_1')
+        paid = self.make_order(status='paid', session_id='cs_expired_2')
+
+        for session_id in ('cs_expired_1', 'cs_expired_2'):
+            handle_checkout_session_expired(stripe.checkout.Session.construct_from({'id': session_id}, 'sk_test_fake'))
 
-# Create your tests here.
+        pending.refresh_from_db()
+        paid.refresh_from_db()
+        self.assertEqual((pending.status, paid.status), ('expired', 'paid'))
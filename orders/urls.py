@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('export.<str:export_format>', views.export_orders_view, name='export_orders'),
+    path('customer/', views.customer_order_history, name='customer_order_history'),
+]
@@ -1,32 +1,30 @@
-import os
-from email.mime.image import MIMEImage
-from django.core.mail import EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
-import mimetypes
+from notifications.images import email_image
+from notifications.outbox import queue_email, queue_templated_email
+
+# Values that differ between shipped emails; everything else in the body is shared,
+# so a day's shipments go out as a few Mailgun batch sends
+SHIPPED_EMAIL_MERGE_FIELDS = (
+    'customer_name', 'name', 'order_id', 'tracking_number', 'shipping_carrier', 'shipped_date',
+    'product_image', 'description', 'colors', 'order_items_html',
+)
 
 
 def send_order_confirmation_email(order):
-    """Send order confirmation email to customer and admin after successful checkout"""
+    """Queue the order confirmation email to customer and admin after successful checkout"""
     # Prepare order items with product details and collect images
     order_items = []
     images_to_embed = []
     item_index = 0
 
-    for item in order.items.all():
+    for item in order.items.select_related('product__category'):
         product = item.product
-        image_cid = None
-        image_path = None
-
-        # Get image file path for embedding
-        if product.primary_image:
-            image_path = product.primary_image.path
-            if os.path.exists(image_path):
-                image_cid = f'product{item_index}'
-                images_to_embed.append({
-                    'cid': image_cid,
-                    'path': image_path,
-                })
+
+        # Email-sized copy of the product photo: a hosted URL, or an inline attachment if embedding
+        image_src, attachment = email_image(product.primary_image, content_id=f'product{item_index}')
+        if attachment:
+            images_to_embed.append(attachment)
 
         order_items.append({
             'name': product.name,
@@ -35,7 +33,7 @@ def send_order_confirmation_email(order):
             'quantity': item.quantity,
             'unit_price': item.unit_price_decimal,
             'total_price': item.unit_price_decimal * item.quantity,
-            'image': f'cid:{image_cid}' if image_cid else None,
+            'image': image_src,
         })
         item_index += 1
 
@@ -78,29 +76,22 @@ def send_order_confirmation_email(order):
     subject = 'Order Confirmation - Spirit Beads'
     html_message = render_to_string('orders/order_confirmation_email.html', context)
 
-    # Create HTML email
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
+    # Queue HTML email; embedded images (if any) are attached when it is sent
+    return queue_email(
+        'order_confirmation',
+        subject,
+        html_message,
         to=[order.customer_email],  # Send to customer
         cc=[settings.DEFAULT_FROM_EMAIL],  # CC to admin (lynn.braveheart@thebeadedcase.com)
+        attachments=images_to_embed,
     )
-    email.content_subtype = 'html'
-
-    # Embed images as CID attachments
-    for img_data in images_to_embed:
-        with open(img_data['path'], 'rb') as f:
-            img = MIMEImage(f.read())
-            img.add_header('Content-ID', f'<{img_data["cid"]}>')
-            img.add_header('Content-Disposition', 'inline', filename=os.path.basename(img_data['path']))
-            email.attach(img)
 
-    email.send(fail_silently=False)
 
-
-def send_order_shipped_email(order):
-    """Send shipping confirmation email to customer"""
+def send_order_shipped_email(order, commit=True):
+    """
+    Queue the shipping confirmation email to customer.
+    With commit=False the email is returned unsaved, for queueing in bulk with queue_emails.
+    """
     # Prepare order items list
     order_items = []
     for item in order.items.all():
@@ -123,7 +114,7 @@ def send_order_shipped_email(order):
         'shipping_carrier': order.shipping_carrier,
         'shipped_date': order.shipped_at.strftime('%B %d, %Y') if order.shipped_at else '',
         'is_custom_order': order.is_custom_order,
-        'product_image': None,  # Will be set to 'cid:product_image' if image exists
+        'product_image': None,  # Set below if image exists
     }
 
     # For custom orders, add description and colors
@@ -135,31 +126,22 @@ def send_order_shipped_email(order):
     elif not order.is_custom_order:
         # For regular orders, add the items list
         context['order_items'] = order_items
+        context['order_items_html'] = render_to_string('orders/shipped_email_items.html', {'order_items': order_items})
 
-    # Render HTML email content
-    subject = 'Your Order Has Shipped! - Spirit Beads'
-    html_message = render_to_string('orders/shipped_email.html', context)
+    # Email-sized copy of the product photo if available
+    attachments = []
+    context['product_image'], attachment = email_image(order.product_image, content_id='product_image')
+    if attachment:
+        attachments.append(attachment)
 
-    # Create HTML email
-    email = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
+    subject = 'Your Order Has Shipped! - Spirit Beads'
+    return queue_templated_email(
+        'order_shipped',
+        subject,
+        'orders/shipped_email.html',
+        context,
         to=[order.customer_email],
+        merge_fields=SHIPPED_EMAIL_MERGE_FIELDS,
+        attachments=attachments,
+        commit=commit,
     )
-    email.content_subtype = 'html'
-
-    # Embed product image if available
-    if order.product_image and order.product_image.path and os.path.exists(order.product_image.path):
-        with open(order.product_image.path, 'rb') as f:
-            img = MIMEImage(f.read())
-            img.add_header('Content-ID', '<product_image>')
-            img.add_header('Content-Disposition', 'inline', filename=os.path.basename(order.product_image.path))
-            email.attach(img)
-        # Update context to reference the CID image
-        context['product_image'] = 'cid:product_image'
-        # Re-render with the image reference
-        html_message = render_to_string('orders/shipped_email.html', context)
-        email.body = html_message
-
-    email.send(fail_silently=False)
@@ -1,3 +1,72 @@
-from django.shortcuts import render
+from datetime import datetime, time
 
-# Create your views here.
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .export import CONTENT_TYPES, WRITERS, export_orders
+from .models import Order
+from .serializers import CustomerOrderSerializer
+from .services.lookup import customer_orders
+
+
+def _parse_when(value):
+    """An ISO date or datetime query parameter as an aware datetime (dates mean midnight)."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date/datetime: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def export_orders_view(request, export_format):
+    """
+    Stream orders with their items as CSV or NDJSON, for bookkeeping. Staff only.
+
+    Query parameters: since and until (ISO date or datetime; orders created in
+    [since, until)) and status (comma-separated, e.g. paid,shipped).
+    """
+    if export_format not in WRITERS:
+        raise Http404
+
+    try:
+        since = _parse_when(request.query_params['since']) if request.query_params.get('since') else None
+        until = _parse_when(request.query_params['until']) if request.query_params.get('until') else None
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    statuses = [value for value in request.query_params.get('status', '').split(',') if value]
+    valid_statuses = {value for value, _ in Order.STATUS_CHOICES}
+    if any(value not in valid_statuses for value in statuses):
+        return Response(
+            {'error': f"status must be one of: {', '.join(sorted(valid_statuses))}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    orders = export_orders(since=since, until=until, status=statuses)
+    response = StreamingHttpResponse(WRITERS[export_format](orders), content_type=CONTENT_TYPES[export_format])
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def customer_order_history(request):
+    """A customer's orders with their items, by email (case-insensitive). Staff only."""
+    email = request.query_params.get('email', '').strip()
+    if not email:
+        return Response({'error': 'email parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    orders = CustomerOrderSerializer(customer_orders(email), many=True).data
+    return Response({'email': email, 'count': len(orders), 'orders': orders})
@@ -1,3 +1,33 @@
 from django.contrib import admin
+from django.contrib import messages
+from django.utils import timezone
+from .models import WebhookEvent
 
-# Register your models here.
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'session_id', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['event_id', 'session_id']
+    readonly_fields = [
+        'event_id', 'event_type', 'session_id', 'payload', 'status', 'attempts', 'last_error',
+        'received_at', 'next_attempt_at', 'processed_at',
+    ]
+    actions = ['retry_events']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_events(self, request, queryset):
+        """Requeue failed or dead-lettered events for immediate processing"""
+        count = queryset.filter(status__in=['failed', 'dead']).update(
+            status='pending',
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(
+            request,
+            f"Requeued {count} webhook event(s)",
+            messages.SUCCESS if count > 0 else messages.WARNING
+        )
+    retry_events.short_description = "Retry selected failed/dead-lettered events"
@@ -0,0 +1,247 @@
+"""
+Server-side shopping cart kept in the cache and addressed by a signed token.
+
+Each change is validated against the one product it touches, and the cart keeps
+the resulting Stripe line items and totals so checkout can reuse them instead of
+re-validating every product from scratch.
+"""
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from products.models import Product
+
+CART_TOKEN_SALT = 'payments.cart'
+
+
+class CartNotFound(Exception):
+    """The cart token is invalid or the cart has expired."""
+
+
+def validate_cart_item(product_id, quantity, product):
+    """
+    Check a single cart line against current product state.
+    Returns a validation error dict, or None if the line can be purchased.
+    """
+    if not product_id or not quantity:
+        return {
+            "product_id": product_id or "unknown",
+            "error": "invalid_item_data",
+            "message": "Missing product_id or quantity"
+        }
+
+    if product is None:
+        return {
+            "product_id": product_id,
+            "error": "product_not_found",
+            "message": "This product is no longer available"
+        }
+
+    # Check if product is active
+    if not product.is_active:
+        return {
+            "product_id": product_id,
+            "error": "product_not_active",
+            "message": "This product is no longer available"
+        }
+
+    # Check if product is sold out
+    if product.is_sold_out:
+        return {
+            "product_id": product_id,
+            "error": "product_sold_out",
+            "message": "This product is currently sold out"
+        }
+
+    # Check inventory
+    if quantity > product.inventory_count:
+        return {
+            "product_id": product_id,
+            "error": "insufficient_inventory",
+            "message": f"Only {product.inventory_count} items available, but you requested {quantity}"
+        }
+
+    # Guard: ensure product has Stripe Price ID
+    if not product.stripe_price_id:
+        return {
+            "product_id": product_id,
+            "error": "payment_not_available",
+            "message": "Payment processing not available for this product"
+        }
+
+    return None
+
+
+def checkout_line(product, quantity):
+    """Snapshot of a validated cart line: everything checkout needs without the Product row."""
+    return {
+        "product_id": product.id,
+        "name": product.name,
+        "stripe_price_id": product.stripe_price_id,
+        "unit_price": product.price,
+        "quantity": quantity,
+        "product_updated_at": product.updated_at.isoformat(),
+    }
+
+
+def validate_cart(cart_items, products):
+    """
+    Validate every cart line against a {product_id: Product} mapping.
+    Returns (validated_items, validation_errors, total_amount).
+    """
+    validation_errors = []
+    validated_items = []
+    total_amount = 0
+
+    for cart_item in cart_items:
+        product_id = cart_item.get("product_id")
+        quantity = cart_item.get("quantity")
+        product = products.get(str(product_id)) if product_id else None
+
+        error = validate_cart_item(product_id, quantity, product)
+        if error:
+            validation_errors.append(error)
+            continue
+
+        # If all validations pass, add to validated items
+        validated_items.append(checkout_line(product, quantity))
+        total_amount += product.price * quantity
+
+    return validated_items, validation_errors, total_amount
+
+
+def cart_validation_error(validated_items, validation_errors):
+    """Return the error payload for a cart that cannot be checked out, or None."""
+    # If there are validation errors, return them
+    if validation_errors:
+        return {
+            "error": "Validation failed",
+            "message": "Some items in your cart are no longer available",
+            "details": validation_errors
+        }
+
+    # If no valid items, return error
+    if not validated_items:
+        return {
+            "error": "Validation failed",
+            "message": "No valid items in cart",
+            "details": []
+        }
+
+    return None
+
+
+def _cache_key(cart_id):
+    return f"payments:cart:{cart_id}"
+
+
+def create_cart():
+    """Create an empty cart and return (token, cart)."""
+    cart = {"id": uuid.uuid4().hex, "items": {}}
+    save_cart(cart)
+    return signing.dumps(cart["id"], salt=CART_TOKEN_SALT), cart
+
+
+def load_cart(token):
+    """Return the cart for a signed token, raising CartNotFound if invalid or expired."""
+    try:
+        cart_id = signing.loads(token, salt=CART_TOKEN_SALT)
+    except signing.BadSignature:
+        raise CartNotFound(token)
+
+    cart = cache.get(_cache_key(cart_id))
+    if cart is None:
+        raise CartNotFound(token)
+    return cart
+
+
+def save_cart(cart):
+    # Sliding expiry: every change keeps the cart alive for another CART_TTL
+    cache.set(_cache_key(cart["id"]), cart, settings.CART_TTL)
+
+
+def set_item_quantity(cart, product_id, quantity):
+    """
+    Set the quantity of one product in the cart, validating only that product.
+    A quantity of 0 removes the line. Returns a validation error dict or None.
+    """
+    product_id = str(product_id)
+    if quantity == 0:
+        cart["items"].pop(product_id, None)
+        save_cart(cart)
+        return None
+
+    product = Product.objects.filter(pk=product_id).first()
+    error = validate_cart_item(product_id, quantity, product)
+    if error:
+        return error
+
+    cart["items"][product_id] = checkout_line(product, quantity)
+    save_cart(cart)
+    return None
+
+
+def refresh_cart(cart):
+    """
+    Bring a cart up to date before checkout with one lightweight query.
+
+    Only products whose updated_at changed since they were validated are loaded
+    and re-checked; unchanged lines are reused as-is. Returns
+    (validated_items, validation_errors, total_amount).
+    """
+    lines = cart["items"]
+    current_versions = dict(
+        Product.objects.filter(pk__in=list(lines)).values_list("id", "updated_at")
+    )
+
+    stale_ids = [
+        product_id for product_id, line in lines.items()
+        if product_id not in current_versions
+        or current_versions[product_id].isoformat() != line["product_updated_at"]
+    ]
+    products = Product.objects.in_bulk(stale_ids) if stale_ids else {}
+
+    validated_items = []
+    validation_errors = []
+    for product_id, line in lines.items():
+        if product_id in stale_ids:
+            product = products.get(product_id)
+            error = validate_cart_item(product_id, line["quantity"], product)
+            if error:
+                validation_errors.append(error)
+                continue
+            line = checkout_line(product, line["quantity"])
+            lines[product_id] = line
+        validated_items.append(line)
+
+    if stale_ids:
+        save_cart(cart)
+
+    total_amount = sum(line["unit_price"] * line["quantity"] for line in validated_items)
+    return validated_items, validation_errors, total_amount
+
+
+def cart_summary(cart):
+    """Public representation of a cart, including the precomputed Stripe line items."""
+    items = list(cart["items"].values())
+    return {
+        "items": [
+            {
+                "product_id": line["product_id"],
+                "name": line["name"],
+                "unit_price": line["unit_price"],
+                "quantity": line["quantity"],
+                "line_total": line["unit_price"] * line["quantity"],
+            }
+            for line in items
+        ],
+        "line_items": [
+            {"price": line["stripe_price_id"], "quantity": line["quantity"]}
+            for line in items
+        ],
+        "item_count": sum(line["quantity"] for line in items),
+        "subtotal": sum(line["unit_price"] * line["quantity"] for line in items),
+        "currency": "usd",
+    }
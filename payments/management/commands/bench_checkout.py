@@ -0,0 +1,151 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from payments import views
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the sync and async checkout views under simulated Stripe and geo latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Number of checkouts to run against each view (default: 50)'
+        )
+        parser.add_argument(
+            '--stripe-latency',
+            type=float,
+            default=0.3,
+            help='Simulated Stripe Checkout Session latency in seconds (default: 0.3)'
+        )
+        parser.add_argument(
+            '--geo-latency',
+            type=float,
+            default=0.05,
+            help='Simulated ipinfo latency in seconds (default: 0.05)'
+        )
+        parser.add_argument(
+            '--sync-workers',
+            type=int,
+            default=4,
+            help='Worker threads serving the sync view, like a threaded WSGI server (default: 4)'
+        )
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        stripe_latency = options['stripe_latency']
+        geo_latency = options['geo_latency']
+
+        # The checkouts create products and orders: run them against a throwaway
+        # test database, never the configured (possibly production) one
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            sync_wall, sync_latencies, async_wall, async_latencies = self.run_checkouts(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(
+            f"Simulated Stripe latency {stripe_latency * 1000:.0f}ms, geo latency {geo_latency * 1000:.0f}ms, "
+            f"{total} checkouts per view"
+        )
+        self.report(f"sync ({options['sync_workers']} threads)", sync_wall, sync_latencies, total)
+        self.report('async (1 event loop)', async_wall, async_latencies, total)
+
+    def run_checkouts(self, options):
+        total = options['requests']
+        stripe_latency = options['stripe_latency']
+        geo_latency = options['geo_latency']
+
+        product = Product(
+            id=f"bench-{uuid.uuid4()}",
+            name='Checkout Benchmark',
+            slug=f"checkout-benchmark-{uuid.uuid4().hex[:8]}",
+            price=4500,
+            inventory_count=total * 10,
+            stripe_price_id='price_bench',
+        )
+        product._stripe_syncing = True  # Never touch the real Stripe API
+        product.save()
+
+        payload = json.dumps({"items": [{"product_id": product.id, "quantity": 1}]})
+
+        def fake_session_create(**params):
+            time.sleep(stripe_latency)
+            session_id = f"cs_bench_{uuid.uuid4().hex}"
+            return SimpleNamespace(id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+        def fake_country(request):
+            time.sleep(geo_latency)
+            return 'US'
+
+        async def fake_country_async(request):
+            await asyncio.sleep(geo_latency)
+            return 'US'
+
+        with mock.patch.object(views.stripe.checkout.Session, 'create', side_effect=fake_session_create), \
+                mock.patch.object(views, 'get_customer_country', fake_country), \
+                mock.patch.object(views, 'get_customer_country_async', fake_country_async):
+            sync_wall, sync_latencies = self.run_sync(payload, total, options['sync_workers'])
+            async_wall, async_latencies = self.run_async(payload, total)
+        return sync_wall, sync_latencies, async_wall, async_latencies
+
+    def run_sync(self, payload, total, workers):
+        factory = RequestFactory()
+
+        def one_checkout(_):
+            request = factory.post(
+                '/api/payments/create-checkout-session/', payload, content_type='application/json'
+            )
+            started = time.perf_counter()
+            try:
+                response = views.create_checkout_session(request)
+                assert response.status_code == 200, response.data
+            finally:
+                connection.close()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(one_checkout, range(total)))
+        return time.perf_counter() - started, latencies
+
+    def run_async(self, payload, total):
+        factory = AsyncRequestFactory()
+
+        async def one_checkout():
+            request = factory.post(
+                '/api/payments/create-checkout-session/async/', payload, content_type='application/json'
+            )
+            started = time.perf_counter()
+            response = await views.create_checkout_session_async(request)
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - started
+
+        async def run_all():
+            return await asyncio.gather(*(one_checkout() for _ in range(total)))
+
+        started = time.perf_counter()
+        latencies = asyncio.run(run_all())
+        return time.perf_counter() - started, latencies
+
+    def report(self, label, wall, latencies, total):
+        latencies = sorted(latencies)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(
+            f"  {label:<22} wall {wall:6.2f}s  throughput {total / wall:7.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.0f}ms  p95 {p95 * 1000:7.0f}ms"
+        )
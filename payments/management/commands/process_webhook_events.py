@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import claim_due_events, process_session_events
+
+
+class Command(BaseCommand):
+    help = 'Apply Stripe webhook events from the inbox, in order per checkout session'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.WEBHOOK_WORKERS,
+            help=f'Number of checkout sessions processed concurrently (default: {settings.WEBHOOK_WORKERS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Maximum events claimed per poll (default: 100)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the inbox is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the events that are currently due, then exit'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.stdout.write(f"Processing webhook events with {workers} worker(s)...")
+
+        processed = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook') as pool:
+            while True:
+                groups = claim_due_events(options['batch_size'])
+                if groups:
+                    # Each session's events run sequentially on one worker thread
+                    list(pool.map(process_session_events, groups))
+                    processed += sum(len(events) for events in groups)
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Handled {processed} webhook event(s)"))
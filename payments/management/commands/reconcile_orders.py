@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.management.utils import parse_when
+from payments.reconcile import reconcile_checkout_sessions
+
+
+class Command(BaseCommand):
+    help = 'Reconcile orders against Stripe Checkout Sessions and repair ones whose webhook was missed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only sessions created at or after this ISO date/datetime (default: 7 days ago)'
+        )
+        parser.add_argument(
+            '--until',
+            help='Only sessions created at or before this ISO date/datetime (default: now)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Sessions matched against orders per query (default: 200)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report discrepancies without changing any orders'
+        )
+
+    def handle(self, *args, **options):
+        until = parse_when(options['until'], end_of_day=True) or timezone.now()
+        since = parse_when(options['since']) or until - timedelta(days=7)
+        if since > until:
+            raise CommandError('--since must be before --until')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        report = reconcile_checkout_sessions(
+            since, until, batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+
+        for session_id, order_id, kind, detail in report['discrepancies']:
+            self.stdout.write(f"{kind}: session {session_id}, order {order_id or '-'}: {detail}")
+
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        style = self.style.WARNING if report['failed'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{prefix}Checked {report['sessions']} session(s), {report['matched']} matched to orders, "
+            f"{len(report['discrepancies'])} discrepancies; marked {report['marked_paid']} paid, "
+            f"expired {report['expired']}, repaired {report['repaired']}, {report['failed']} failed"
+        ))
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from payments.management.utils import parse_when
+from payments.models import WebhookEvent
+from payments.stripe import stripe
+from payments.webhooks import EVENT_HANDLERS, process_session_events, record_events
+
+
+class Command(BaseCommand):
+    help = 'Replay stored webhook events, or backfill events from Stripe, through the webhook handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=['inbox', 'stripe'],
+            default='inbox',
+            help='Replay events already in the inbox, or pull them from the Stripe events API (default: inbox)'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only events at or after this ISO date/datetime (default: 24 hours ago)'
+        )
+        parser.add_argument(
+            '--until',
+            help='Only events at or before this ISO date/datetime (default: now)'
+        )
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='types',
+            help='Event type to replay; repeatable (default: every type with a handler)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.WEBHOOK_WORKERS,
+            help=f'Number of checkout sessions processed concurrently (default: {settings.WEBHOOK_WORKERS})'
+        )
+        parser.add_argument(
+            '--include-processed',
+            action='store_true',
+            help='Also re-run events that were already processed successfully (handlers make this a no-op)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be replayed without running any handlers'
+        )
+
+    def handle(self, *args, **options):
+        until = parse_when(options['until'], end_of_day=True) or timezone.now()
+        since = parse_when(options['since']) or until - timedelta(hours=24)
+        if since > until:
+            raise CommandError('--since must be before --until')
+        types = options['types'] or list(EVENT_HANDLERS)
+
+        if options['source'] == 'stripe':
+            event_ids = self.backfill_from_stripe(since, until, types, options['dry_run'])
+            if options['dry_run']:
+                return
+            events = WebhookEvent.objects.filter(event_id__in=event_ids)
+        else:
+            events = WebhookEvent.objects.filter(
+                received_at__gte=since, received_at__lte=until, event_type__in=types
+            )
+
+        if not options['include_processed']:
+            events = events.exclude(status='processed')
+        # Events the inbox worker has claimed and whose lease hasn't run out are left to it
+        events = events.exclude(status='processing', next_attempt_at__gt=timezone.now())
+
+        if options['dry_run']:
+            self.stdout.write(f"{events.count()} event(s) would be replayed between {since.isoformat()} and {until.isoformat()}")
+            return
+
+        # Claim the events like the inbox worker does; rows another transaction has locked are skipped
+        with transaction.atomic():
+            events = list(events.select_for_update(skip_locked=True).order_by('received_at', 'id'))
+            WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(
+                status='processing',
+                next_attempt_at=timezone.now() + timedelta(seconds=settings.WEBHOOK_CLAIM_LEASE),
+            )
+
+        self.stdout.write(f"{len(events)} event(s) to replay between {since.isoformat()} and {until.isoformat()}")
+        if not events:
+            return
+
+        # Group by session so each session's events are still applied in order
+        groups = {}
+        for webhook_event in events:
+            groups.setdefault(webhook_event.session_id, []).append(webhook_event)
+
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='replay') as pool:
+            list(pool.map(process_session_events, groups.values()))
+
+        outcome = (
+            WebhookEvent.objects.filter(pk__in=[e.pk for e in events])
+            .values_list('status')
+            .annotate(count=Count('id'))
+            .order_by('status')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {len(events)} event(s) across {len(groups)} session(s): "
+            + ', '.join(f"{count} {status}" for status, count in outcome)
+        ))
+
+    def backfill_from_stripe(self, since, until, types, dry_run):
+        """Page through Stripe's events in the window and store any missing ones in the inbox."""
+        listing = stripe.Event.list(
+            created={'gte': int(since.timestamp()), 'lte': int(until.timestamp())},
+            types=types,
+            limit=100,
+        )
+        # Stripe lists newest first; store oldest first so per-session order is preserved
+        stripe_events = sorted(listing.auto_paging_iter(), key=lambda event: (event['created'], event['id']))
+        self.stdout.write(f"Fetched {len(stripe_events)} event(s) from Stripe")
+
+        if not dry_run:
+            record_events(stripe_events)
+        return [event['id'] for event in stripe_events]
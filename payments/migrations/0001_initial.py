@@ -0,0 +1,81 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_id",
+                    models.CharField(
+                        help_text="Stripe event id (evt_...)",
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                ("event_type", models.CharField(max_length=100)),
+                (
+                    "session_id",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Id of the event's object (checkout session); events sharing it are processed in order",
+                        max_length=255,
+                    ),
+                ),
+                ("payload", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("processed", "Processed"),
+                            ("failed", "Failed - will retry"),
+                            ("dead", "Dead-lettered"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["received_at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"],
+                        name="webhook_status_due_idx",
+                    ),
+                    models.Index(
+                        fields=["session_id", "received_at"], name="webhook_session_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -1,3 +1,46 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events.
+
+    The webhook view only inserts here and acknowledges; process_webhook_events
+    applies events in order per checkout session, with retries and dead-lettering.
+    """
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("processed", "Processed"),
+        ("failed", "Failed - will retry"),
+        ("dead", "Dead-lettered"),
+    )
+
+    event_id = models.CharField(max_length=255, unique=True, help_text="Stripe event id (evt_...)")
+    event_type = models.CharField(max_length=100)
+    session_id = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="Id of the event's object (checkout session); events sharing it are processed in order"
+    )
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_status_due_idx'),
+            models.Index(fields=['session_id', 'received_at'], name='webhook_session_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} - {self.status}"
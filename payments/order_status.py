@@ -0,0 +1,113 @@
+"""
+Order status for the checkout success page, looked up by Checkout Session id.
+
+The webhook handler caches a compact summary of the order as soon as it is
+paid, so the success page's polls are cache reads; shipping, expiry and
+reconciliation drop the cached summaries of the orders they change. A poll that misses the
+cache reads the order once and caches the result: for ORDER_STATUS_TTL once
+the order is settled, and for ORDER_STATUS_PENDING_TTL while it is still
+pending (or doesn't exist yet), so a polling page reaches the database at
+most once per short TTL.
+
+Summaries leave out the customer's email and address: the session id is
+the only credential.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from orders.models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Cached for unknown sessions, so repeated polls for them don't hit the database either
+NOT_FOUND = {'status': 'not_found'}
+
+POLL_INTERVAL = 0.5
+
+
+def _cache_key(session_id):
+    return f"payments:order-status:{session_id}"
+
+
+def order_summary(order):
+    """What the success page shows: status, items and totals (amounts in cents)."""
+    return {
+        'order_id': str(order.id),
+        'status': order.status,
+        'is_custom_order': order.is_custom_order,
+        'currency': order.currency,
+        'amount_total': order.amount_total,
+        'items': [
+            {
+                'product_id': item.product_id,
+                'name': item.product.name,
+                'unit_price': item.unit_price,
+                'quantity': item.quantity,
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def _ttl(summary):
+    if summary['status'] in ('pending', 'not_found'):
+        return settings.ORDER_STATUS_PENDING_TTL
+    return settings.ORDER_STATUS_TTL
+
+
+def cache_order_status(order):
+    """Store the order's summary for its session; call after the order changes state."""
+    summary = order_summary(order)
+    cache.set(_cache_key(order.stripe_session_id), summary, _ttl(summary))
+    return summary
+
+
+def forget_order_status(session_ids):
+    """
+    Drop the cached summaries of sessions whose orders were changed in bulk
+    (shipped, expired, repaired); the next poll reloads them from the database.
+    The orders are already saved, so a cache outage is only logged.
+    """
+    keys = [_cache_key(session_id) for session_id in session_ids if session_id]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Could not clear cached status of {len(keys)} order(s): {e}")
+
+
+def load_order_status(session_id):
+    """Summary from the database (two queries), cached for the next poll."""
+    order = (
+        Order.objects.filter(stripe_session_id=session_id)
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id')))
+        .first()
+    )
+    if order is None:
+        cache.set(_cache_key(session_id), NOT_FOUND, settings.ORDER_STATUS_PENDING_TTL)
+        return NOT_FOUND
+    return cache_order_status(order)
+
+
+async def wait_for_order_status(session_id, wait=0, known_status=None):
+    """
+    The order's summary, waiting up to ``wait`` seconds for its status to differ
+    from ``known_status`` (default: pending). Waiting polls the cache; the
+    database is only read when the cached entry has expired.
+    """
+    known_status = known_status or 'pending'
+    deadline = time.monotonic() + wait
+    while True:
+        summary = await cache.aget(_cache_key(session_id))
+        if summary is None:
+            summary = await sync_to_async(load_order_status)(session_id)
+        if summary['status'] != known_status or time.monotonic() >= deadline:
+            return summary
+        await asyncio.sleep(min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
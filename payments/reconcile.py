@@ -0,0 +1,150 @@
+"""
+Reconcile local orders against Stripe Checkout Sessions.
+
+Catches orders whose webhook never arrived: pending orders for sessions that
+were paid or expired, and paid orders whose details drifted from Stripe.
+Sessions are matched to orders a chunk at a time with one IN query, field
+repairs are written with one bulk UPDATE per chunk, and every write re-checks
+the order under a row lock so it can run alongside live webhook traffic.
+"""
+import logging
+from itertools import islice
+
+from django.db import transaction
+
+from orders.models import SHIPPING_COLUMNS, Order
+from .order_status import forget_order_status
+from .stripe import stripe
+from .webhooks import handle_checkout_session_completed, session_order_fields
+
+logger = logging.getLogger(__name__)
+
+PAID_PAYMENT_STATUSES = ('paid', 'no_payment_required')
+SETTLED_ORDER_STATUSES = ('paid', 'shipped')
+
+
+def session_is_paid(session):
+    return session.get('status') == 'complete' and session.get('payment_status') in PAID_PAYMENT_STATUSES
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def reconcile_checkout_sessions(since, until, batch_size=200, dry_run=False):
+    """
+    Compare every Checkout Session created in [since, until] with its order and repair drift.
+
+    Returns a report dict of counts plus ``discrepancies``: a list of
+    (session_id, order_id, kind, detail) tuples describing what was found.
+    """
+    report = {
+        'sessions': 0,
+        'matched': 0,
+        'marked_paid': 0,
+        'expired': 0,
+        'repaired': 0,
+        'failed': 0,
+        'discrepancies': [],
+    }
+    listing = stripe.checkout.Session.list(
+        created={'gte': int(since.timestamp()), 'lte': int(until.timestamp())},
+        limit=100,
+    )
+    for chunk in _chunks(listing.auto_paging_iter(), batch_size):
+        report['sessions'] += len(chunk)
+        _reconcile_chunk(chunk, report, dry_run)
+
+    logger.info(
+        f"Reconciled {report['sessions']} checkout session(s) from {since.isoformat()} to {until.isoformat()} "
+        f"(dry_run={dry_run}): {len(report['discrepancies'])} discrepancies, {report['marked_paid']} marked paid, "
+        f"{report['expired']} expired, {report['repaired']} repaired, {report['failed']} failed"
+    )
+    return report
+
+
+def _reconcile_chunk(sessions, report, dry_run):
+    def note(session_id, order_id, kind, detail):
+        report['discrepancies'].append((session_id, order_id, kind, detail))
+
+    orders = {
+        order.stripe_session_id: order
+        for order in Order.objects.filter(stripe_session_id__in=[session.id for session in sessions])
+    }
+
+    to_pay, to_expire, to_repair = [], [], {}
+    for session in sessions:
+        order = orders.get(session.id)
+        paid = session_is_paid(session)
+
+        if order is None:
+            if paid:
+                custom_request_id = (session.get('metadata') or {}).get('custom_request_id')
+                if custom_request_id:
+                    # The webhook creates custom orders, so the handler can rebuild a missing one
+                    note(session.id, None, 'missing_order', f"paid custom order {custom_request_id} has no order")
+                    to_pay.append(session)
+                else:
+                    note(session.id, None, 'missing_order', 'paid session has no order')
+            continue
+
+        report['matched'] += 1
+        if paid and order.status in SETTLED_ORDER_STATUSES:
+            expected = session_order_fields(session)
+            changed = {field: value for field, value in expected.items() if getattr(order, field) != value}
+            if changed:
+                note(session.id, order.id, 'field_mismatch', ', '.join(sorted(changed)))
+                to_repair[order.id] = changed
+        elif paid:
+            note(session.id, order.id, 'unpaid_order', f"order is {order.status} but session is paid")
+            to_pay.append(session)
+        elif session.get('status') == 'expired' and order.status == 'pending':
+            note(session.id, order.id, 'stale_pending', 'session expired')
+            to_expire.append(order)
+        elif order.status in SETTLED_ORDER_STATUSES:
+            note(
+                session.id, order.id, 'paid_without_payment',
+                f"order is {order.status} but session is {session.get('status')}/{session.get('payment_status')}"
+            )
+
+    if dry_run:
+        return
+
+    # Go through the webhook handler so inventory, emails and custom orders behave exactly as live;
+    # it locks the order and re-checks its status, so a webhook racing us can't apply it twice
+    for session in to_pay:
+        try:
+            handle_checkout_session_completed(session)
+            report['marked_paid'] += 1
+        except Exception as e:
+            logger.exception(f"Failed to mark session {session.id} paid: {e}")
+            report['failed'] += 1
+            note(session.id, getattr(orders.get(session.id), 'id', None), 'repair_failed', f"{type(e).__name__}: {e}")
+
+    if to_expire:
+        report['expired'] += Order.objects.filter(
+            id__in=[order.id for order in to_expire], status='pending'
+        ).update(status='expired')
+        forget_order_status(order.stripe_session_id for order in to_expire)
+
+    if to_repair:
+        with transaction.atomic():
+            locked = list(
+                Order.objects.select_for_update().filter(id__in=to_repair, status__in=SETTLED_ORDER_STATUSES)
+            )
+            fields = set()
+            for order in locked:
+                for field, value in to_repair[order.id].items():
+                    setattr(order, field, value)
+                    fields.add(field)
+            # bulk_update skips Order.save, which keeps the shipping columns in step with the address
+            if 'shipping_address' in fields:
+                for order in locked:
+                    order.set_shipping_columns()
+                fields.update(SHIPPING_COLUMNS)
+            if locked:
+                Order.objects.bulk_update(locked, sorted(fields))
+        report['repaired'] += len(locked)
+        forget_order_status(order.stripe_session_id for order in locked)
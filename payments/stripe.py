@@ -1,4 +1,131 @@
+"""
+Configured Stripe client shared by everything that talks to Stripe.
+
+Import ``stripe`` from this module rather than the library directly so every call
+goes through one keep-alive connection pool with explicit timeouts, the automatic
+retry policy, and per-endpoint latency/status recording.
+"""
+import logging
+import threading
+import time
+
+import requests
 import stripe
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from stripe.http_client import RequestsClient
+
+logger = logging.getLogger(__name__)
+
+
+def _endpoint_name(method, url):
+    """Collapse a Stripe URL to a per-endpoint key, e.g. 'POST /v1/checkout/sessions/{id}'."""
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    path = '/' + path.split('/', 1)[1] if '/' in path else '/'
+    segments = [
+        '{id}' if '_' in segment and any(char.isdigit() for char in segment) else segment
+        for segment in path.split('/')
+    ]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+class StripeCallStats:
+    """Thread-safe per-endpoint counters for Stripe API calls made by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, status, elapsed_ms):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'count': 0,
+                'errors': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'statuses': {},
+            })
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            status_key = str(status) if status is not None else 'connection_error'
+            stats['statuses'][status_key] = stats['statuses'].get(status_key, 0) + 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        """Return a copy of the counters with the average latency filled in."""
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = {
+                    **stats,
+                    'statuses': dict(stats['statuses']),
+                    'avg_ms': stats['total_ms'] / stats['count'] if stats['count'] else 0.0,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+call_stats = StripeCallStats()
+_call_hooks = []
+
+
+def register_call_hook(func):
+    """
+    Register ``func(endpoint, status, elapsed_ms)`` to run after every Stripe HTTP call.
+    ``status`` is None when the request failed before a response arrived.
+    """
+    _call_hooks.append(func)
+    return func
+
+
+class InstrumentedRequestsClient(RequestsClient):
+    """RequestsClient that times each HTTP attempt (including retries) per endpoint."""
+
+    name = "requests-instrumented"
+
+    def request(self, method, url, headers, post_data=None):
+        endpoint = _endpoint_name(method, url)
+        status = None
+        started = time.perf_counter()
+        try:
+            content, status, response_headers = super().request(method, url, headers, post_data)
+            return content, status, response_headers
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            call_stats.record(endpoint, status, elapsed_ms)
+            logger.debug(f"Stripe {endpoint} -> {status} in {elapsed_ms:.0f}ms")
+            for hook in _call_hooks:
+                try:
+                    hook(endpoint, status, elapsed_ms)
+                except Exception:
+                    logger.exception(f"Stripe call hook {hook!r} failed")
+
+
+def _build_session():
+    # One session shared by all threads keeps TLS connections alive between calls.
+    # Retries are handled by stripe-python (max_network_retries), not urllib3.
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    return session
+
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+
+# stripe-python sends an Idempotency-Key with every POST, so retrying connection
+# errors, 409s and 5xx responses is safe for all calls it makes.
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+
+stripe.default_http_client = InstrumentedRequestsClient(
+    session=_build_session(),
+    timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+)
@@ -1,3 +1,630 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from orders.services.expiry import expire_order_for_session, expire_stale_pending_orders
+from orders.services.shipping import TrackingUpdate, ship_orders
+from payments.models import WebhookEvent
+from payments.cart import load_cart, refresh_cart
+from payments.order_status import order_summary
+from payments.reconcile import reconcile_checkout_sessions
+from payments import stripe as stripe_client
+from payments.stripe import stripe
+from payments.webhooks import (
+    EVENT_HANDLERS, claim_due_events, handle_checkout_session_completed, process_event, process_session_events,
+)
+from products.models import Product
+
+
+class FakeStripeEvents:
+    """Stand-in for Stripe's events API: filters by created/types and pages like auto_paging_iter."""
+
+    def __init__(self, events):
+        self.events = [stripe.Event.construct_from(event, 'sk_test_fake') for event in events]
+        self.calls = 0
+
+    def list(self, created=None, types=None, limit=100, **params):
+        self.calls += 1
+        matching = [
+            event for event in self.events
+            if (not types or event['type'] in types)
+            and (not created or created['gte'] <= event['created'] <= created['lte'])
+        ]
+        # Newest first, like the real API
+        matching.sort(key=lambda event: event['created'], reverse=True)
+        return mock.Mock(auto_paging_iter=lambda: iter(matching))
+
+
+def completed_event(index, session_id, created):
+    return {
+        'id': f'evt_{index}',
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'created': created,
+        'data': {'object': {
+            'id': session_id,
+            'object': 'checkout.session',
+            'payment_intent': f'pi_{index}',
+            'amount_total': 4500,
+            'metadata': {},
+            'customer_details': {'email': f'customer{index}@example.com'},
+            'shipping_details': {'name': 'Test Customer', 'address': {'line1': '1 Main St', 'country': 'US'}},
+        }},
+    }
+
+
+class ReplayWebhookEventsTests(TransactionTestCase):
+    EVENT_COUNT = 1000
+
+    def setUp(self):
+        products = Product.objects.bulk_create([
+            Product(id=f'replay-{i}', name=f'Replay {i}', slug=f'replay-{i}', price=4000, inventory_count=2,
+                    stripe_price_id=f'price_{i}')
+            for i in range(self.EVENT_COUNT)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(id=uuid.uuid4(), stripe_session_id=f'cs_replay_{i}', amount_total=4000)
+            for i in range(self.EVENT_COUNT)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, unit_price=4000, quantity=1)
+            for order, product in zip(orders, products)
+        ])
+        created = int((timezone.now() - timedelta(hours=1)).timestamp())
+        self.fake_stripe = FakeStripeEvents([
+            completed_event(i, f'cs_replay_{i}', created + i % 60) for i in range(self.EVENT_COUNT)
+        ])
+
+    def replay(self):
+        call_command(
+            'replay_webhook_events', source='stripe', since=(timezone.now() - timedelta(days=1)).isoformat(),
+            workers=4, stdout=StringIO(),
+        )
+
+    def test_backfill_from_stripe_repairs_orders_once(self):
+        with mock.patch.object(stripe.Event, 'list', self.fake_stripe.list), \
+                mock.patch('orders.utils.send_order_confirmation_email') as send_email:
+            started = time.perf_counter()
+            self.replay()
+            elapsed = time.perf_counter() - started
+
+            self.assertEqual(Order.objects.filter(status='paid').count(), self.EVENT_COUNT)
+            self.assertEqual(Product.objects.filter(inventory_count=1).count(), self.EVENT_COUNT)
+            self.assertEqual(WebhookEvent.objects.filter(status='processed').count(), self.EVENT_COUNT)
+            self.assertEqual(send_email.call_count, self.EVENT_COUNT)
+            # Thousands of events per minute
+            self.assertLess(elapsed, 60 * self.EVENT_COUNT / 2000)
+
+            # A second run is a no-op
+            self.replay()
+
+            self.assertEqual(WebhookEvent.objects.count(), self.EVENT_COUNT)
+            self.assertEqual(Product.objects.filter(inventory_count=1).count(), self.EVENT_COUNT)
+            self.assertEqual(send_email.call_count, self.EVENT_COUNT)
+
+    def test_inbox_replay_skips_processed_events(self):
+        with mock.patch.object(stripe.Event, 'list', self.fake_stripe.list), \
+                mock.patch('orders.utils.send_order_confirmation_email') as send_email:
+            self.replay()
+            out = StringIO()
+            call_command('replay_webhook_events', workers=4, stdout=out)
+
+        self.assertIn('0 event(s) to replay', out.getvalue())
+        self.assertEqual(send_email.call_count, self.EVENT_COUNT)
+
+
+
+class WebhookInboxTests(TestCase):
+    """The webhook view stores events once; the worker applies them in order, with backoff and dead-lettering."""
+
+    def setUp(self):
+        self.order = Order.objects.create(id=uuid.uuid4(), stripe_session_id='cs_inbox_1', amount_total=4000)
+        # Worker threads close their connection; here that would be the test's own
+        patcher = mock.patch('payments.webhooks.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deliver(self, event):
+        with mock.patch.object(stripe.Webhook, 'construct_event',
+                               return_value=stripe.Event.construct_from(event, 'sk_test_fake')):
+            response = self.client.post('/api/payments/webhook/', b'{}', content_type='application/json',
+                                        HTTP_STRIPE_SIGNATURE='t=1,v1=fake')
+        self.assertEqual(response.status_code, 200)
+
+    def test_redelivered_events_are_applied_once(self):
+        event = completed_event(1, 'cs_inbox_1', int(time.time()))
+        with mock.patch('orders.utils.send_order_confirmation_email') as send_email:
+            for _ in range(3):
+                self.deliver(event)
+                for events in claim_due_events(10):
+                    process_session_events(events)
+
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        send_email.assert_called_once()
+
+    def test_a_session_waits_for_its_earlier_failed_event(self):
+        for index, session_id in enumerate(['cs_inbox_1', 'cs_inbox_1', 'cs_other']):
+            self.deliver(completed_event(index, session_id, int(time.time())))
+        first = WebhookEvent.objects.get(event_id='evt_0')
+
+        with mock.patch.dict(EVENT_HANDLERS, {'checkout.session.completed': mock.Mock(side_effect=ValueError)}):
+            [session_events, other_events] = claim_due_events(10)
+            process_session_events(session_events)
+
+        # The failed event is waiting out its retry delay; the session's later event is handed back
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'failed')
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_1').status, 'pending')
+        self.assertEqual(claim_due_events(10), [])
+
+        WebhookEvent.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('orders.utils.send_order_confirmation_email'):
+            [session_events] = claim_due_events(10)
+            self.assertEqual([e.event_id for e in session_events], ['evt_0', 'evt_1'])
+            process_session_events(session_events)
+        self.assertEqual(
+            list(WebhookEvent.objects.filter(session_id='cs_inbox_1').values_list('status', flat=True)),
+            ['processed', 'processed'],
+        )
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=3)
+    def test_failures_back_off_then_dead_letter(self):
+        self.deliver(completed_event(1, 'cs_inbox_1', int(time.time())))
+        webhook_event = WebhookEvent.objects.get()
+
+        delays = []
+        with mock.patch.dict(EVENT_HANDLERS, {'checkout.session.completed': mock.Mock(side_effect=ValueError('boom'))}):
+            for _ in range(3):
+                before = timezone.now()
+                self.assertFalse(process_event(webhook_event))
+                delays.append(round((webhook_event.next_attempt_at - before).total_seconds()))
+
+        webhook_event.refresh_from_db()
+        self.assertEqual(delays[:2], [30, 60])
+        self.assertEqual((webhook_event.status, webhook_event.attempts), ('dead', 3))
+        self.assertEqual(webhook_event.last_error, 'ValueError: boom')
+
+    def test_email_failure_rolls_back_the_order_for_a_retry(self):
+        self.deliver(completed_event(1, 'cs_inbox_1', int(time.time())))
+        webhook_event = WebhookEvent.objects.get()
+
+        with mock.patch('orders.utils.send_order_confirmation_email', side_effect=RuntimeError('template')):
+            self.assertFalse(process_event(webhook_event))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertEqual(webhook_event.status, 'failed')
+
+
+    def test_replay_leaves_events_leased_to_the_worker(self):
+        for index, session_id in enumerate(['cs_inbox_1', 'cs_other', 'cs_stale']):
+            self.deliver(completed_event(index, session_id, int(time.time())))
+        claim_due_events(1)
+        # A worker that died mid-batch: its lease has run out
+        WebhookEvent.objects.filter(event_id='evt_2').update(
+            status='processing', next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        out = StringIO()
+        call_command('replay_webhook_events', dry_run=True, stdout=out)
+
+        self.assertIn('2 event(s) would be replayed', out.getvalue())
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_0').status, 'processing')
+
+
+class OrderStatusTests(TestCase):
+    """The success page's status polls are served from the cache."""
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(id='status-1', name='Status Case', slug='status-case', price=4000)
+        self.order = Order.objects.create(id=uuid.uuid4(), stripe_session_id='cs_status_1', amount_total=4000)
+        OrderItem.objects.create(order=self.order, product=product, unit_price=4000, quantity=1)
+        self.url = '/api/payments/order-status/cs_status_1/'
+
+    def get(self, url=None, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url or self.url, params)
+        return response, len(queries)
+
+    def test_pending_polls_hit_the_database_once_per_ttl(self):
+        response, queries = self.get()
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(queries, 2)
+
+        response, queries = self.get()
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(queries, 0)
+
+    def test_webhook_caches_the_paid_summary(self):
+        self.get()
+        event = completed_event(1, 'cs_status_1', int(time.time()))
+        handle_checkout_session_completed(stripe.checkout.Session.construct_from(event['data']['object'], 'sk_test_fake'))
+
+        response, queries = self.get()
+        self.assertEqual(queries, 0)
+        summary = response.json()
+        self.assertEqual(summary['status'], 'paid')
+        self.assertEqual(summary['amount_total'], 4500)
+        self.assertEqual(summary['items'], [{'product_id': 'status-1', 'name': 'Status Case', 'unit_price': 4000, 'quantity': 1}])
+        self.assertNotIn('customer_email', summary)
+
+    def test_long_poll_returns_when_the_order_is_paid(self):
+        self.get()
+        self.order.status = 'paid'
+        paid = order_summary(self.order)
+        timer = threading.Timer(0.3, lambda: cache.set('payments:order-status:cs_status_1', paid, 60))
+        timer.start()
+        started = time.monotonic()
+        try:
+            response, _ = self.get(wait=10)
+        finally:
+            timer.cancel()
+        self.assertEqual(response.json()['status'], 'paid')
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_wait_must_be_a_finite_number(self):
+        for wait in ('nan', 'inf', '-inf', 'soon'):
+            with self.subTest(wait=wait):
+                response, _ = self.get(wait=wait)
+                self.assertEqual(response.status_code, 400)
+
+    def test_shipping_replaces_the_cached_paid_status(self):
+        event = completed_event(1, 'cs_status_1', int(time.time()))
+        handle_checkout_session_completed(stripe.checkout.Session.construct_from(event['data']['object'], 'sk_test_fake'))
+        self.assertEqual(self.get()[0].json()['status'], 'paid')
+
+        ship_orders({self.order.id: TrackingUpdate(None, '9400TRACK00001', 'USPS')}, notify=False)
+
+        self.assertEqual(self.get()[0].json()['status'], 'shipped')
+
+    def test_expiry_replaces_the_cached_pending_status(self):
+        other = Order.objects.create(id=uuid.uuid4(), stripe_session_id='cs_status_2', amount_total=4000)
+        other_url = '/api/payments/order-status/cs_status_2/'
+        for url in (self.url, other_url):
+            self.assertEqual(self.get(url)[0].json()['status'], 'pending')
+
+        # Stripe's expired-session webhook, then the sweep for the rest
+        self.assertEqual(expire_order_for_session(other.stripe_session_id), 1)
+        expire_stale_pending_orders(timedelta(0), now=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(self.get()[0].json()['status'], 'expired')
+        self.assertEqual(self.get(other_url)[0].json()['status'], 'expired')
+
+    def test_unknown_session(self):
+        response, _ = self.get('/api/payments/order-status/cs_missing/')
+        self.assertEqual(response.status_code, 404)
+        response, queries = self.get('/api/payments/order-status/cs_missing/')
+        self.assertEqual((response.status_code, queries), (404, 0))
+
+
+class CheckoutIdempotencyTests(TestCase):
+    """Duplicate checkout submissions are replayed; later purchases of the same cart get a new session."""
+
+    url = '/api/payments/create-checkout-session/'
+
+    def setUp(self):
+        cache.clear()
+        product = Product(id='idem-1', name='Idempotent', slug='idempotent', price=4000, inventory_count=10,
+                          stripe_price_id='price_idem')
+        product._stripe_syncing = True
+        product.save()
+        self.sessions = 0
+        create = mock.patch.object(stripe.checkout.Session, 'create', side_effect=self.fake_session)
+        self.create = create.start()
+        self.addCleanup(create.stop)
+
+    def fake_session(self, **params):
+        self.sessions += 1
+        session_id = f'cs_idem_{self.sessions}'
+        return SimpleNamespace(id=session_id, url=f'https://checkout.stripe.test/{session_id}')
+
+    def checkout(self, country='US', url=None, **headers):
+        return self.client.post(
+            url or self.url, {'items': [{'product_id': 'idem-1', 'quantity': 1}], 'client_token': 'tok_1'},
+            content_type='application/json', HTTP_CF_IPCOUNTRY=country, **headers,
+        )
+
+    def test_double_submit_is_replayed(self):
+        first, second = self.checkout(), self.checkout()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_duplicate_does_not_create_a_second_session(self):
+        duplicates = []
+
+        def slow_session(**params):
+            # Double-clicks arrive, on either view, while the first request is still waiting on Stripe
+            duplicates.append(self.checkout())
+            duplicates.append(self.checkout(url='/api/payments/create-checkout-session/async/'))
+            return self.fake_session(**params)
+
+        self.create.side_effect = slow_session
+        first = self.checkout()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([response.status_code for response in duplicates], [409, 409])
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        # Once the first one has finished, duplicates replay its session
+        self.assertEqual(self.checkout().json(), first.json())
+
+    def test_repeat_purchase_of_the_same_cart_gets_a_new_session(self):
+        first = self.checkout()
+        Order.objects.update(status='paid')
+
+        second = self.checkout()
+
+        self.assertNotEqual(second.json()['checkout_url'], first.json()['checkout_url'])
+        self.assertEqual(Order.objects.filter(status='pending').count(), 1)
+        # Derived keys would make Stripe return the paid session for 24 hours
+        for call in self.create.call_args_list:
+            self.assertNotIn('idempotency_key', call.kwargs)
+
+    def test_changed_params_with_the_same_cart_are_not_an_idempotency_error(self):
+        self.checkout(country='US')
+        cache.clear()
+
+        response = self.checkout(country='CA')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.create.call_count, 2)
+        shipping = self.create.call_args.kwargs['shipping_options'][0]['shipping_rate_data']
+        self.assertEqual(shipping['display_name'], 'North America Shipping')
+
+    def test_explicit_keys_are_sent_to_stripe(self):
+        self.checkout(HTTP_IDEMPOTENCY_KEY='attempt-1')
+        self.assertTrue(self.create.call_args.kwargs['idempotency_key'].startswith('checkout-'))
+
+
+class AsyncCheckoutTests(TestCase):
+    """The async checkout view accepts the same requests as the sync one."""
+
+    def setUp(self):
+        cache.clear()
+        product = Product(id='async-1', name='Async', slug='async', price=4000, inventory_count=10,
+                          stripe_price_id='price_async')
+        product._stripe_syncing = True
+        product.save()
+        create = mock.patch.object(
+            stripe.checkout.Session, 'create',
+            side_effect=lambda **params: SimpleNamespace(id='cs_async_1', url='https://checkout.stripe.test/cs_async_1'),
+        )
+        self.create = create.start()
+        self.addCleanup(create.stop)
+
+    def test_checks_out_a_server_side_cart(self):
+        cart = self.client.post(
+            '/api/payments/cart/', {'items': [{'product_id': 'async-1', 'quantity': 2}]}, content_type='application/json',
+        ).json()
+
+        for url in ('/api/payments/create-checkout-session/', '/api/payments/create-checkout-session/async/'):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'cart_token': cart['cart_token']}, content_type='application/json', HTTP_CF_IPCOUNTRY='US',
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.create.call_args.kwargs['line_items'], [{'price': 'price_async', 'quantity': 2}])
+
+        response = self.client.post(
+            '/api/payments/create-checkout-session/async/', {'cart_token': 'bogus'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ReconcileShippingColumnsTests(TestCase):
+    """Addresses repaired by reconciliation update the order's shipping columns too."""
+
+    def test_repaired_address_updates_shipping_columns(self):
+        order = Order.objects.create(
+            id=uuid.uuid4(), stripe_session_id='cs_reconcile_1', amount_total=4500, status='paid',
+            stripe_payment_intent='pi_1', customer_email='customer1@example.com',
+            shipping_address={'name': 'Test Customer', 'line1': '1 Main St', 'country': 'US', 'state': 'NY',
+                              'postal_code': '10001'},
+        )
+        session = completed_event(1, 'cs_reconcile_1', int(time.time()))['data']['object']
+        session.update(status='complete', payment_status='paid')
+        session['shipping_details']['address'] = {
+            'line1': '2 King St', 'country': 'CA', 'state': 'ON', 'postal_code': 'M5H 1A1',
+        }
+        listing = mock.Mock(auto_paging_iter=lambda: iter([stripe.checkout.Session.construct_from(session, 'sk_test_fake')]))
+
+        with mock.patch.object(stripe.checkout.Session, 'list', return_value=listing):
+            report = reconcile_checkout_sessions(timezone.now() - timedelta(days=1), timezone.now())
+
+        self.assertEqual(report['repaired'], 1)
+        order.refresh_from_db()
+        self.assertEqual(order.shipping_address['line1'], '2 King St')
+        self.assertEqual(
+            (order.shipping_country, order.shipping_state, order.shipping_postal_code), ('CA', 'ON', 'M5H 1A1'),
+        )
+
+
+class FakeStripeTransport(requests.adapters.HTTPAdapter):
+    """Transport adapter that answers with queued (status, body) pairs and records each send."""
+
+    def __init__(self, *responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.sends = []
+
+    def send(self, request, **kwargs):
+        self.sends.append((request, kwargs))
+        status, body = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers['Content-Type'] = 'application/json'
+        response.request = request
+        response.url = request.url
+        return response
+
+
+class StripeClientTests(TestCase):
+    """Stripe calls go through one shared session with timeouts, retries and per-endpoint stats."""
+
+    CUSTOMER = {'id': 'cus_123', 'object': 'customer'}
+    SERVER_ERROR = {'error': {'type': 'api_error', 'message': 'Try again'}}
+
+    def setUp(self):
+        stripe_client.call_stats.reset()
+        self.calls = []
+        hook = stripe_client.register_call_hook(lambda *call: self.calls.append(call))
+        self.addCleanup(stripe_client._call_hooks.remove, hook)
+        no_backoff = mock.patch.object(stripe.http_client.HTTPClient, '_sleep_time_seconds', return_value=0)
+        no_backoff.start()
+        self.addCleanup(no_backoff.stop)
+
+    def transport(self, *responses):
+        transport = FakeStripeTransport(*responses)
+        session = stripe.default_http_client._session
+        session.mount('https://api.stripe.com', transport)
+        self.addCleanup(session.adapters.pop, 'https://api.stripe.com')
+        return transport
+
+    def retrieve(self):
+        return stripe.Customer.retrieve('cus_123', api_key='sk_test_fake')
+
+    def test_retries_with_timeouts_and_records_each_attempt(self):
+        transport = self.transport((500, self.SERVER_ERROR), (200, self.CUSTOMER), (200, self.CUSTOMER))
+        session = stripe.default_http_client._session
+
+        with mock.patch.object(session, 'request', wraps=session.request) as session_request:
+            self.assertEqual(self.retrieve().id, 'cus_123')
+            self.assertEqual(self.retrieve().id, 'cus_123')
+
+        # Every attempt of both calls went through the one shared session (and its pool)
+        self.assertEqual(session_request.call_count, 3)
+
+        self.assertEqual(len(transport.sends), 3)
+        for _, kwargs in transport.sends:
+            self.assertEqual(kwargs['timeout'], (settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT))
+        stats = stripe_client.call_stats.snapshot()['GET /v1/customers/{id}']
+        self.assertEqual((stats['count'], stats['errors'], stats['statuses']), (3, 1, {'500': 1, '200': 2}))
+        self.assertEqual([status for _, status, _ in self.calls], [500, 200, 200])
+        self.assertEqual({endpoint for endpoint, _, _ in self.calls}, {'GET /v1/customers/{id}'})
+
+    def test_gives_up_after_max_network_retries(self):
+        transport = self.transport(*[(500, self.SERVER_ERROR)] * 5)
+
+        with self.assertRaises(stripe.error.APIError):
+            self.retrieve()
+
+        self.assertEqual(stripe.max_network_retries, settings.STRIPE_MAX_NETWORK_RETRIES)
+        self.assertEqual(len(transport.sends), settings.STRIPE_MAX_NETWORK_RETRIES + 1)
+
+
+class CartTests(TestCase):
+    """Server-side carts: signed tokens, line-by-line validation, re-validation of changed products, expiry."""
+
+    def setUp(self):
+        cache.clear()
+        self.products = {}
+        for product_id, price in (('cart-1', 4000), ('cart-2', 2500)):
+            product = Product(id=product_id, name=f'Cart {product_id}', slug=product_id, price=price,
+                              inventory_count=5, stripe_price_id=f'price_{product_id}')
+            product._stripe_syncing = True
+            product.save()
+            self.products[product_id] = product
+
+    def create(self, *items):
+        response = self.client.post(
+            '/api/payments/cart/', {'items': [{'product_id': p, 'quantity': q} for p, q in items]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def update_product(self, product_id, **fields):
+        product = Product.objects.get(pk=product_id)
+        for field, value in fields.items():
+            setattr(product, field, value)
+        product._stripe_syncing = True
+        product.save()
+
+    def test_token_is_signed(self):
+        token = self.create(('cart-1', 1))['cart_token']
+        self.assertEqual(self.client.get(f'/api/payments/cart/{token}/').status_code, 200)
+
+        cart_id = signing.loads(token, salt='payments.cart')
+        for forged in (token[:-2] + ('AA' if not token.endswith('AA') else 'BB'), signing.dumps(cart_id)):
+            with self.subTest(token=forged):
+                response = self.client.get(f'/api/payments/cart/{forged}/')
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['error'], 'cart_not_found')
+
+    def test_add_update_and_remove(self):
+        cart = self.create(('cart-1', 1), ('missing', 1))
+        self.assertEqual([error['error'] for error in cart['errors']], ['product_not_found'])
+        token = cart['cart_token']
+        base = f'/api/payments/cart/{token}/items/'
+
+        cart = self.client.post(base, {'product_id': 'cart-1', 'quantity': 2}, content_type='application/json').json()
+        self.assertEqual((cart['item_count'], cart['subtotal']), (3, 12000))
+
+        cart = self.client.put(f'{base}cart-2/', {'quantity': 2}, content_type='application/json').json()
+        self.assertEqual(cart['line_items'], [
+            {'price': 'price_cart-1', 'quantity': 3}, {'price': 'price_cart-2', 'quantity': 2},
+        ])
+
+        response = self.client.put(f'{base}cart-2/', {'quantity': 6}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'][0]['error'], 'insufficient_inventory')
+
+        cart = self.client.delete(f'{base}cart-1/').json()
+        self.assertEqual([item['product_id'] for item in cart['items']], ['cart-2'])
+        self.assertEqual(cart['subtotal'], 5000)
+
+    def test_checkout_revalidates_only_changed_products(self):
+        token = self.create(('cart-1', 2), ('cart-2', 1))['cart_token']
+        cart = load_cart(token)
+
+        with CaptureQueriesContext(connection) as queries:
+            validated, errors, total = refresh_cart(cart)
+        self.assertEqual((len(queries), errors, total), (1, [], 10500))
+
+        self.update_product('cart-2', price=3000)
+        validated, errors, total = refresh_cart(load_cart(token))
+        self.assertEqual((errors, total), ([], 11000))
+        # The refreshed line is stored, so the next checkout doesn't re-check it again
+        self.assertEqual(load_cart(token)['items']['cart-2']['unit_price'], 3000)
+
+        self.update_product('cart-1', inventory_count=1)
+        validated, errors, total = refresh_cart(load_cart(token))
+        self.assertEqual([error['error'] for error in errors], ['insufficient_inventory'])
+        self.assertEqual([line['product_id'] for line in validated], ['cart-2'])
+
+    def test_carts_expire_after_ttl_since_last_change(self):
+        token = self.create(('cart-1', 1))['cart_token']
+        created = time.time()
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=created + settings.CART_TTL - 60):
+            # A change slides the expiry forward
+            self.client.put(f'/api/payments/cart/{token}/items/cart-1/', {'quantity': 2}, content_type='application/json')
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=created + settings.CART_TTL + 60):
+            self.assertEqual(load_cart(token)['items']['cart-1']['quantity'], 2)
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=created + 2 * settings.CART_TTL):
+            self.assertEqual(self.client.get(f'/api/payments/cart/{token}/').status_code, 404)
@@ -1,7 +1,16 @@
 from django.urls import path
-from .views import create_checkout_session, stripe_webhook
+from .views import (
+    create_checkout_session, create_checkout_session_async, stripe_webhook,
+    create_cart_view, cart_detail, add_cart_item, cart_item, order_status,
+)
 
 urlpatterns = [
     path("create-checkout-session/", create_checkout_session),
+    path("create-checkout-session/async/", create_checkout_session_async),
     path("webhook/", stripe_webhook),
+    path("cart/", create_cart_view),
+    path("cart/<str:token>/", cart_detail),
+    path("cart/<str:token>/items/", add_cart_item),
+    path("cart/<str:token>/items/<str:product_id>/", cart_item),
+    path("order-status/<str:session_id>/", order_status),
 ]
@@ -1,20 +1,72 @@
 import uuid
+import json
+import asyncio
+import hashlib
+import math
 import requests
+import httpx
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.http import HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.db import transaction
 from .stripe import stripe
+from .order_status import wait_for_order_status
+from .webhooks import record_event
 from orders.models import Order, OrderItem
 from products.models import Product
+from .cart import (
+    CartNotFound, cart_summary, cart_validation_error, create_cart, load_cart,
+    refresh_cart, set_item_quantity, validate_cart,
+)
 from decimal import Decimal
 import os
 
 logger = logging.getLogger(__name__)
 
+# Shipping costs in cents by destination
+SHIPPING_COST_USA = 500  # $5.00
+SHIPPING_COST_CANADA_MEXICO = 1500  # $15.00
+SHIPPING_COST_INTERNATIONAL = 2000  # $20.00
+
+# How long (seconds) a checkout holds its idempotency key while creating the session;
+# covers Stripe's read timeout, in case the request dies without releasing it
+CHECKOUT_CLAIM_TIMEOUT = 60
+
+# Allow shipping to most countries - Stripe requires explicit country list
+ALLOWED_SHIPPING_COUNTRIES = [
+    "US", "CA", "GB", "AU", "DE", "FR", "ES", "IT", "NL", "BE", "AT", "CH",
+    "IE", "PT", "SE", "NO", "DK", "FI", "PL", "CZ", "GR", "HU", "RO",
+    "BG", "HR", "SI", "SK", "LT", "LV", "EE", "MX", "BR", "AR", "CL",
+    "CO", "PE", "UY", "NZ", "JP", "SG", "HK", "KR", "TW", "MY", "TH",
+    "ID", "PH", "VN", "IN", "IL", "AE", "ZA", "NG", "KE", "EG", "MA",
+    "TN", "ZA", "IS", "NO", "LU", "MT", "CY"
+]
+
+PAYMENT_SETUP_HINT = "If this mentions 'No such price', your product.stripe_price_id in the database likely belongs to Stripe Test mode while the backend is using a Live secret key (or vice versa)."
+
+def _get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+def _ipinfo_url(ip):
+    # Get ipinfo token from env if available (optional, increases rate limits)
+    ipinfo_token = os.getenv('IPINFO_TOKEN')
+
+    # Build URL with or without token
+    if ipinfo_token:
+        return f'https://ipinfo.io/{ip}?token={ipinfo_token}'
+    return f'https://ipinfo.io/{ip}'  # No token = lower rate limits
+
 def get_customer_country(request):
     """
     Detect customer country from IP address.
@@ -27,22 +79,7 @@ def get_customer_country(request):
 
     # Fall back to ipinfo.io API
     try:
-        # Get client IP
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-
-        # Get ipinfo token from env if available (optional, increases rate limits)
-        ipinfo_token = os.getenv('IPINFO_TOKEN')
-
-        # Build URL with or without token
-        if ipinfo_token:
-            url = f'https://ipinfo.io/{ip}?token={ipinfo_token}'
-        else:
-            url = f'https://ipinfo.io/{ip}'  # No token = lower rate limits
-
+        url = _ipinfo_url(_get_client_ip(request))
         response = requests.get(url, timeout=2)
         if response.status_code == 200:
             data = response.json()
@@ -52,197 +89,304 @@ def get_customer_country(request):
 
     return 'US'  # Default to US
 
-@csrf_exempt
-@api_view(["POST"])
-@authentication_classes([])
-@permission_classes([AllowAny])
-def create_checkout_session(request):
-    cart_items = request.data.get("items")
+# One pooled async HTTP client per event loop, shared by all in-flight checkouts
+_async_http_clients = {}
+
+def get_async_http_client():
+    """Return the shared keep-alive httpx client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None:
+        # Drop clients whose loop has gone away (e.g. async_to_sync under WSGI)
+        for stale_loop in [l for l in _async_http_clients if l.is_closed()]:
+            del _async_http_clients[stale_loop]
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(2.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _async_http_clients[loop] = client
+    return client
 
-    if not cart_items:
-        return Response({"error": "Validation failed", "message": "No items provided", "details": []}, status=400)
+async def get_customer_country_async(request):
+    """Async counterpart of get_customer_country using the shared HTTP client."""
+    cf_country = request.META.get('HTTP_CF_IPCOUNTRY')
+    if cf_country:
+        return cf_country
 
-    # Validate all cart items before processing
-    validation_errors = []
-    validated_items = []
-    total_amount = 0
+    try:
+        url = _ipinfo_url(_get_client_ip(request))
+        response = await get_async_http_client().get(url)
+        if response.status_code == 200:
+            data = response.json()
+            return data.get('country', 'US')
+    except Exception:
+        pass  # Silently fall back to US
 
-    for cart_item in cart_items:
-        product_id = cart_item.get("product_id")
-        quantity = cart_item.get("quantity")
+    return 'US'  # Default to US
 
-        if not product_id or not quantity:
-            validation_errors.append({
-                "product_id": product_id or "unknown",
-                "error": "invalid_item_data",
-                "message": "Missing product_id or quantity"
-            })
-            continue
+def get_checkout_idempotency_key(request, data, cart_items):
+    """
+    Build the idempotency key for a checkout attempt.
+
+    Uses the client-supplied Idempotency-Key header when present, otherwise derives
+    one from the client token plus a normalized hash of the cart so double-clicks
+    and retries of the same cart map to the same key. Returns (key, explicit), or
+    (None, False) when the client sent neither, in which case checkout is not
+    deduplicated.
+
+    Only explicit keys are sent to Stripe, which honours them for 24 hours. A
+    derived key only replays the local response (for CHECKOUT_IDEMPOTENCY_TTL):
+    buying the same cart again later, or from another country, must create a new
+    session rather than get the old one back or an idempotency error.
+    """
+    origin = request.META.get('HTTP_ORIGIN', '').rstrip('/')
+    explicit_key = request.META.get('HTTP_IDEMPOTENCY_KEY') or data.get('idempotency_key')
+
+    if explicit_key:
+        material = ['key', str(explicit_key), origin]
+    else:
+        client_token = request.META.get('HTTP_X_CLIENT_TOKEN') or data.get('client_token')
+        if not client_token:
+            return None, False
+
+        # Normalize the cart: merge duplicate lines and ignore ordering
+        quantities = {}
+        for cart_item in cart_items:
+            product_id = str(cart_item.get("product_id"))
+            try:
+                quantity = int(cart_item.get("quantity") or 0)
+            except (TypeError, ValueError):
+                quantity = 0
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        material = ['cart', str(client_token), origin, sorted(quantities.items())]
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            validation_errors.append({
-                "product_id": product_id,
-                "error": "product_not_found",
-                "message": "This product is no longer available"
-            })
-            continue
+    digest = hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+    return f"checkout-{digest}", bool(explicit_key)
 
-        # Check if product is active
-        if not product.is_active:
-            validation_errors.append({
-                "product_id": product_id,
-                "error": "product_not_active",
-                "message": "This product is no longer available"
-            })
-            continue
+def _checkout_cache_key(idempotency_key):
+    return f"payments:{idempotency_key}"
 
-        # Check if product is sold out
-        if product.is_sold_out:
-            validation_errors.append({
-                "product_id": product_id,
-                "error": "product_sold_out",
-                "message": "This product is currently sold out"
-            })
-            continue
+def _replayable_checkout(cached):
+    """A cached checkout response is only replayed while its order is still awaiting payment."""
+    return cached is not None and Order.objects.filter(id=cached["order_id"], status="pending").exists()
 
-        # Check inventory
-        if quantity > product.inventory_count:
-            validation_errors.append({
-                "product_id": product_id,
-                "error": "insufficient_inventory",
-                "message": f"Only {product.inventory_count} items available, but you requested {quantity}"
-            })
-            continue
+async def _replayable_checkout_async(cached):
+    return cached is not None and await Order.objects.filter(id=cached["order_id"], status="pending").aexists()
 
-        # Guard: ensure product has Stripe Price ID
-        if not product.stripe_price_id:
-            validation_errors.append({
-                "product_id": product_id,
-                "error": "payment_not_available",
-                "message": "Payment processing not available for this product"
-            })
-            continue
+def _checkout_claim_key(idempotency_key):
+    return f"payments:{idempotency_key}:in-flight"
 
-        # If all validations pass, add to validated items
-        validated_items.append({
-            "product": product,
-            "quantity": quantity,
-            "cart_item": cart_item
-        })
-        total_amount += product.price * quantity
-
-    # If there are validation errors, return them
-    if validation_errors:
-        return Response({
-            "error": "Validation failed",
-            "message": "Some items in your cart are no longer available",
-            "details": validation_errors
-        }, status=400)
-
-    # If no valid items, return error
-    if not validated_items:
-        return Response({
-            "error": "Validation failed", 
-            "message": "No valid items in cart",
-            "details": []
-        }, status=400)
-
-    order_id = uuid.uuid4()
+def _replay_response(cached, response_class):
+    response = response_class({"checkout_url": cached["checkout_url"]})
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+def _in_flight_response(response_class):
+    return response_class(
+        {"error": "duplicate_request", "message": "This checkout is already being created; retry shortly"},
+        status=409,
+    )
 
+def build_shipping_options(customer_country):
+    """Set up the shipping option offered for the detected country."""
+    if customer_country == 'US':
+        # USA customer - show $5 shipping
+        return [{
+            "shipping_rate_data": {
+                "display_name": "USA Shipping",
+                "fixed_amount": {"amount": SHIPPING_COST_USA, "currency": "usd"},
+                "type": "fixed_amount",
+                "delivery_estimate": {
+                    "minimum": {"unit": "business_day", "value": 3},
+                    "maximum": {"unit": "business_day", "value": 5},
+                },
+                "tax_behavior": "exclusive",
+                "tax_code": "txcd_92010001",
+            }
+        }]
+    elif customer_country in ['CA', 'MX']:
+        # Canada/Mexico customer - show $15 shipping
+        return [{
+            "shipping_rate_data": {
+                "display_name": "North America Shipping",
+                "fixed_amount": {"amount": SHIPPING_COST_CANADA_MEXICO, "currency": "usd"},
+                "type": "fixed_amount",
+                "delivery_estimate": {
+                    "minimum": {"unit": "business_day", "value": 5},
+                    "maximum": {"unit": "business_day", "value": 10},
+                },
+                "tax_behavior": "exclusive",
+            }
+        }]
+    # International customer - show $20 shipping
+    return [{
+        "shipping_rate_data": {
+            "display_name": "International Shipping",
+            "fixed_amount": {"amount": SHIPPING_COST_INTERNATIONAL, "currency": "usd"},
+            "type": "fixed_amount",
+            "delivery_estimate": {
+                "minimum": {"unit": "business_day", "value": 10},
+                "maximum": {"unit": "business_day", "value": 20},
+            },
+            "tax_behavior": "exclusive",
+        }
+    }]
+
+def build_checkout_session_params(validated_items, shipping_options, origin, idempotency_key=None):
+    """Build the keyword arguments for stripe.checkout.Session.create."""
     # Create line items for Stripe
     line_items = []
     for item in validated_items:
-        product = item["product"]
-        quantity = item["quantity"]
-
         line_items.append({
-            "price": product.stripe_price_id,
-            "quantity": quantity,
+            "price": item["stripe_price_id"],
+            "quantity": item["quantity"],
         })
 
+    params = {
+        "mode": "payment",
+        "payment_method_types": ["card"],
+        "line_items": line_items,
+        "shipping_options": shipping_options,
+        "success_url": f"{origin}/success?session_id={{CHECKOUT_SESSION_ID}}",
+        "cancel_url": f"{origin}/cancel",
+        "shipping_address_collection": {
+            "allowed_countries": ALLOWED_SHIPPING_COUNTRIES
+        },
+    }
+
+    # Stripe returns the original session for a repeated idempotency key
+    if idempotency_key:
+        params["idempotency_key"] = idempotency_key
+
+    return params
+
+def get_request_origin(request):
     # Get origin from request for dynamic redirects
     origin = request.META.get('HTTP_ORIGIN', 'http://localhost:8080')
     # Remove trailing slash for consistent URL construction
-    origin = origin.rstrip('/')
+    return origin.rstrip('/')
+
+def get_checkout_items(data):
+    """
+    Return (cart, cart_items) for a checkout request: a server-side cart named by
+    "cart_token" (cart is then the loaded cart), or raw "items" (cart is None).
+    Raises CartNotFound for an unknown or expired cart token.
+    """
+    cart_token = data.get("cart_token")
+    if not cart_token:
+        return None, data.get("items")
+    cart = load_cart(cart_token)
+    cart_items = [
+        {"product_id": line["product_id"], "quantity": line["quantity"]}
+        for line in cart["items"].values()
+    ]
+    return cart, cart_items
+
+def create_pending_order(session, validated_items, total_amount):
+    """
+    Create the pending Order and its OrderItems for a Checkout Session.
+
+    Orders are keyed by session id: a concurrent duplicate gets the same session back
+    from Stripe, so it reuses the existing order instead of creating an orphan one.
+    """
+    with transaction.atomic():
+        # Product total only - shipping will be added in webhook when customer selects option
+        order, created = Order.objects.get_or_create(
+            stripe_session_id=session.id,
+            defaults={
+                "id": uuid.uuid4(),
+                "amount_total": total_amount,  # Will be updated in webhook with shipping
+                "currency": "usd",
+                "status": "pending",
+            },
+        )
+
+        if created:
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=item["product_id"],
+                    unit_price=item["unit_price"],
+                    quantity=item["quantity"],
+                )
+                for item in validated_items
+            ])
+
+    return order
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def create_checkout_session(request):
+    # Checkout either a server-side cart (already validated line by line) or raw items
+    try:
+        cart, cart_items = get_checkout_items(request.data)
+    except CartNotFound:
+        return Response({"error": "cart_not_found", "message": "Cart not found or expired"}, status=404)
+
+    if not cart_items:
+        return Response({"error": "Validation failed", "message": "No items provided", "details": []}, status=400)
+
+    # Replay the earlier response for duplicate submissions of the same checkout
+    idempotency_key, explicit_key = get_checkout_idempotency_key(request, request.data, cart_items)
+    if idempotency_key:
+        cached = cache.get(_checkout_cache_key(idempotency_key))
+        if _replayable_checkout(cached):
+            return _replay_response(cached, Response)
+        # Claim the key so a concurrent duplicate can't create a second session meanwhile
+        if not cache.add(_checkout_claim_key(idempotency_key), True, CHECKOUT_CLAIM_TIMEOUT):
+            cached = cache.get(_checkout_cache_key(idempotency_key))
+            if _replayable_checkout(cached):
+                return _replay_response(cached, Response)
+            return _in_flight_response(Response)
+
+    try:
+        return _create_checkout_session(request, cart, cart_items, idempotency_key, explicit_key)
+    finally:
+        if idempotency_key:
+            cache.delete(_checkout_claim_key(idempotency_key))
+
+def _create_checkout_session(request, cart, cart_items, idempotency_key, explicit_key):
+    """Validate the cart, then create the Checkout Session and its pending order."""
+    # Validate all cart items before processing
+    if cart is not None:
+        validated_items, validation_errors, total_amount = refresh_cart(cart)
+    else:
+        product_ids = [str(item.get("product_id")) for item in cart_items if item.get("product_id")]
+        products = Product.objects.in_bulk(product_ids)
+        validated_items, validation_errors, total_amount = validate_cart(cart_items, products)
+
+    error = cart_validation_error(validated_items, validation_errors)
+    if error:
+        return Response(error, status=400)
+
+    origin = get_request_origin(request)
 
     # Detect customer country from IP address
     customer_country = get_customer_country(request)
 
     # Set up shipping option based on detected country
-    SHIPPING_COST_USA = 500  # $5.00
-    SHIPPING_COST_CANADA_MEXICO = 1500  # $15.00
-    SHIPPING_COST_INTERNATIONAL = 2000  # $20.00
-
     shipping_options = []
-
     try:
-        if customer_country == 'US':
-            # USA customer - show $5 shipping
-            shipping_options.append({
-                "shipping_rate_data": {
-                    "display_name": "USA Shipping",
-                    "fixed_amount": {"amount": SHIPPING_COST_USA, "currency": "usd"},
-                    "type": "fixed_amount",
-                    "delivery_estimate": {
-                        "minimum": {"unit": "business_day", "value": 3},
-                        "maximum": {"unit": "business_day", "value": 5},
-                    },
-                    "tax_behavior": "exclusive",
-                    "tax_code": "txcd_92010001",
-                }
-            })
-        elif customer_country in ['CA', 'MX']:
-            # Canada/Mexico customer - show $15 shipping
-            shipping_options.append({
-                "shipping_rate_data": {
-                    "display_name": "North America Shipping",
-                    "fixed_amount": {"amount": SHIPPING_COST_CANADA_MEXICO, "currency": "usd"},
-                    "type": "fixed_amount",
-                    "delivery_estimate": {
-                        "minimum": {"unit": "business_day", "value": 5},
-                        "maximum": {"unit": "business_day", "value": 10},
-                    },
-                    "tax_behavior": "exclusive",
-                }
-            })
-        else:
-            # International customer - show $20 shipping
-            shipping_options.append({
-                "shipping_rate_data": {
-                    "display_name": "International Shipping",
-                    "fixed_amount": {"amount": SHIPPING_COST_INTERNATIONAL, "currency": "usd"},
-                    "type": "fixed_amount",
-                    "delivery_estimate": {
-                        "minimum": {"unit": "business_day", "value": 10},
-                        "maximum": {"unit": "business_day", "value": 20},
-                    },
-                    "tax_behavior": "exclusive",
-                }
-            })
+        shipping_options = build_shipping_options(customer_country)
     except Exception as e:
         logger.warning(f"Could not create shipping options: {e}")
 
     try:
         session = stripe.checkout.Session.create(
-            mode="payment",
-            payment_method_types=["card"],
-            line_items=line_items,
-            shipping_options=shipping_options,
-            success_url=f"{origin}/success?session_id={{CHECKOUT_SESSION_ID}}",
-            cancel_url=f"{origin}/cancel",
-            # Allow shipping to most countries - Stripe requires explicit country list
-            shipping_address_collection={
-                "allowed_countries": [
-                    "US", "CA", "GB", "AU", "DE", "FR", "ES", "IT", "NL", "BE", "AT", "CH",
-                    "IE", "PT", "SE", "NO", "DK", "FI", "PL", "CZ", "GR", "HU", "RO",
-                    "BG", "HR", "SI", "SK", "LT", "LV", "EE", "MX", "BR", "AR", "CL",
-                    "CO", "PE", "UY", "NZ", "JP", "SG", "HK", "KR", "TW", "MY", "TH",
-                    "ID", "PH", "VN", "IN", "IL", "AE", "ZA", "NG", "KE", "EG", "MA",
-                    "TN", "ZA", "IS", "NO", "LU", "MT", "CY"
-                ]
+            **build_checkout_session_params(
+                validated_items, shipping_options, origin, idempotency_key if explicit_key else None
+            )
+        )
+    except stripe.error.IdempotencyError as e:
+        # Same key reused with a different cart, or the original request is still in flight
+        return Response(
+            {
+                "error": "duplicate_request",
+                "message": str(e),
             },
+            status=409,
         )
     except stripe.error.InvalidRequestError as e:
         # Common cause: using a test-mode price ID with a live-mode secret key (or vice versa)
@@ -250,45 +394,284 @@ def create_checkout_session(request):
             {
                 "error": "payment_setup_error",
                 "message": str(e),
-                "hint": "If this mentions 'No such price', your product.stripe_price_id in the database likely belongs to Stripe Test mode while the backend is using a Live secret key (or vice versa).",
+                "hint": PAYMENT_SETUP_HINT,
             },
             status=400,
         )
 
-    # Create order with product total only - shipping will be added in webhook when customer selects option
-    order = Order.objects.create(
-        id=order_id,
-        stripe_session_id=session.id,
-        amount_total=total_amount,  # Will be updated in webhook with shipping
-        currency="usd",
-        status="pending",
-    )
+    order = create_pending_order(session, validated_items, total_amount)
 
-    for item in validated_items:
-        product = item["product"]
-        quantity = item["quantity"]
-        
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            unit_price=product.price,
-            quantity=quantity,
+    if idempotency_key:
+        cache.set(
+            _checkout_cache_key(idempotency_key),
+            {"checkout_url": session.url, "order_id": str(order.id)},
+            settings.CHECKOUT_IDEMPOTENCY_TTL,
         )
 
     return Response({"checkout_url": session.url})
 
+# Bounded pool for blocking Stripe calls made from async views, so a burst of
+# checkouts cannot spawn an unbounded number of threads.
+_stripe_executor = ThreadPoolExecutor(
+    max_workers=settings.CHECKOUT_STRIPE_CONCURRENCY,
+    thread_name_prefix="stripe-checkout",
+)
+
+def _create_stripe_session(**params):
+    return stripe.checkout.Session.create(**params)
+
+create_stripe_session_async = sync_to_async(
+    _create_stripe_session,
+    thread_sensitive=False,
+    executor=_stripe_executor,
+)
+
+@csrf_exempt
+@require_POST
+async def create_checkout_session_async(request):
+    """
+    Async variant of create_checkout_session for ASGI deployments.
+
+    Country detection runs concurrently with cart validation, and the Stripe call
+    is awaited on a bounded thread pool so a single worker can keep many checkouts
+    in flight while waiting on Stripe.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Validation failed", "message": "Invalid JSON", "details": []}, status=400)
+
+    # Checkout either a server-side cart (already validated line by line) or raw items
+    try:
+        cart, cart_items = await sync_to_async(get_checkout_items)(data)
+    except CartNotFound:
+        return JsonResponse({"error": "cart_not_found", "message": "Cart not found or expired"}, status=404)
+
+    if not cart_items:
+        return JsonResponse({"error": "Validation failed", "message": "No items provided", "details": []}, status=400)
+
+    idempotency_key, explicit_key = get_checkout_idempotency_key(request, data, cart_items)
+    if idempotency_key:
+        cached = await cache.aget(_checkout_cache_key(idempotency_key))
+        if await _replayable_checkout_async(cached):
+            return _replay_response(cached, JsonResponse)
+        # Claim the key so a concurrent duplicate can't create a second session meanwhile
+        if not await cache.aadd(_checkout_claim_key(idempotency_key), True, CHECKOUT_CLAIM_TIMEOUT):
+            cached = await cache.aget(_checkout_cache_key(idempotency_key))
+            if await _replayable_checkout_async(cached):
+                return _replay_response(cached, JsonResponse)
+            return _in_flight_response(JsonResponse)
+
+    try:
+        return await _create_checkout_session_async(request, cart, cart_items, idempotency_key, explicit_key)
+    finally:
+        if idempotency_key:
+            await cache.adelete(_checkout_claim_key(idempotency_key))
+
+async def _create_checkout_session_async(request, cart, cart_items, idempotency_key, explicit_key):
+    """Async counterpart of _create_checkout_session."""
+    # Start geo lookup right away; it only matters once the cart is valid
+    country_task = asyncio.create_task(get_customer_country_async(request))
+
+    try:
+        if cart is not None:
+            validated_items, validation_errors, total_amount = await sync_to_async(refresh_cart)(cart)
+        else:
+            product_ids = [str(item.get("product_id")) for item in cart_items if item.get("product_id")]
+            products = {product.id: product async for product in Product.objects.filter(id__in=product_ids)}
+            validated_items, validation_errors, total_amount = validate_cart(cart_items, products)
+
+        error = cart_validation_error(validated_items, validation_errors)
+        if error:
+            return JsonResponse(error, status=400)
+
+        customer_country = await country_task
+    finally:
+        if not country_task.done():
+            country_task.cancel()
+
+    shipping_options = []
+    try:
+        shipping_options = build_shipping_options(customer_country)
+    except Exception as e:
+        logger.warning(f"Could not create shipping options: {e}")
+
+    params = build_checkout_session_params(
+        validated_items, shipping_options, get_request_origin(request), idempotency_key if explicit_key else None
+    )
+
+    try:
+        session = await create_stripe_session_async(**params)
+    except stripe.error.IdempotencyError as e:
+        return JsonResponse({"error": "duplicate_request", "message": str(e)}, status=409)
+    except stripe.error.InvalidRequestError as e:
+        return JsonResponse(
+            {
+                "error": "payment_setup_error",
+                "message": str(e),
+                "hint": PAYMENT_SETUP_HINT,
+            },
+            status=400,
+        )
+
+    order = await sync_to_async(create_pending_order)(session, validated_items, total_amount)
+
+    if idempotency_key:
+        await cache.aset(
+            _checkout_cache_key(idempotency_key),
+            {"checkout_url": session.url, "order_id": str(order.id)},
+            settings.CHECKOUT_IDEMPOTENCY_TTL,
+        )
+
+    return JsonResponse({"checkout_url": session.url})
+
+@require_GET
+async def order_status(request, session_id):
+    """
+    Status, items and totals of the order for a Checkout Session, for the success page.
+
+    Served from the summary the webhook caches when the order is paid. With
+    ?wait=<seconds> the request is held (up to ORDER_STATUS_MAX_WAIT) until the
+    status differs from ?status= (default: pending), so the page can long-poll
+    instead of polling in a tight loop.
+    """
+    try:
+        wait = float(request.GET.get("wait", 0))
+        # nan would never reach the deadline, and inf isn't a number of seconds either
+        if not math.isfinite(wait):
+            raise ValueError(wait)
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+    wait = min(max(wait, 0), settings.ORDER_STATUS_MAX_WAIT)
+
+    summary = await wait_for_order_status(session_id, wait=wait, known_status=request.GET.get("status"))
+    if summary["status"] == "not_found":
+        return JsonResponse({"error": "order_not_found"}, status=404)
+
+    response = JsonResponse(summary)
+    # Settled orders won't change for the success page; pending ones must be re-fetched
+    response["Cache-Control"] = "no-store" if summary["status"] == "pending" else "private, max-age=60"
+    return response
+
+def _parse_quantity(value):
+    """Return a non-negative int quantity, or None if the value is not one."""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity >= 0 else None
+
+def _cart_item_error(error):
+    return Response({
+        "error": "Validation failed",
+        "message": error["message"],
+        "details": [error],
+    }, status=400)
+
+def _invalid_quantity():
+    return Response({"error": "Validation failed", "message": "Quantity must be a non-negative integer", "details": []}, status=400)
+
+def _cart_not_found():
+    return Response({"error": "cart_not_found", "message": "Cart not found or expired"}, status=404)
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def create_cart_view(request):
+    """
+    Create a server-side cart, optionally seeded with items.
+    Items that fail validation are left out and reported in "errors".
+    """
+    token, cart = create_cart()
+
+    errors = []
+    for item in request.data.get("items") or []:
+        quantity = _parse_quantity(item.get("quantity"))
+        if quantity is None:
+            errors.append({
+                "product_id": item.get("product_id") or "unknown",
+                "error": "invalid_item_data",
+                "message": "Missing product_id or quantity"
+            })
+            continue
+        error = set_item_quantity(cart, item.get("product_id"), quantity)
+        if error:
+            errors.append(error)
+
+    return Response({"cart_token": token, **cart_summary(cart), "errors": errors}, status=201)
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def cart_detail(request, token):
+    """Return the cart's items, precomputed Stripe line items and totals."""
+    try:
+        cart = load_cart(token)
+    except CartNotFound:
+        return _cart_not_found()
+    return Response({"cart_token": token, **cart_summary(cart)})
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def add_cart_item(request, token):
+    """Add a quantity of a product to the cart, validating only that product."""
+    try:
+        cart = load_cart(token)
+    except CartNotFound:
+        return _cart_not_found()
+
+    product_id = str(request.data.get("product_id") or "")
+    quantity = _parse_quantity(request.data.get("quantity", 1))
+    if not product_id or not quantity:
+        return _invalid_quantity()
+
+    existing = cart["items"].get(product_id)
+    total_quantity = quantity + (existing["quantity"] if existing else 0)
+
+    error = set_item_quantity(cart, product_id, total_quantity)
+    if error:
+        return _cart_item_error(error)
+    return Response({"cart_token": token, **cart_summary(cart)})
+
+@csrf_exempt
+@api_view(["PUT", "PATCH", "DELETE"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def cart_item(request, token, product_id):
+    """Set the quantity of a cart line (PUT/PATCH) or remove it (DELETE)."""
+    try:
+        cart = load_cart(token)
+    except CartNotFound:
+        return _cart_not_found()
+
+    if request.method == "DELETE":
+        quantity = 0
+    else:
+        quantity = _parse_quantity(request.data.get("quantity"))
+        if quantity is None:
+            return _invalid_quantity()
+
+    error = set_item_quantity(cart, product_id, quantity)
+    if error:
+        return _cart_item_error(error)
+    return Response({"cart_token": token, **cart_summary(cart)})
+
 @csrf_exempt
 @api_view(["POST"])
 @authentication_classes([])
 @permission_classes([AllowAny])
 def stripe_webhook(request):
+    """
+    Verify a Stripe webhook, store it in the inbox and acknowledge immediately.
+    Events are applied by the process_webhook_events worker.
+    """
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     
-    print(f"Webhook received:")
-    print(f"Payload length: {len(payload)}")
-    print(f"Signature header: {sig_header}")
-    print(f"STRIPE_WEBHOOK_SECRET: {settings.STRIPE_WEBHOOK_SECRET[:20]}...")
+    logger.debug("Webhook received", extra={"payload_bytes": len(payload)})
 
     try:
         event = stripe.Webhook.construct_event(
@@ -296,114 +679,19 @@ def stripe_webhook(request):
             sig_header,
             settings.STRIPE_WEBHOOK_SECRET
         )
-        print(f"Webhook signature verified successfully")
     except stripe.error.SignatureVerificationError as e:
-        print(f"Signature verification failed: {e}")
+        logger.warning(f"Webhook signature verification failed: {e}")
         return HttpResponse(status=400)
     except Exception as e:
-        print(f"Webhook error: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Webhook error: {type(e).__name__}: {e}")
         return HttpResponse(status=400)
 
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        print(f"Processing checkout.session.completed for session: {session.id}")
-        
-        # Debug session data
-        print(f"Customer details: {session.get('customer_details', {})}")
-        print(f"Shipping details: {session.get('shipping_details', {})}")
-        print(f"Session metadata: {session.get('metadata', {})}")
-
-        # Check if this is a custom order payment (has custom_request_id in metadata)
-        custom_request_id = session.metadata.get('custom_request_id')
-
-        if custom_request_id:
-            print(f"Processing custom order payment for request_id: {custom_request_id}")
-            try:
-                from custom_orders.models import CustomOrderRequest
-                from custom_orders.utils import send_payment_confirmation_email
-                from decimal import Decimal
-
-                custom_request = CustomOrderRequest.objects.get(id=custom_request_id)
-
-                # Create Order for custom order
-                import uuid
-                order_id = uuid.uuid4()
-                order = Order.objects.create(
-                    id=order_id,
-                    stripe_session_id=session.id,
-                    stripe_payment_intent=session.payment_intent,
-                    amount_total=int(session.amount_total),  # Amount in cents
-                    currency="usd",
-                    status="paid",
-                    customer_email=session.customer_details.email,
-                    is_custom_order=True,
-                )
+    logger.info(
+        "Webhook verified",
+        extra={"event_id": event["id"], "event_type": event["type"]},
+    )
 
-                # Link order to custom request
-                custom_request.related_order = order
-                custom_request.status = 'paid'
-                custom_request.stripe_payment_intent = session.payment_intent
-                custom_request.save()
-
-                print(f"Custom Order {order.id} created and linked to request {custom_request_id}")
-
-                # Send payment confirmation email
-                try:
-                    send_payment_confirmation_email(custom_request, order)
-                    print(f"Payment confirmation email sent to {custom_request.email}")
-                except Exception as email_error:
-                    print(f"Error sending payment confirmation email: {email_error}")
-
-            except CustomOrderRequest.DoesNotExist:
-                print(f"Custom order request {custom_request_id} not found")
-            except Exception as e:
-                print(f"Error processing custom order payment: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            # Regular product order
-            try:
-                from orders.utils import send_order_confirmation_email
-
-                order = Order.objects.get(stripe_session_id=session.id)
-                order.status = "paid"
-                order.stripe_payment_intent = session.payment_intent
-                order.customer_email = session.customer_details.email
-                # Update amount_total to include shipping selected by customer
-                order.amount_total = int(session.amount_total)
-
-                # Get shipping address from shipping_details (when shipping_address_collection is enabled)
-                # Stripe stores shipping address in shipping_details, not customer_details
-                if session.get('shipping_details') and session['shipping_details'].get('address'):
-                    shipping_address = session['shipping_details']['address']
-                    # Add name from shipping details if available
-                    if session['shipping_details'].get('name'):
-                        shipping_address['name'] = session['shipping_details']['name']
-                    order.shipping_address = shipping_address
-                    print(f"Shipping address found: {shipping_address}")
-                else:
-                    print("No shipping address found in shipping_details")
-                    order.shipping_address = None
-
-                order.save()
-                print(f"Order {order.id} marked as paid with total ${order.amount_total / 100:.2f}")
-
-                # Send order confirmation email
-                try:
-                    send_order_confirmation_email(order)
-                    print(f"Order confirmation email sent to {order.customer_email}")
-                except Exception as email_error:
-                    print(f"Error sending order confirmation email: {email_error}")
-                    import traceback
-                    traceback.print_exc()
-
-            except Order.DoesNotExist:
-                print(f"Order with session_id {session.id} not found")
-            except Exception as e:
-                print(f"Error updating order: {e}")
-                import traceback
-                traceback.print_exc()
+    # Redeliveries of an already stored event id are deduplicated by the inbox
+    record_event(event)
 
     return HttpResponse(status=200)
@@ -0,0 +1,307 @@
+"""
+Stripe webhook event handlers and the inbox processor that runs them.
+
+Handlers are idempotent: replaying an event that was already applied changes
+nothing, so redeliveries, retries and backfills are all safe.
+"""
+import uuid
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from orders.models import Order
+from reports.rollups import record_paid_order
+from spiritbead.log import bind_request_id
+from .models import WebhookEvent
+from .order_status import cache_order_status
+from .stripe import stripe
+
+logger = logging.getLogger(__name__)
+
+
+def handle_checkout_session_completed(session):
+    logger.info(f"Processing checkout.session.completed for session {session.id}")
+    # Customer and shipping details are PII and are redacted by the log filters
+    logger.debug(
+        f"Session {session.id} details",
+        extra={
+            "customer_details": session.get('customer_details'),
+            "shipping_details": session.get('shipping_details'),
+            "metadata": session.get('metadata'),
+        },
+    )
+
+    # Check if this is a custom order payment (has custom_request_id in metadata)
+    custom_request_id = (session.get('metadata') or {}).get('custom_request_id')
+
+    if custom_request_id:
+        _handle_custom_order_payment(session, custom_request_id)
+    else:
+        _handle_product_order_payment(session)
+
+
+def _handle_custom_order_payment(session, custom_request_id):
+    from custom_orders.models import CustomOrderRequest
+    from custom_orders.utils import send_payment_confirmation_email
+
+    logger.info(f"Processing custom order payment for request {custom_request_id}")
+
+    # Lock the request so a concurrent delivery of the same session can't create a second order
+    with transaction.atomic():
+        try:
+            custom_request = CustomOrderRequest.objects.select_for_update().get(id=custom_request_id)
+        except CustomOrderRequest.DoesNotExist:
+            logger.warning(f"Custom order request {custom_request_id} not found")
+            return
+
+        if Order.objects.filter(stripe_session_id=session.id).exists():
+            logger.info(f"Order for session {session.id} already exists - skipping")
+            return
+
+        # Create Order for custom order
+        order = Order.objects.create(
+            id=uuid.uuid4(),
+            stripe_session_id=session.id,
+            stripe_payment_intent=session.payment_intent,
+            amount_total=int(session.amount_total),  # Amount in cents
+            currency="usd",
+            status="paid",
+            customer_email=session.customer_details.email,
+            is_custom_order=True,
+        )
+
+        # Link order to custom request
+        custom_request.related_order = order
+        custom_request.status = 'paid'
+        custom_request.stripe_payment_intent = session.payment_intent
+        custom_request.save()
+        record_paid_order(order)
+
+        # Queued in the outbox with the order: both are committed, or the event is retried
+        send_payment_confirmation_email(custom_request, order)
+
+    logger.info(f"Custom order {order.id} created and linked to request {custom_request_id}")
+    logger.info(f"Payment confirmation email queued for custom order {order.id}")
+    _cache_order_status(order)
+
+
+def _cache_order_status(order):
+    # The success page polls this; the order itself is already saved, so a cache outage is only logged
+    try:
+        cache_order_status(order)
+    except Exception as e:
+        logger.warning(f"Could not cache status of order {order.id}: {e}")
+
+
+def session_order_fields(session):
+    """Order fields that Stripe is the source of truth for once a Checkout Session is paid."""
+    customer_details = session.get('customer_details') or {}
+    shipping_details = session.get('shipping_details') or {}
+
+    # Get shipping address from shipping_details (when shipping_address_collection is enabled)
+    # Stripe stores shipping address in shipping_details, not customer_details
+    shipping_address = None
+    if shipping_details.get('address'):
+        shipping_address = dict(shipping_details['address'])
+        # Add name from shipping details if available
+        if shipping_details.get('name'):
+            shipping_address['name'] = shipping_details['name']
+
+    return {
+        'stripe_payment_intent': session.get('payment_intent'),
+        'customer_email': customer_details.get('email'),
+        # Includes shipping selected by customer
+        'amount_total': int(session['amount_total']),
+        'shipping_address': shipping_address,
+    }
+
+
+def _handle_product_order_payment(session):
+    from orders.utils import send_order_confirmation_email
+
+    # Lock the order so a concurrent reconciliation run can't mark it paid twice
+    with transaction.atomic():
+        try:
+            order = Order.objects.select_for_update().get(stripe_session_id=session.id)
+        except Order.DoesNotExist:
+            logger.warning(f"Order with session_id {session.id} not found")
+            return
+
+        if order.status in ('paid', 'shipped'):
+            logger.info(f"Order {order.id} already {order.status} - skipping")
+            return
+
+        order.status = "paid"
+        for field, value in session_order_fields(session).items():
+            setattr(order, field, value)
+
+        if not order.shipping_address:
+            logger.warning(f"No shipping address in shipping_details for session {session.id}")
+
+        order.save()
+        record_paid_order(order)
+
+        # Queued in the outbox with the order: both are committed, or the event is retried
+        send_order_confirmation_email(order)
+
+    logger.info(f"Order {order.id} marked as paid with total ${order.amount_total / 100:.2f}")
+    logger.info(f"Order confirmation email queued for order {order.id}")
+    _cache_order_status(order)
+
+
+def handle_checkout_session_expired(session):
+    from orders.services.expiry import expire_order_for_session
+
+    expired = expire_order_for_session(session.id)
+    logger.info(f"Checkout session {session.id} expired - {expired} pending order(s) marked expired")
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": handle_checkout_session_completed,
+    "checkout.session.expired": handle_checkout_session_expired,
+}
+
+
+def _inbox_row(event):
+    data_object = event["data"]["object"]
+    return WebhookEvent(
+        event_id=event["id"],
+        event_type=event["type"],
+        session_id=data_object.get("id") or "",
+        payload=event.to_dict_recursive(),
+    )
+
+
+def record_event(event):
+    """
+    Store a verified Stripe event in the inbox with a single INSERT.
+    Redeliveries of an event id already stored are ignored by the unique constraint.
+    """
+    WebhookEvent.objects.bulk_create([_inbox_row(event)], ignore_conflicts=True)
+
+
+def record_events(events, batch_size=500):
+    """Store many Stripe events in the inbox in arrival order, skipping ones already stored."""
+    WebhookEvent.objects.bulk_create(
+        [_inbox_row(event) for event in events],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def dispatch_event(webhook_event):
+    """Run the handler registered for a stored event's type, if any."""
+    handler = EVENT_HANDLERS.get(webhook_event.event_type)
+    if handler is None:
+        return
+    event = stripe.Event.construct_from(webhook_event.payload, stripe.api_key)
+    handler(event.data.object)
+
+
+def _retry_delay(attempts):
+    # Exponential backoff: 30s, 1m, 2m, 4m ... capped at one hour
+    return timedelta(seconds=min(30 * (2 ** (attempts - 1)), 3600))
+
+
+def process_event(webhook_event):
+    """
+    Apply one claimed inbox event and record the outcome.
+    Returns True on success; failures are rescheduled or dead-lettered.
+    """
+    # Everything logged while handling the event is correlated by its Stripe event id
+    with bind_request_id(webhook_event.event_id):
+        return _process_event(webhook_event)
+
+
+def _process_event(webhook_event):
+    try:
+        dispatch_event(webhook_event)
+    except Exception as e:
+        logger.exception(f"Webhook event {webhook_event.event_id} failed: {e}")
+        webhook_event.attempts += 1
+        webhook_event.last_error = f"{type(e).__name__}: {e}"
+        if webhook_event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            webhook_event.status = "dead"
+        else:
+            webhook_event.status = "failed"
+            webhook_event.next_attempt_at = timezone.now() + _retry_delay(webhook_event.attempts)
+        webhook_event.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+        return False
+
+    webhook_event.attempts += 1
+    webhook_event.status = "processed"
+    webhook_event.processed_at = timezone.now()
+    webhook_event.last_error = ""
+    webhook_event.save(update_fields=["attempts", "status", "processed_at", "last_error"])
+    return True
+
+
+def process_session_events(events):
+    """
+    Process one checkout session's claimed events in order.
+    Stops at the first failure and hands the later events back so order is preserved.
+    """
+    try:
+        for index, webhook_event in enumerate(events):
+            if not process_event(webhook_event):
+                remaining = [e.pk for e in events[index + 1:]]
+                if remaining:
+                    WebhookEvent.objects.filter(pk__in=remaining).update(
+                        status="pending", next_attempt_at=timezone.now()
+                    )
+                break
+    finally:
+        close_old_connections()
+
+
+UNFINISHED_STATUSES = ("pending", "processing", "failed")
+
+
+def claim_due_events(limit):
+    """
+    Claim up to ``limit`` due events, grouped by session in arrival order.
+
+    A session is skipped while it has an older unfinished event that was not
+    claimed (e.g. one waiting out its retry delay), so events for one checkout
+    session are never applied out of order. Claimed events are leased for
+    WEBHOOK_CLAIM_LEASE seconds; if a worker dies mid-batch they become due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status__in=UNFINISHED_STATUSES, next_attempt_at__lte=now)
+            .order_by("received_at", "id")[:limit]
+        )
+        if not candidates:
+            return []
+
+        groups = {}
+        for webhook_event in candidates:
+            groups.setdefault(webhook_event.session_id, []).append(webhook_event)
+
+        # Oldest unfinished event per session that is not part of this claim
+        blocking = {}
+        for session_id, received_at in (
+            WebhookEvent.objects.filter(session_id__in=[s for s in groups if s], status__in=UNFINISHED_STATUSES)
+            .exclude(pk__in=[e.pk for e in candidates])
+            .values_list("session_id", "received_at")
+        ):
+            if session_id not in blocking or received_at < blocking[session_id]:
+                blocking[session_id] = received_at
+
+        claimed = []
+        for session_id, events in groups.items():
+            if session_id in blocking and blocking[session_id] < events[0].received_at:
+                continue
+            claimed.append(events)
+
+        WebhookEvent.objects.filter(pk__in=[e.pk for events in claimed for e in events]).update(
+            status="processing",
+            next_attempt_at=now + timedelta(seconds=settings.WEBHOOK_CLAIM_LEASE),
+        )
+
+    return claimed
@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import Product, Category
+from .models import Product, Category, StockMovement
+from .services.popularity import recent_units
 from .services.stripe_sync import ensure_stripe_product_and_price
 from .forms import ProductAdminForm
+from spiritbead.paginators import EstimatedCountPaginator
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -22,6 +24,10 @@ class ProductAdmin(admin.ModelAdmin):
         "stripe_price_id",
         "is_active",
     )
+    # category is shown in the list and in Product.__str__
+    list_select_related = ["category"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = ["sync_prices_to_stripe", "archive_products"]
 
     def formatted_price(self, obj):
@@ -30,6 +36,11 @@ class ProductAdmin(admin.ModelAdmin):
     formatted_price.short_description = "Price"
     formatted_price.admin_order_field = "price"
 
+    def recent_units_display(self, obj):
+        """Units sold with each sale's weight halving every half-life (what ordering by popularity ranks)"""
+        return f"{recent_units(obj):.1f}"
+    recent_units_display.short_description = "Recent units sold"
+
     def lighter_type_display(self, obj):
         """Display lighter type with user-friendly name"""
         return obj.get_lighter_type_display()
@@ -60,8 +71,10 @@ class ProductAdmin(admin.ModelAdmin):
     @admin.action(description="Archive selected products")
     def archive_products(self, request, queryset):
         """Archive selected products by setting is_active to False"""
+        from django.utils import timezone
         count = queryset.count()
-        queryset.update(is_active=False)
+        # Bump updated_at so server-side carts notice the change at checkout
+        queryset.update(is_active=False, updated_at=timezone.now())
         self.message_user(request, f"Successfully archived {count} product(s). They will no longer appear in the store.")
 
     def save_model(self, request, obj, form, change):
@@ -75,7 +88,10 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['is_sold_out', 'is_active', 'created_at']
     search_fields = ['name', 'category__name']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['created_at', 'updated_at', 'stripe_product_id', 'stripe_price_id', 'currency']
+    readonly_fields = [
+        'created_at', 'updated_at', 'stripe_product_id', 'stripe_price_id', 'currency',
+        'units_sold', 'recent_units_display', 'view_count',
+    ]
 
     fieldsets = (
         ('Basic Information', {
@@ -92,6 +108,10 @@ class ProductAdmin(admin.ModelAdmin):
         ('Shipping', {
             'fields': ('weight_ounces',)
         }),
+        ('Sales', {
+            'fields': ('units_sold', 'recent_units_display', 'view_count'),
+            'classes': ('collapse',)
+        }),
         ('Product Images', {
             'fields': ('primary_image', 'secondary_image'),
             'description': 'Primary image is displayed in the catalog. Secondary image shows on hover.'
@@ -101,3 +121,25 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only view of the stock ledger; stock is changed on the product or by orders"""
+    list_display = ['created_at', 'product', 'kind', 'quantity', 'reference', 'note']
+    list_filter = ['kind']
+    search_fields = ['=product__id', 'product__name', '=reference']
+    raw_id_fields = ['product']
+    list_select_related = ['product__category']
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.services.view_counts import cache_is_shared, flush_view_counts
+
+
+class Command(BaseCommand):
+    help = 'Periodically move product view counts from the cache into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help='Seconds between flushes (default: 60.0)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Products whose counters are read per cache call (default: 500)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Flush the current counts, then exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if not cache_is_shared():
+            # Views are then written to the database as they happen, so there is nothing to flush.
+            # Exit cleanly (pm2 is told not to restart on 0) rather than crash-looping.
+            self.stdout.write(
+                "The default cache is per-process, so views are stored directly and there is nothing "
+                "to flush. Set REDIS_URL (for the web workers and this command) to count them in the cache."
+            )
+            return
+
+        products = views = 0
+        while True:
+            stats = flush_view_counts(batch_size=options['batch_size'])
+            products += stats['products']
+            views += stats['views']
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Flushed {views} view(s) of {products} product(s)"))
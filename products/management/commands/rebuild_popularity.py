@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.services.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's units sold and popularity from paid, shipped and archived orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows read and products written per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        updated = rebuild_popularity(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales counters of {updated} product(s)"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from products.services.inventory import take_snapshots, verify_inventory
+
+
+class Command(BaseCommand):
+    help = "Check every product's inventory_count against the stock ledger, and optionally repair it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Set mismatched inventory_count values to the ledger stock'
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Also snapshot ledger stock so later reads sum fewer movements'
+        )
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            taken = take_snapshots()
+            self.stdout.write(f"Took {taken} stock snapshot(s)")
+
+        mismatches = verify_inventory(repair=options['repair'])
+        for product_id, name, inventory_count, ledger in mismatches:
+            self.stdout.write(f"{product_id} ({name}): inventory_count {inventory_count}, ledger {ledger}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Every product's inventory_count matches the stock ledger"))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(mismatches)} product(s) from the stock ledger"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(mismatches)} product(s) differ from the stock ledger; run with --repair to fix them"
+            ))
@@ -0,0 +1,113 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_opening_snapshots(apps, schema_editor):
+    """Start every product's ledger from its current inventory_count."""
+    Product = apps.get_model("products", "Product")
+    StockSnapshot = apps.get_model("products", "StockSnapshot")
+    StockSnapshot.objects.bulk_create(
+        (
+            StockSnapshot(product_id=pk, last_movement_id=0, quantity=quantity)
+            for pk, quantity in Product.objects.values_list(
+                "id", "inventory_count"
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_delete_productimage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("restock", "Restock"),
+                            ("sale", "Sale"),
+                            ("hold", "Hold"),
+                            ("release", "Release"),
+                            ("adjust", "Manual adjustment"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.IntegerField(
+                        help_text="Change in stock: positive adds, negative removes"
+                    ),
+                ),
+                (
+                    "reference",
+                    models.CharField(
+                        blank=True,
+                        help_text="What caused it, e.g. an order id",
+                        max_length=100,
+                    ),
+                ),
+                ("note", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_movements",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "id"], name="stock_movement_product_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_movement_id", models.BigIntegerField(default=0)),
+                ("quantity", models.IntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_snapshots",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-last_movement_id"],
+                        name="stock_snapshot_latest_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
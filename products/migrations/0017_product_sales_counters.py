@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="popularity",
+            field=models.FloatField(
+                default=0,
+                editable=False,
+                help_text="Units sold, weighted towards recent sales",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="units_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["-popularity"], name="product_popularity_idx"),
+        ),
+    ]
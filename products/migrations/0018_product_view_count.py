@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0017_product_sales_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="view_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
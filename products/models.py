@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+# Product counters only ever changed by F() updates (sales, flushed views)
+COUNTER_FIELDS = ('units_sold', 'popularity', 'view_count')
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
@@ -85,11 +88,19 @@ class Product(models.Model):
         default=Decimal('2.0'),
         help_text="Weight in ounces for shipping calculations"
     )
+    # Sales counters, incremented as orders are paid (see products.services.popularity)
+    units_sold = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False, help_text="Units sold, weighted towards recent sales")
+    # Detail page views, flushed in batches from cache counters (see products.services.view_counts)
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['-popularity'], name='product_popularity_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.category.name if self.category else 'Uncategorized'}"
@@ -111,18 +122,42 @@ class Product(models.Model):
             return super().save(*args, **kwargs)
 
         is_new = self.pk is None
+        old_product = None
         old_price = None
+        old_inventory = None
         
-        if not is_new:
-            # Get the current price from database
-            try:
-                old_product = Product.objects.get(pk=self.pk)
-                old_price = old_product.price
-            except Product.DoesNotExist:
-                pass
-        
-        # Save the product first
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not is_new:
+                # Get the current price and stock from database; locked so the adjustment
+                # recorded below is exactly the change this save makes, even next to a sale
+                try:
+                    old_product = Product.objects.select_for_update().get(pk=self.pk)
+                    old_price = old_product.price
+                    old_inventory = old_product.inventory_count
+                except Product.DoesNotExist:
+                    pass
+            
+            # Counters loaded with a stale instance would undo the sales and views
+            # added since; a full save keeps the locked row's values
+            if old_product is not None and kwargs.get('update_fields') is None:
+                for field in COUNTER_FIELDS:
+                    setattr(self, field, getattr(old_product, field))
+
+            # Save the product first
+            super().save(*args, **kwargs)
+
+            # Stock set through save() (admin edits, seeding, imports) goes in the ledger;
+            # a save limited to other fields didn't write inventory_count, however stale it is
+            from .services.inventory import record_movement
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or 'inventory_count' in update_fields:
+                if old_inventory is None:
+                    if self.inventory_count:
+                        record_movement(
+                            self.pk, StockMovement.KIND_RESTOCK, self.inventory_count, note="Initial stock"
+                        )
+                elif old_inventory != self.inventory_count:
+                    record_movement(self.pk, StockMovement.KIND_ADJUST, self.inventory_count - old_inventory)
         
         # Sync to Stripe if price changed or product is new
         if is_new or (old_price is not None and old_price != self.price):
@@ -134,3 +169,63 @@ class Product(models.Model):
                 import logging
                 logger = logging.getLogger(__name__)
                 logger.error(f"Failed to sync product {self.id} to Stripe: {e}")
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes; quantity is signed (+ adds stock).
+
+    A product's stock is its latest StockSnapshot plus the movements after it
+    (see products.services.inventory); Product.inventory_count is the
+    denormalized current value, checked against the ledger by verify_inventory.
+    """
+    KIND_RESTOCK = "restock"
+    KIND_SALE = "sale"
+    KIND_HOLD = "hold"
+    KIND_RELEASE = "release"
+    KIND_ADJUST = "adjust"
+    KIND_CHOICES = (
+        (KIND_RESTOCK, "Restock"),
+        (KIND_SALE, "Sale"),
+        (KIND_HOLD, "Hold"),
+        (KIND_RELEASE, "Release"),
+        (KIND_ADJUST, "Manual adjustment"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Change in stock: positive adds, negative removes")
+    reference = models.CharField(max_length=100, blank=True, help_text="What caused it, e.g. an order id")
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Movements after a snapshot: product = X AND id > N
+            models.Index(fields=['product', 'id'], name='stock_movement_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} {self.product_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements are append-only; record a new movement instead")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """A product's stock as of a ledger position: all movements with id <= last_movement_id."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    last_movement_id = models.BigIntegerField(default=0)
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-last_movement_id'], name='stock_snapshot_latest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} at movement {self.last_movement_id}"
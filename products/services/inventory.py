@@ -0,0 +1,165 @@
+"""
+Inventory ledger.
+
+Every stock change is appended as a StockMovement. A product's ledger stock is
+its latest StockSnapshot plus the movements recorded after it, which
+``ledger_stock()`` expresses as correlated subqueries on the (product, id)
+indexes, so one query reads it for one product or the whole catalog.
+``take_snapshots`` folds movements into new snapshots to keep that sum short,
+and ``verify_inventory`` checks (and optionally repairs) Product.inventory_count
+against the ledger in a single pass.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from django.utils import timezone
+
+from products.models import Product, StockMovement, StockSnapshot
+from products.services.popularity import sale_counter_updates
+
+logger = logging.getLogger(__name__)
+
+# Movements newer than this are left out of snapshots: a transaction still in
+# flight may yet commit a movement with a lower id than one already visible
+SNAPSHOT_LAG = timedelta(minutes=1)
+
+
+def record_movement(product_id, kind, quantity, reference='', note=''):
+    """Append a stock movement. Doesn't touch Product.inventory_count; callers keep it in step."""
+    return StockMovement.objects.create(
+        product_id=product_id, kind=kind, quantity=quantity, reference=str(reference), note=note,
+    )
+
+
+def apply_sale(product_id, quantity, reference=''):
+    """
+    Take sold stock off a product and record it as a sale.
+
+    The product row is locked for the update, so concurrent sales and admin
+    edits can't overwrite each other and the movement is exactly the stock
+    taken (never more than was left). Marks the product sold out when it runs
+    out, and adds the units ordered to its sales counters in the same UPDATE.
+    Returns the new inventory_count, or None if the product is gone.
+    """
+    # No savepoint: a failed sale should fail the caller's (webhook) transaction anyway
+    with transaction.atomic(savepoint=False):
+        stock = (
+            Product.objects.select_for_update()
+            .filter(pk=product_id)
+            .values_list('inventory_count', flat=True)
+            .first()
+        )
+        if stock is None:
+            return None
+        taken = min(quantity, stock)
+        remaining = stock - taken
+
+        now = timezone.now()
+        changes = {
+            'inventory_count': F('inventory_count') - taken,
+            'updated_at': now,
+            **sale_counter_updates(quantity, now),
+        }
+        if remaining == 0:
+            changes['is_sold_out'] = True
+        Product.objects.filter(pk=product_id).update(**changes)
+
+        note = f"Sold {quantity} with {stock} in stock" if taken < quantity else ''
+        record_movement(product_id, StockMovement.KIND_SALE, -taken, reference=reference, note=note)
+    return remaining
+
+
+def _latest_snapshot(product_ref):
+    return StockSnapshot.objects.filter(product=product_ref).order_by('-last_movement_id')
+
+
+def _movements_since_snapshot(product_ref, up_to=None):
+    """Sum of a product's movements after its latest snapshot (and up to ``up_to``), 0 if none."""
+    snapshot_position = Coalesce(
+        Subquery(_latest_snapshot(OuterRef(OuterRef(product_ref))).values('last_movement_id')[:1]),
+        0,
+    )
+    movements = StockMovement.objects.filter(product=OuterRef(product_ref), id__gt=snapshot_position)
+    if up_to is not None:
+        movements = movements.filter(id__lte=up_to)
+    return Coalesce(
+        Subquery(movements.values('product').annotate(total=Sum('quantity')).values('total')),
+        0,
+    )
+
+
+def snapshot_stock(product_ref='pk'):
+    """Expression: the product's latest snapshot quantity, 0 if it has none."""
+    return Coalesce(Subquery(_latest_snapshot(OuterRef(product_ref)).values('quantity')[:1]), 0)
+
+
+def ledger_stock(product_ref='pk'):
+    """
+    Expression for a product's stock according to the ledger: latest snapshot
+    plus the movements after it. ``product_ref`` names the product's primary key
+    in the outer query; usable in annotate(), filter() and update().
+    """
+    return snapshot_stock(product_ref) + _movements_since_snapshot(product_ref)
+
+
+def stock_of(product_id):
+    """A single product's ledger stock."""
+    return Product.objects.filter(pk=product_id).annotate(stock=ledger_stock()).values_list('stock', flat=True).get()
+
+
+def take_snapshots():
+    """
+    Snapshot the ledger stock of every product with movements since its last
+    snapshot, as of the newest movement older than SNAPSHOT_LAG.
+    Returns the number of snapshots written.
+    """
+    position = StockMovement.objects.filter(
+        created_at__lt=timezone.now() - SNAPSHOT_LAG,
+    ).aggregate(last=Max('id'))['last']
+    if position is None:
+        return 0
+
+    rows = (
+        Product.objects.annotate(
+            snapshot=snapshot_stock(),
+            moved=_movements_since_snapshot('pk', up_to=position),
+        )
+        .exclude(moved=0)
+        .values_list('pk', 'snapshot', 'moved')
+    )
+    snapshots = [
+        StockSnapshot(product_id=pk, last_movement_id=position, quantity=snapshot + moved)
+        for pk, snapshot, moved in rows
+    ]
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    logger.info(f"Took {len(snapshots)} stock snapshot(s) at movement {position}")
+    return len(snapshots)
+
+
+def verify_inventory(repair=False):
+    """
+    Compare every product's inventory_count with its ledger stock in one query.
+
+    With ``repair``, set inventory_count to the ledger stock (and mark products
+    left with none as sold out) in a single UPDATE of the mismatched rows.
+    Returns (product_id, name, inventory_count, ledger_stock) for each mismatch.
+    """
+    mismatched = Product.objects.alias(stock=ledger_stock()).exclude(inventory_count=F('stock'))
+    mismatches = list(
+        mismatched.annotate(ledger=F('stock')).values_list('pk', 'name', 'inventory_count', 'ledger').order_by('pk')
+    )
+
+    if repair and mismatches:
+        # A negative ledger (stock sold that was never recorded coming in) can't be stored; floor it at 0
+        stock = ledger_stock()
+        updated = Product.objects.filter(pk__in=[row[0] for row in mismatches]).update(
+            is_sold_out=Case(When(LessThanOrEqual(stock, 0), then=Value(True)), default=F('is_sold_out')),
+            inventory_count=Case(When(LessThanOrEqual(stock, 0), then=Value(0)), default=stock),
+            updated_at=timezone.now(),
+        )
+        logger.warning(f"Repaired inventory_count of {updated} product(s) from the stock ledger")
+    return mismatches
@@ -0,0 +1,85 @@
+"""
+Best-seller counters.
+
+Product.popularity is a forward-decayed count of units sold: each sale adds
+``units * 2 ** ((sold_at - POPULARITY_EPOCH) / POPULARITY_HALF_LIFE)``. A sale
+is worth twice as much as one a half-life earlier, so ordering by the stored
+value ranks products by recent sales without ever decaying the existing rows;
+the counters only grow, with a single F() increment per sale.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+POPULARITY_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# Changing this needs a rebuild_popularity run to rescale the stored counters
+POPULARITY_HALF_LIFE = timedelta(days=14)
+
+# Orders that count as sales
+SALE_STATUSES = ('paid', 'shipped')
+
+
+def sale_weight(when):
+    """What one unit sold at ``when`` adds to popularity."""
+    return 2 ** ((when - POPULARITY_EPOCH) / POPULARITY_HALF_LIFE)
+
+
+def sale_counter_updates(quantity, when=None):
+    """update() keyword arguments that add a sale of ``quantity`` units to a product's counters."""
+    return {
+        'units_sold': F('units_sold') + quantity,
+        'popularity': F('popularity') + quantity * sale_weight(when or timezone.now()),
+    }
+
+
+def recent_units(product, now=None):
+    """A product's popularity as decayed units: sales a half-life ago count half."""
+    return product.popularity / sale_weight(now or timezone.now())
+
+
+def rebuild_popularity(batch_size=1000):
+    """
+    Recompute every product's units_sold and popularity from paid and shipped
+    orders, live and archived.
+
+    Live orders are aggregated per product and hour in the database. Product
+    rows are locked for the duration, so sales recorded meanwhile wait and are
+    added on top of the rebuilt values. Returns the number of products updated.
+    """
+    from orders.models import ArchivedOrder, OrderItem
+
+    totals = defaultdict(lambda: [0, 0.0])
+    with transaction.atomic():
+        product_ids = list(Product.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+        hourly = (
+            OrderItem.objects.filter(order__status__in=SALE_STATUSES)
+            .annotate(hour=TruncHour('order__created_at'))
+            .values('product', 'hour')
+            .annotate(units=Sum('quantity'))
+            .order_by()
+        )
+        for row in hourly.iterator(chunk_size=batch_size):
+            totals[row['product']][0] += row['units']
+            totals[row['product']][1] += row['units'] * sale_weight(row['hour'])
+
+        archived = ArchivedOrder.objects.filter(status__in=SALE_STATUSES).values_list('created_at', 'items')
+        for created_at, items in archived.iterator(chunk_size=batch_size):
+            for item in items:
+                totals[item['product_id']][0] += item['quantity']
+                totals[item['product_id']][1] += item['quantity'] * sale_weight(created_at)
+
+        products = [Product(pk=pk, units_sold=totals[pk][0], popularity=totals[pk][1]) for pk in product_ids]
+        Product.objects.bulk_update(products, ['units_sold', 'popularity'], batch_size=batch_size)
+
+    logger.info(f"Rebuilt sales counters of {len(products)} product(s)")
+    return len(products)
@@ -0,0 +1,94 @@
+"""
+Product view counters.
+
+Views are counted in the cache (an atomic INCR on Redis, shared by every
+worker), never in the database on the request path. ``flush_view_counts``
+moves the counts into Product.view_count in batches: it reads the counters
+with get_many, adds them with one UPDATE per distinct count (using F() so
+concurrent writers don't overwrite each other), then takes exactly what it
+read off them with decr, so views counted meanwhile stay for the next flush.
+
+The flush runs in its own process, so it needs a shared cache (Redis): a
+per-process LocMemCache would keep the web workers' counts out of its reach.
+Without one, views are added to Product.view_count directly instead.
+"""
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def cache_is_shared():
+    """Whether the default cache is visible to other processes (not LocMemCache or DummyCache)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _cache_key(product_id):
+    return f"products:views:{product_id}"
+
+
+def record_view(product_id, count=1):
+    """Count a view of a product: one or two cache round trips, no database write."""
+    if not cache_is_shared():
+        # No flush can reach a per-process counter, so store the view straight away
+        Product.objects.filter(pk=product_id).update(view_count=F('view_count') + count)
+        return
+
+    key = _cache_key(product_id)
+    # add() only succeeds when the counter doesn't exist yet
+    if not cache.add(key, count, timeout=None):
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.add(key, count, timeout=None)
+
+
+def pending_views(product_ids):
+    """Views counted in the cache but not yet flushed, by product id."""
+    keys = {_cache_key(product_id): product_id for product_id in product_ids}
+    # A counter evicted mid-flush and recreated can end up below zero until new views arrive
+    return {keys[key]: count for key, count in cache.get_many(keys).items() if count > 0}
+
+
+def flush_view_counts(batch_size=500):
+    """
+    Add the views counted in the cache to Product.view_count.
+    Returns a dict of counts: products and views flushed.
+    """
+    stats = {'products': 0, 'views': 0}
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(product_ids), batch_size):
+        counts = pending_views(product_ids[start:start + batch_size])
+        if not counts:
+            continue
+
+        by_count = defaultdict(list)
+        for product_id, count in counts.items():
+            by_count[count].append(product_id)
+        with transaction.atomic():
+            for count, ids in by_count.items():
+                Product.objects.filter(pk__in=ids).update(view_count=F('view_count') + count)
+
+        # Only take the views off once they're stored: a crash in between counts
+        # them twice rather than losing them. Views counted since the read stay.
+        for product_id, count in counts.items():
+            try:
+                cache.decr(_cache_key(product_id), count)
+            except ValueError:
+                # Evicted since the read; its views are already stored
+                pass
+
+        stats['products'] += len(counts)
+        stats['views'] += sum(counts.values())
+    if stats['views']:
+        logger.info(f"Flushed {stats['views']} view(s) of {stats['products']} product(s)")
+    return stats
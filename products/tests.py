@@ -1,3 +1,284 @@
+import io
+import uuid
+from unittest import mock
+
+from django.contrib.admin.utils import quote
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import Category, Product, StockMovement, StockSnapshot
+from .services.inventory import SNAPSHOT_LAG, stock_of, take_snapshots, verify_inventory
+from .services.popularity import POPULARITY_HALF_LIFE, recent_units, sale_weight
+from .services.view_counts import flush_view_counts, pending_views, record_view
+
+
+class ProductAdminQueryCountTests(TestCase):
+    """The product changelist and change page run a fixed number of queries however many products exist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def make_product(self):
+        suffix = uuid.uuid4().hex[:12]
+        category = Category.objects.create(name=f'Category {suffix}', slug=f'category-{suffix}')
+        return Product.objects.create(
+            id=f'prod_{suffix}', name=f'Case {suffix}', slug=f'case-{suffix}',
+            price=2500, category=category,
+        )
+
+    def count_queries(self, url):
+        self.client.get(url)  # Warm per-process caches such as content types
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:products_product_changelist')
+        self.make_product()
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_product()
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_change_page_queries_do_not_grow_with_products(self):
+        product = self.make_product()
+        # Product ids contain '_', which admin URLs escape
+        url = reverse('admin:products_product_change', args=[quote(product.pk)])
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_product()
+        self.assertEqual(self.count_queries(url), few)
+
+
+class StockLedgerTests(TestCase):
+    """Stock changes are recorded as movements and inventory_count can be checked against them."""
+
+    def setUp(self):
+        self.product = Product.objects.create(id='prod_ledger', name='Ledger', slug='ledger', price=2500, inventory_count=5)
+
+    def sell(self, quantity):
+        order = Order.objects.create(
+            id=uuid.uuid4(), stripe_session_id=f'cs_test_{uuid.uuid4().hex}', amount_total=2500 * quantity,
+        )
+        OrderItem.objects.create(order=order, product=self.product, unit_price=2500, quantity=quantity)
+        order.status = 'paid'
+        order.save()
+        return order
+
+    def test_sales_and_edits_are_recorded(self):
+        order = self.sell(2)
+        self.product.refresh_from_db()
+        self.product.inventory_count = 10
+        self.product.save()
+
+        movements = list(self.product.stock_movements.order_by('id').values_list('kind', 'quantity', 'reference'))
+        self.assertEqual(movements, [
+            (StockMovement.KIND_RESTOCK, 5, ''),
+            (StockMovement.KIND_SALE, -2, str(order.id)),
+            (StockMovement.KIND_ADJUST, 7, ''),
+        ])
+        self.assertEqual(stock_of(self.product.pk), 10)
+
+    def test_saves_of_other_fields_record_no_movement(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.sell(2)
+        stale.name = 'Renamed'
+        stale.save(update_fields=['name'])
+
+        self.assertFalse(self.product.stock_movements.filter(kind=StockMovement.KIND_ADJUST).exists())
+        self.assertEqual(verify_inventory(), [])
+
+    def test_oversold_sale_takes_only_what_is_left(self):
+        self.sell(8)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 0)
+        self.assertTrue(self.product.is_sold_out)
+        self.assertEqual(self.product.stock_movements.get(kind=StockMovement.KIND_SALE).quantity, -5)
+        self.assertEqual(stock_of(self.product.pk), 0)
+
+    def test_ledger_stock_is_snapshot_plus_later_movements(self):
+        self.sell(1)
+        StockMovement.objects.update(created_at=timezone.now() - 2 * SNAPSHOT_LAG)
+        self.assertEqual(take_snapshots(), 1)
+        self.sell(1)
+
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.quantity, 4)
+        self.assertEqual(stock_of(self.product.pk), 3)
+
+    def test_verify_repairs_drift(self):
+        self.sell(1)
+        Product.objects.filter(pk=self.product.pk).update(inventory_count=9)
+        self.assertEqual(verify_inventory(), [(self.product.pk, 'Ledger', 9, 4)])
+
+        call_command('verify_inventory', '--repair', stdout=io.StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory_count, 4)
+        self.assertEqual(verify_inventory(), [])
+
+    def test_movements_are_append_only(self):
+        movement = self.product.stock_movements.get()
+        movement.quantity = 50
+        with self.assertRaises(ValueError):
+            movement.save()
+
+
+class PopularityTests(TestCase):
+    """Paid orders add to products' sales counters, which the product API sorts by."""
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(id=f'prod_pop{i}', name=f'Popular {i}', slug=f'popular-{i}', price=2500, inventory_count=50)
+            for i in range(3)
+        ]
+
+    def sell(self, product, quantity):
+        order = Order.objects.create(
+            id=uuid.uuid4(), stripe_session_id=f'cs_test_{uuid.uuid4().hex}', amount_total=2500 * quantity,
+        )
+        OrderItem.objects.create(order=order, product=product, unit_price=2500, quantity=quantity)
+        order.status = 'paid'
+        order.save()
+
+    def test_sales_update_counters_and_ordering(self):
+        first, second, third = self.products
+        self.sell(second, 3)
+        self.sell(third, 1)
+        self.sell(second, 1)
+
+        second.refresh_from_db()
+        self.assertEqual(second.units_sold, 4)
+        self.assertAlmostEqual(recent_units(second), 4, places=3)
+
+        response = self.client.get('/api/products/', {'ordering': '-popularity'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        results = results['results'] if isinstance(results, dict) else results
+        self.assertEqual([product['id'] for product in results], [second.id, third.id, first.id])
+
+    def test_saving_a_stale_instance_keeps_the_counters(self):
+        product = self.products[0]
+        stale = Product.objects.get(pk=product.pk)
+        self.sell(product, 2)
+        record_view(product.pk)
+        flush_view_counts()
+
+        stale.name = 'Renamed'
+        stale.save()
+
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.units_sold, product.view_count), ('Renamed', 2, 1))
+        self.assertAlmostEqual(recent_units(product), 2, places=3)
+
+    def test_older_sales_count_for_less(self):
+        now = timezone.now()
+        self.assertAlmostEqual(sale_weight(now - POPULARITY_HALF_LIFE) / sale_weight(now), 0.5)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.sell(self.products[0], 2)
+        self.sell(self.products[1], 5)
+        incremental = {product.pk: (product.units_sold, recent_units(product)) for product in Product.objects.all()}
+        Product.objects.update(units_sold=0, popularity=0)
+
+        call_command('rebuild_popularity', stdout=io.StringIO())
+        for product in Product.objects.all():
+            units_sold, recent = incremental[product.pk]
+            self.assertEqual(product.units_sold, units_sold)
+            # Rebuilt sales are dated to the hour their order was created
+            self.assertAlmostEqual(recent_units(product), recent, delta=0.01 * units_sold)
+
+
+class ViewCountTests(TestCase):
+    """Product views are counted in the cache and flushed to the database in batches."""
+
+    def setUp(self):
+        cache.clear()
+        # The tests' LocMemCache stands in for Redis
+        patcher = mock.patch('products.services.view_counts.cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.products = [
+            Product.objects.create(id=f'prod_view{i}', name=f'Viewed {i}', slug=f'viewed-{i}', price=2500)
+            for i in range(3)
+        ]
+
+    def test_retrieve_counts_without_writing(self):
+        product = self.products[0]
+        url = f'/api/products/{product.pk}/'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(pending_views([product.pk]), {product.pk: 2})
+
+        self.client.get('/api/products/prod_missing/')
+        self.assertEqual(pending_views(['prod_missing']), {})
+
+    def test_flush_adds_counts_once(self):
+        first, second, third = self.products
+        for product, views in ((first, 3), (second, 3), (third, 1)):
+            for _ in range(views):
+                record_view(product.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = flush_view_counts(batch_size=2)
+        self.assertEqual(stats, {'products': 3, 'views': 7})
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        # One UPDATE per distinct count in each batch: (3) for the first two products, (1) for the third
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            dict(Product.objects.values_list('pk', 'view_count')),
+            {first.pk: 3, second.pk: 3, third.pk: 1},
+        )
+
+        # Views counted after a flush are added by the next one
+        record_view(third.pk)
+        self.assertEqual(flush_view_counts(), {'products': 1, 'views': 1})
+        self.assertEqual(Product.objects.get(pk=third.pk).view_count, 2)
+        self.assertEqual(flush_view_counts(), {'products': 0, 'views': 0})
+
+    def test_evicted_counter_is_skipped(self):
+        first, second = self.products[:2]
+        record_view(first.pk, 2)
+        record_view(second.pk, 3)
+        real_decr = cache.decr
+
+        def decr(key, delta=1):
+            # first's counter is evicted between the read and the decr
+            if key.endswith(first.pk):
+                cache.delete(key)
+            return real_decr(key, delta)
+
+        with mock.patch.object(cache, 'decr', side_effect=decr):
+            self.assertEqual(flush_view_counts(), {'products': 2, 'views': 5})
+        self.assertEqual(
+            dict(Product.objects.filter(pk__in=[first.pk, second.pk]).values_list('pk', 'view_count')),
+            {first.pk: 2, second.pk: 3},
+        )
+        self.assertEqual(pending_views([first.pk, second.pk]), {})
+
+    def test_views_are_stored_directly_without_a_shared_cache(self):
+        product = self.products[0]
+        with mock.patch('products.services.view_counts.cache_is_shared', return_value=False):
+            self.client.get(f'/api/products/{product.pk}/')
+            record_view(product.pk, 2)
+
+            out = io.StringIO()
+            call_command('flush_view_counts', stdout=out)
 
-# Create your tests here.
+        self.assertIn('REDIS_URL', out.getvalue())
+        self.assertEqual(pending_views([product.pk]), {})
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 3)
@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, permission_classes
 from rest_framework.response import Response
@@ -6,6 +8,9 @@ from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Product, Category
 from .serializers import ProductSerializer, ProductListSerializer, CategorySerializer
+from .services.view_counts import record_view
+
+logger = logging.getLogger(__name__)
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
@@ -19,7 +24,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         'is_active': ['exact'],
         'category': ['exact', 'in'],
     }
-    ordering_fields = ['lighter_type', 'name', 'price', 'created_at']
+    # popularity: best sellers first with ordering=-popularity (a stored, indexed counter)
+    ordering_fields = ['lighter_type', 'name', 'price', 'created_at', 'popularity', 'units_sold', 'view_count']
     ordering = ['name']
     
     def get_queryset(self):
@@ -28,6 +34,15 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Product.objects.filter(is_active=True)
         return Product.objects.all()
     
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # Counted in the cache and flushed to the database later by flush_view_counts (when the cache is shared)
+        try:
+            record_view(kwargs['pk'])
+        except Exception as e:
+            logger.warning(f"Could not count a view of product {kwargs['pk']}: {e}")
+        return response
+
     def get_serializer_class(self):
         if self.action == 'list':
             return ProductListSerializer
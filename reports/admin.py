@@ -0,0 +1,59 @@
+from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .forms import SalesReportForm
+from .models import DailySales
+from .rollups import sales_report
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Read-only view of the rollups; they are only written by order payments and rebuilds"""
+    list_display = ['date', 'dimension', 'label', 'currency', 'revenue_display', 'units', 'orders']
+    list_filter = ['dimension', 'currency']
+    search_fields = ['key', 'label']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def revenue_display(self, obj):
+        """Display revenue in dollars"""
+        return f"${obj.revenue / 100:,.2f}"
+    revenue_display.short_description = 'Revenue'
+    revenue_display.admin_order_field = 'revenue'
+
+    def get_urls(self):
+        urls = [
+            path('report/', self.admin_site.admin_view(self.report_view), name='reports_dailysales_report'),
+        ]
+        return urls + super().get_urls()
+
+    def report_view(self, request):
+        """Revenue by day, week or month for a dimension, read from the rollups"""
+        form = SalesReportForm(request.GET)
+        results = []
+        if form.is_valid():
+            options = form.cleaned_data
+            results = sales_report(
+                options['dimension'], options['start'], options['end'],
+                period=options['period'], currency=options['currency'],
+            )
+            for row in results:
+                row['revenue_display'] = f"${row['revenue'] / 100:,.2f}"
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sales report',
+            'form': form,
+            'results': results,
+        }
+        return TemplateResponse(request, 'admin/reports/dailysales/report.html', context)
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django import forms
+from django.utils import timezone
+
+from .models import DailySales
+from .rollups import PERIODS
+
+DEFAULT_DAYS = 90
+MAX_DAYS = 5 * 366
+
+
+class SalesReportForm(forms.Form):
+    """Report options, shared by the admin page and the API; blank fields get defaults."""
+    dimension = forms.ChoiceField(choices=DailySales.DIMENSION_CHOICES, required=False)
+    period = forms.ChoiceField(choices=[(period, period.title()) for period in PERIODS], required=False)
+    start = forms.DateField(required=False, help_text=f"Default: {DEFAULT_DAYS} days before the end")
+    end = forms.DateField(required=False, help_text="Default: today")
+    currency = forms.CharField(max_length=10, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cleaned_data['dimension'] = cleaned_data.get('dimension') or 'total'
+        cleaned_data['period'] = cleaned_data.get('period') or 'day'
+        end = cleaned_data.get('end') or timezone.localdate()
+        start = cleaned_data.get('start') or end - timedelta(days=DEFAULT_DAYS - 1)
+        if start > end:
+            raise forms.ValidationError("start must not be after end")
+        if (end - start).days >= MAX_DAYS:
+            raise forms.ValidationError(f"Reports cover at most {MAX_DAYS} days")
+        cleaned_data['start'], cleaned_data['end'] = start, end
+        cleaned_data['currency'] = (cleaned_data.get('currency') or '').lower()
+        return cleaned_data
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.models import Order
+from reports.rollups import SALE_STATUSES, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from paid orders (live orders only: skip archived months)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='First day to rebuild, YYYY-MM-DD (default: day of the first paid order)'
+        )
+        parser.add_argument(
+            '--until',
+            help='Last day to rebuild, YYYY-MM-DD (default: today)'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Days aggregated and replaced per step (default: 31)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the rollups without replacing the stored ones'
+        )
+
+    def _parse_day(self, value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return day
+
+    def handle(self, *args, **options):
+        until = self._parse_day(options['until']) if options['until'] else timezone.localdate()
+        if options['since']:
+            since = self._parse_day(options['since'])
+        else:
+            first = Order.objects.filter(status__in=SALE_STATUSES).aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write("No paid orders - nothing to rebuild")
+                return
+            since = timezone.localdate(first)
+
+        if since > until:
+            raise CommandError("--since must not be after --until")
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1")
+
+        prefix = "[DRY RUN] " if options['dry_run'] else ""
+        self.stdout.write(f"{prefix}Rebuilding sales rollups for {since} to {until}...")
+        stats = rebuild_rollups(since, until, chunk_days=options['chunk_days'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Rebuilt {stats['days']} day(s) in {stats['chunks']} chunk(s): {stats['rows']} rollup row(s)"
+        ))
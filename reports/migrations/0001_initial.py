@@ -0,0 +1,65 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("product", "Product"),
+                            ("category", "Category"),
+                            ("lighter_type", "Lighter type"),
+                            ("country", "Country"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True,
+                        help_text="Id or code of the dimension value",
+                        max_length=100,
+                    ),
+                ),
+                ("label", models.CharField(blank=True, max_length=255)),
+                ("currency", models.CharField(default="usd", max_length=10)),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+                ("orders", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Daily sales",
+                "ordering": ["-date", "dimension", "-revenue"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dimension", "date", "key", "currency"),
+                        name="daily_sales_unique_key",
+                    )
+                ],
+            },
+        ),
+    ]
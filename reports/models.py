@@ -0,0 +1,47 @@
+from django.db import models
+
+
+class DailySales(models.Model):
+    """
+    Paid sales for one day, summed per value of one dimension.
+
+    Rows are incremented as orders are paid (see reports.rollups) and can be
+    recomputed from the orders with the rebuild_sales_rollups command, so
+    reports read O(days) rows instead of scanning orders.
+
+    Product, category and lighter type rows count item revenue (unit price x
+    quantity) and the orders containing such items; total and country rows
+    count each order's amount_total, which includes shipping and custom orders.
+    """
+    DIMENSION_CHOICES = (
+        ("total", "Total"),
+        ("product", "Product"),
+        ("category", "Category"),
+        ("lighter_type", "Lighter type"),
+        ("country", "Country"),
+    )
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=100, blank=True, help_text="Id or code of the dimension value")
+    label = models.CharField(max_length=255, blank=True)
+    currency = models.CharField(max_length=10, default="usd")
+
+    revenue = models.BigIntegerField(default=0)  # cents
+    units = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+        ordering = ['-date', 'dimension', '-revenue']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'date', 'key', 'currency'],
+                name='daily_sales_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.dimension} {self.label or self.key}: {self.revenue / 100:.2f} {self.currency}"
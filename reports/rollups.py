@@ -0,0 +1,225 @@
+"""
+Daily sales rollups.
+
+``record_paid_order`` adds an order to the DailySales rows for its day as it
+is paid, in the same transaction. ``rebuild_rollups`` recomputes a range of
+days from the orders, a chunk of days at a time, with database aggregation.
+``sales_report`` reads the rollups grouped by day, week or month.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from .models import DailySales
+
+logger = logging.getLogger(__name__)
+
+# Orders that count as sales
+SALE_STATUSES = ('paid', 'shipped')
+
+LIGHTER_TYPE_LABELS = {str(value): label for value, label in Product.LIGHTER_TYPE_CHOICES}
+
+PERIODS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _increment(date, dimension, key, label, currency, revenue, units, orders):
+    rows = DailySales.objects.filter(date=date, dimension=dimension, key=key, currency=currency)
+    changes = {
+        'revenue': F('revenue') + revenue,
+        'units': F('units') + units,
+        'orders': F('orders') + orders,
+        'label': label,
+        'updated_at': timezone.now(),
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(
+                date=date, dimension=dimension, key=key, label=label, currency=currency,
+                revenue=revenue, units=units, orders=orders,
+            )
+    except IntegrityError:
+        # Another order for the same day created the row first
+        rows.update(**changes)
+
+
+def record_paid_order(order):
+    """
+    Add a newly paid order to the daily rollups.
+
+    Call once, in the transaction that marks the order paid, so a rollback
+    undoes both. The day is the order's (local) creation date, as in rebuilds.
+    """
+    day = timezone.localdate(order.created_at)
+    currency = order.currency
+
+    # Revenue and units per dimension value the order's items fall under
+    sums = defaultdict(lambda: [0, 0])
+    labels = {}
+    for item in order.items.select_related('product__category'):
+        product = item.product
+        category = product.category
+        keys = (
+            ('product', product.id, product.name),
+            ('category', str(category.id) if category else '', category.name if category else 'Uncategorized'),
+            ('lighter_type', str(product.lighter_type), LIGHTER_TYPE_LABELS.get(str(product.lighter_type), '')),
+        )
+        for dimension, key, label in keys:
+            sums[dimension, key][0] += item.unit_price * item.quantity
+            sums[dimension, key][1] += item.quantity
+            labels[dimension, key] = label
+    units = sum(units for (dimension, _), (_, units) in sums.items() if dimension == 'product')
+
+    country = order.shipping_country
+    _increment(day, 'total', '', 'Total', currency, order.amount_total, units, 1)
+    _increment(day, 'country', country, country or 'Unknown', currency, order.amount_total, units, 1)
+    for (dimension, key), (revenue, item_units) in sums.items():
+        _increment(day, dimension, key, labels[dimension, key], currency, revenue, item_units, 1)
+
+
+def _label(dimension, key, name):
+    if dimension == 'total':
+        return 'Total'
+    if dimension == 'lighter_type':
+        return LIGHTER_TYPE_LABELS.get(key, '')
+    if not key:
+        return 'Uncategorized' if dimension == 'category' else 'Unknown'
+    return name or key
+
+
+def _day_rollups(start, end):
+    """DailySales rows (unsaved) for paid orders created on days start..end, aggregated in the database."""
+    orders = Order.objects.filter(
+        status__in=SALE_STATUSES,
+        created_at__date__gte=start,
+        created_at__date__lte=end,
+    )
+    items = OrderItem.objects.filter(order__in=orders)
+
+    # (dimension, rows to group, key expression, label expression, revenue expression)
+    groupings = (
+        ('total', orders, Value(''), None, 'amount_total'),
+        ('country', orders, F('shipping_country'), None, 'amount_total'),
+        ('product', items, F('product_id'), F('product__name'), F('unit_price') * F('quantity')),
+        ('category', items, F('product__category_id'), F('product__category__name'), F('unit_price') * F('quantity')),
+        ('lighter_type', items, F('product__lighter_type'), None, F('unit_price') * F('quantity')),
+    )
+
+    # Units of the order-level rows come from the orders' items
+    order_units = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+        units=Sum('quantity'),
+    ).values('units')
+
+    rows = {}
+    for dimension, queryset, key, label, revenue in groupings:
+        prefix = '' if queryset is orders else 'order__'
+        annotations = {
+            'day': TruncDate(f'{prefix}created_at'),
+            'sale_currency': F(f'{prefix}currency'),
+            'dimension_key': key,
+            'dimension_label': label if label is not None else Value(''),
+        }
+        if queryset is orders:
+            queryset = queryset.annotate(item_units=Coalesce(Subquery(order_units), 0))
+            units, count = Sum('item_units'), Count('pk')
+        else:
+            units, count = Sum('quantity'), Count('order', distinct=True)
+
+        grouped = queryset.annotate(**annotations).values(
+            'day', 'sale_currency', 'dimension_key', 'dimension_label',
+        ).annotate(revenue=Sum(revenue), units=units, orders=count).order_by()
+
+        for row in grouped:
+            row_key = '' if row['dimension_key'] is None else str(row['dimension_key'])
+            # Products without a category and orders without a country go under the empty key
+            unique = (row['day'], dimension, row_key, row['sale_currency'])
+            if unique not in rows:
+                rows[unique] = DailySales(
+                    date=row['day'], dimension=dimension, key=row_key,
+                    label=_label(dimension, row_key, row['dimension_label']),
+                    currency=row['sale_currency'],
+                )
+            rollup = rows[unique]
+            rollup.revenue += row['revenue'] or 0
+            rollup.units += row['units'] or 0
+            rollup.orders += row['orders']
+    return list(rows.values())
+
+
+def rebuild_rollups(start, end, chunk_days=31, dry_run=False):
+    """
+    Recompute the rollups for days start..end (inclusive) from the orders.
+
+    Works through the range ``chunk_days`` at a time, replacing each chunk's
+    rows. The whole rebuild is one transaction and, on PostgreSQL, holds an
+    exclusive lock on the rollup table, so orders paid meanwhile wait to be
+    added until the rebuild has committed and are neither lost nor counted twice.
+
+    Only live orders are read, so don't rebuild months archive_orders has
+    already moved out (their rollups would be lost).
+
+    Returns a dict of counts: days, chunks and rows.
+    """
+    stats = {'days': (end - start).days + 1, 'chunks': 0, 'rows': 0}
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and not dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {DailySales._meta.db_table} IN EXCLUSIVE MODE')
+
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+            rows = _day_rollups(chunk_start, chunk_end)
+            if not dry_run:
+                DailySales.objects.filter(date__gte=chunk_start, date__lte=chunk_end).delete()
+                DailySales.objects.bulk_create(rows, batch_size=1000)
+            stats['chunks'] += 1
+            stats['rows'] += len(rows)
+            logger.info(f"Rebuilt sales rollups for {chunk_start} to {chunk_end}: {len(rows)} row(s)")
+            chunk_start = chunk_end + timedelta(days=1)
+    return stats
+
+
+def sales_report(dimension, start, end, period='day', currency=None):
+    """
+    Revenue, units and orders per ``period`` (day, week or month) for each value of
+    ``dimension`` between two dates, read from the rollups.
+    """
+    rows = DailySales.objects.filter(dimension=dimension, date__gte=start, date__lte=end)
+    if currency:
+        rows = rows.filter(currency=currency)
+
+    trunc = PERIODS[period]
+    rows = rows.annotate(period=trunc('date') if trunc else F('date'))
+    grouped = rows.values('period', 'key', 'currency').annotate(
+        revenue=Sum('revenue'),
+        units=Sum('units'),
+        orders=Sum('orders'),
+    ).order_by('period', '-revenue', 'key')
+
+    # Latest label per key, e.g. after a product is renamed
+    labels = dict(rows.order_by('date').values_list('key', 'label'))
+    return [
+        {
+            'period': row['period'],
+            'key': row['key'],
+            'label': labels.get(row['key'], row['key']),
+            'currency': row['currency'],
+            'revenue': row['revenue'],
+            'units': row['units'],
+            'orders': row['orders'],
+        }
+        for row in grouped
+    ]
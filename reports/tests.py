@@ -0,0 +1,105 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .models import DailySales
+from .rollups import rebuild_rollups, record_paid_order, sales_report
+
+
+class SalesRollupTests(TestCase):
+    """Rollups kept up as orders are paid match a rebuild from the orders."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cases = Category.objects.create(name='Lighter Cases', slug='lighter-cases')
+        cls.classic = Product.objects.create(
+            id='prod_classic', name='Sunset Case', slug='sunset-case', price=2500, category=cases,
+        )
+        cls.mini = Product.objects.create(
+            id='prod_mini', name='Tiny Case', slug='tiny-case', price=1800,
+            lighter_type=Product.LIGHTER_TYPE_MINI,
+        )
+
+    def make_paid_order(self, day, items, country='US', currency='usd'):
+        order = Order.objects.create(
+            id=uuid.uuid4(),
+            stripe_session_id=f'cs_test_{uuid.uuid4().hex}',
+            amount_total=sum(product.price * quantity for product, quantity in items) + 500,
+            currency=currency,
+            status='paid',
+            shipping_address={'country': country} if country else None,
+        )
+        Order.objects.filter(pk=order.pk).update(
+            created_at=datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=12)
+        )
+        order.refresh_from_db()
+        for product, quantity in items:
+            OrderItem.objects.create(order=order, product=product, unit_price=product.price, quantity=quantity)
+        record_paid_order(order)
+        return order
+
+    def snapshot(self):
+        return sorted(
+            DailySales.objects.values_list('date', 'dimension', 'key', 'label', 'currency', 'revenue', 'units', 'orders')
+        )
+
+    def make_orders(self):
+        start = date(2026, 3, 2)
+        for i in range(40):
+            day = start + timedelta(days=i % 10)
+            items = [(self.classic, 1 + i % 3)]
+            if i % 4 == 0:
+                items.append((self.mini, 1))
+            self.make_paid_order(day, items, country=['US', 'ca', None][i % 3])
+        # A custom order: no items, counted in total and country only
+        self.make_paid_order(start, [], country='GB')
+        return start, start + timedelta(days=9)
+
+    def test_incremental_rollups_match_rebuild(self):
+        start, end = self.make_orders()
+        incremental = self.snapshot()
+
+        stats = rebuild_rollups(start, end, chunk_days=3)
+
+        self.assertEqual(stats['chunks'], 4)
+        self.assertEqual(self.snapshot(), incremental)
+        total = DailySales.objects.filter(dimension='total')
+        self.assertEqual(sum(row.orders for row in total), 41)
+        self.assertEqual(
+            sum(row.revenue for row in total),
+            sum(Order.objects.values_list('amount_total', flat=True)),
+        )
+
+    def test_report_reads_rollups_not_orders(self):
+        start, end = self.make_orders()
+        more_start = end + timedelta(days=1)
+        for i in range(30):
+            self.make_paid_order(more_start, [(self.classic, 1)])
+
+        # One query for the groups and one for the labels, however many orders there are
+        with self.assertNumQueries(2):
+            weeks = sales_report('category', start, more_start, period='week')
+        self.assertEqual({row['label'] for row in weeks}, {'Lighter Cases', 'Uncategorized'})
+        self.assertEqual(
+            sum(row['orders'] for row in weeks if row['label'] == 'Lighter Cases'), 70
+        )
+
+    def test_api_is_staff_only(self):
+        start, end = self.make_orders()
+        params = {'dimension': 'lighter_type', 'period': 'month', 'start': start, 'end': end}
+
+        self.assertEqual(self.client.get('/api/reports/sales/', params).status_code, 403)
+
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get('/api/reports/sales/', params)
+        self.assertEqual(response.status_code, 200)
+        labels = {row['label']: row['units'] for row in response.json()['results']}
+        self.assertEqual(set(labels), {'Classic BIC', 'Mini BIC'})
+        self.assertEqual(labels['Mini BIC'], 10)
+
+        self.assertEqual(self.client.get('/api/reports/sales/', {'period': 'year'}).status_code, 400)
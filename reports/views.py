@@ -0,0 +1,32 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .forms import SalesReportForm
+from .rollups import sales_report
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_sales_report(request):
+    """
+    Sales per day, week or month for one dimension (total, product, category,
+    lighter_type or country), read from the daily rollups. Staff only.
+    """
+    form = SalesReportForm(request.query_params)
+    if not form.is_valid():
+        return Response({'error': form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    options = form.cleaned_data
+    results = sales_report(
+        options['dimension'], options['start'], options['end'],
+        period=options['period'], currency=options['currency'],
+    )
+    return Response({
+        'dimension': options['dimension'],
+        'period': options['period'],
+        'start': options['start'],
+        'end': options['end'],
+        'results': results,
+    })
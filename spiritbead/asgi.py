@@ -2,6 +2,8 @@
 ASGI config for spiritbead project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serving through an ASGI server (e.g. ``uvicorn spiritbead.asgi:application``)
+runs async views such as the async checkout endpoint natively on the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -0,0 +1,214 @@
+"""
+Structured logging for the payment, order and custom-order paths.
+
+Records are written as one JSON object per line by a background thread
+(``QueueingHandler``), so a slow stdout under pm2 never blocks a request or a
+webhook worker. Each record carries the correlation id of the request or
+webhook event it belongs to, secrets and customer PII are redacted before the
+record leaves the calling thread, and debug-level detail is kept only for a
+configurable sample of requests.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import re
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_request_id = contextvars.ContextVar('request_id', default='-')
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+def get_request_id():
+    """The correlation id of the current request or webhook event, or '-' outside one."""
+    return _request_id.get()
+
+
+@contextmanager
+def bind_request_id(request_id):
+    """Tag every record logged inside the block with ``request_id``."""
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class RequestIDMiddleware:
+    """
+    Bind a correlation id for the request and echo it back in X-Request-ID.
+    An incoming X-Request-ID (e.g. from a proxy) is reused when it looks sane.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _request_id(self, request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        return incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with bind_request_id(self._request_id(request)) as request_id:
+            response = self.get_response(request)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def __acall__(self, request):
+        with bind_request_id(self._request_id(request)) as request_id:
+            response = await self.get_response(request)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class RequestIDFilter(logging.Filter):
+    """Stamp records with the current correlation id."""
+
+    def filter(self, record):
+        record.request_id = get_request_id()
+        return True
+
+
+class DebugSampleFilter(logging.Filter):
+    """
+    Keep DEBUG records for roughly ``rate`` of correlation ids (0.0 - 1.0).
+    The decision is made per id, so a sampled request keeps all of its detail.
+    """
+
+    def __init__(self, rate=0.0):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, float(rate))) * 10000)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.threshold >= 10000:
+            return True
+        return zlib.crc32(get_request_id().encode()) % 10000 < self.threshold
+
+
+# Structured fields that hold customer PII; their values are never logged
+SENSITIVE_FIELDS = {
+    'address', 'customer_details', 'customer_email', 'customer_name', 'email', 'phone',
+    'shipping_address', 'shipping_details',
+}
+
+_SECRET_PATTERNS = [
+    # Stripe API keys and webhook signing secrets
+    (re.compile(r'\b(sk|rk|whsec)_(live_|test_)?[A-Za-z0-9]+'), r'\1_[REDACTED]'),
+    # Stripe-Signature header values
+    (re.compile(r'\b(v1|v0)=[0-9a-f]{16,}'), r'\1=[REDACTED]'),
+    (re.compile(r'(?i)\b(api[_-]?key|secret|password|token)(["\']?\s*[:=]\s*["\']?)[^\s,"\'}]+'), r'\1\2[REDACTED]'),
+]
+_EMAIL_PATTERN = re.compile(r'\b([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b')
+
+
+def redact(text):
+    """Mask secrets and email addresses in a log message."""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return _EMAIL_PATTERN.sub(r'\1***@\2', text)
+
+
+class RedactFilter(logging.Filter):
+    """Resolve the message, scrub secrets/PII from it and drop sensitive structured fields."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for field in SENSITIVE_FIELDS.intersection(record.__dict__):
+            setattr(record, field, '[REDACTED]')
+        return True
+
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, request id, message and extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = redact(record.exc_text)
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+_plain_formatter = logging.Formatter()
+
+
+class QueueingHandler(QueueHandler):
+    """
+    Non-blocking handler: the calling thread only enqueues the record and a
+    QueueListener thread formats and writes it. Records are dropped (and
+    counted) rather than blocking when the queue is full.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._listening = True
+        # Drain whatever is still queued when the process exits
+        atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Freeze what can't be read later: the message args and the live traceback.
+        # Filters have already run, so the record carries its request id.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stop_listener()
+        super().close()
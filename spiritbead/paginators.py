@@ -0,0 +1,35 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large admin changelists.
+
+    On PostgreSQL the row count comes from the planner's estimate (table
+    statistics, via EXPLAIN) instead of a full COUNT(*). Small results
+    (below ``exact_below`` estimated rows) are still counted exactly, so
+    page numbers stay accurate where they matter; other databases always
+    count exactly.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is None or estimate < self.exact_below:
+            return super().count
+        return estimate
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or connections[queryset.db].vendor != 'postgresql':
+            return None
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+        except Exception:
+            return None
+        return int(plan[0]['Plan']['Plan Rows'])
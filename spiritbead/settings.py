@@ -56,9 +56,12 @@ INSTALLED_APPS = [
     'payments',
     'orders',
     'custom_orders',
+    'notifications',
+    'reports',
 ]
 
 MIDDLEWARE = [
+    'spiritbead.log.RequestIDMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -174,11 +177,118 @@ REST_FRAMEWORK = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Emails link to small copies of product photos stored under MEDIA_ROOT/email/,
+# at MEDIA_BASE_URL (the public origin media is served from, e.g.
+# https://api.example.com). Their names are content hashes, so the web server
+# can serve /media/email/ with a far-future, immutable Cache-Control.
+# EMAIL_EMBED_IMAGES attaches them inline (cid:) instead, as happens when
+# MEDIA_BASE_URL is not set.
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")
+EMAIL_IMAGE_MAX_SIZE = int(os.getenv("EMAIL_IMAGE_MAX_SIZE", "600"))  # pixels, longest side
+EMAIL_EMBED_IMAGES = os.getenv("EMAIL_EMBED_IMAGES", "False").lower() in ("1", "true", "yes")
+
+# Custom order reference photos are re-encoded to WebP off the request path by
+# process_custom_order_images, no larger than this (pixels, longest side)
+CUSTOM_ORDER_IMAGE_MAX_SIZE = int(os.getenv("CUSTOM_ORDER_IMAGE_MAX_SIZE", "1600"))
+CUSTOM_ORDER_IMAGE_QUALITY = int(os.getenv("CUSTOM_ORDER_IMAGE_QUALITY", "80"))
+CUSTOM_ORDER_IMAGE_WORKERS = int(os.getenv("CUSTOM_ORDER_IMAGE_WORKERS", "2"))  # processes
+CUSTOM_ORDER_IMAGE_CLAIM_LEASE = int(os.getenv("CUSTOM_ORDER_IMAGE_CLAIM_LEASE", "300"))  # seconds
+
+# Cache
+# Uses Redis when REDIS_URL is set so short-lived state is shared across workers;
+# falls back to a per-process in-memory cache for local development.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Stripe settings
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+
+# Stripe HTTP client: keep-alive pool size, timeouts (seconds) and automatic retries
+STRIPE_HTTP_POOL_SIZE = int(os.getenv("STRIPE_HTTP_POOL_SIZE", "32"))
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "5"))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "30"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+
+# Webhook inbox worker (process_webhook_events)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_CLAIM_LEASE = int(os.getenv("WEBHOOK_CLAIM_LEASE", "300"))  # seconds
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
+# How long (seconds) a checkout response is replayed for duplicate submissions
+CHECKOUT_IDEMPOTENCY_TTL = int(os.getenv("CHECKOUT_IDEMPOTENCY_TTL", "600"))
+
+# Max concurrent Stripe calls from the async checkout view (per worker process)
+CHECKOUT_STRIPE_CONCURRENCY = int(os.getenv("CHECKOUT_STRIPE_CONCURRENCY", "32"))
+
+# Lifetime (seconds) of an idle server-side cart
+CART_TTL = int(os.getenv("CART_TTL", str(7 * 24 * 60 * 60)))
+
+# Order status summaries for the checkout success page: settled orders are cached
+# for ORDER_STATUS_TTL seconds, pending (or unknown) ones only briefly while the page polls
+ORDER_STATUS_TTL = int(os.getenv("ORDER_STATUS_TTL", str(24 * 60 * 60)))
+ORDER_STATUS_PENDING_TTL = int(os.getenv("ORDER_STATUS_PENDING_TTL", "5"))
+# Longest a status request may wait for the order to change (long-poll), in seconds
+ORDER_STATUS_MAX_WAIT = int(os.getenv("ORDER_STATUS_MAX_WAIT", "20"))
+
+# Pending orders older than this (hours) are expired by expire_pending_orders.
+# Stripe Checkout Sessions expire after 24 hours by default.
+PENDING_ORDER_EXPIRY_HOURS = float(os.getenv("PENDING_ORDER_EXPIRY_HOURS", "24"))
+
+# Logging: JSON lines written off the request thread, tagged with the request id
+# (X-Request-ID) and redacted. LOG_DEBUG_SAMPLE_RATE keeps debug detail for that
+# fraction of requests (default: all of them when LOG_LEVEL=DEBUG, none otherwise).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1" if LOG_LEVEL == "DEBUG" else "0"))
+APP_LOG_LEVEL = "DEBUG" if LOG_DEBUG_SAMPLE_RATE > 0 else LOG_LEVEL
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'spiritbead.log.RequestIDFilter'},
+        'redact': {'()': 'spiritbead.log.RedactFilter'},
+        'debug_sample': {'()': 'spiritbead.log.DebugSampleFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'spiritbead.log.JSONFormatter'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'spiritbead.log.QueueingHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+            'filters': ['request_id', 'debug_sample', 'redact'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'django': {'level': 'INFO'},
+        'payments': {'level': APP_LOG_LEVEL},
+        'orders': {'level': APP_LOG_LEVEL},
+        'custom_orders': {'level': APP_LOG_LEVEL},
+        'notifications': {'level': APP_LOG_LEVEL},
+        'products': {'level': APP_LOG_LEVEL},
+        'reports': {'level': APP_LOG_LEVEL},
+        'spiritbead': {'level': APP_LOG_LEVEL},
+    },
+}
+
 # Email settings (Mailgun via Anymail)
 EMAIL_BACKEND = 'anymail.backends.mailgun.EmailBackend'
 ANYMAIL = {
@@ -187,3 +297,10 @@ ANYMAIL = {
 }
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'lynn.braveheart@thebeadedcase.com')
 SERVER_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'lynn.braveheart@thebeadedcase.com')
+
+# Email outbox worker (send_queued_emails)
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_CLAIM_LEASE = int(os.getenv("EMAIL_CLAIM_LEASE", "300"))  # seconds
+# Recipients per Mailgun batch send (Mailgun allows up to 1000)
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "1000"))
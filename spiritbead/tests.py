@@ -0,0 +1,107 @@
+import json
+import logging
+from io import StringIO
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from spiritbead.log import (
+    REQUEST_ID_HEADER, JSONFormatter, RedactFilter, RequestIDFilter, RequestIDMiddleware, bind_request_id,
+    get_request_id,
+)
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    """Records are stamped with the request id, scrubbed of secrets and PII, and written as JSON."""
+
+    def setUp(self):
+        self.stream = StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.addFilter(RequestIDFilter())
+        handler.addFilter(RedactFilter())
+        handler.setFormatter(JSONFormatter())
+        self.logger = logging.getLogger('spiritbead.tests')
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, handler)
+
+    def entries(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_pii_in_extra_fields_is_redacted(self):
+        self.logger.info(
+            'Session %s paid by jane.doe@example.com', 'cs_1',
+            extra={
+                'customer_details': {'email': 'jane.doe@example.com', 'name': 'Jane Doe'},
+                'shipping_details': {'address': {'line1': '1 Main St'}},
+                'session_id': 'cs_1',
+            },
+        )
+
+        [entry] = self.entries()
+        self.assertEqual(entry['message'], 'Session cs_1 paid by j***@example.com')
+        self.assertEqual(entry['customer_details'], '[REDACTED]')
+        self.assertEqual(entry['shipping_details'], '[REDACTED]')
+        self.assertEqual(entry['session_id'], 'cs_1')
+        self.assertNotIn('Main St', self.stream.getvalue())
+
+    def test_secrets_are_masked_in_messages_and_tracebacks(self):
+        try:
+            raise ValueError('Invalid API key provided: sk_live_abc123')
+        except ValueError:
+            self.logger.exception('Stripe call failed with whsec_abc123 and t=1,v1=0123456789abcdef0123')
+
+        [entry] = self.entries()
+        self.assertEqual(entry['message'], 'Stripe call failed with whsec_[REDACTED] and t=1,v1=[REDACTED]')
+        self.assertIn('ValueError: Invalid API key provided: sk_[REDACTED]', entry['exc'])
+        self.assertNotIn('abc123', self.stream.getvalue())
+
+    def test_json_lines_carry_the_bound_request_id(self):
+        self.logger.warning('outside')
+        with bind_request_id('evt_outer'):
+            with bind_request_id('evt_inner'):
+                self.logger.warning('inner', extra={'attempts': 2, 'when': object()})
+            self.logger.warning('outer')
+
+        entries = self.entries()
+        self.assertEqual([(e['request_id'], e['message']) for e in entries],
+                         [('-', 'outside'), ('evt_inner', 'inner'), ('evt_outer', 'outer')])
+        self.assertEqual(set(entries[0]), {'ts', 'level', 'logger', 'request_id', 'message'})
+        self.assertEqual(entries[1]['level'], 'WARNING')
+        self.assertEqual(entries[1]['attempts'], 2)
+        # Values JSON can't encode are written as their str()
+        self.assertTrue(entries[1]['when'].startswith('<object object'))
+
+
+class RequestIDMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def view(self, request):
+        self.seen.append(get_request_id())
+        return HttpResponse()
+
+    async def async_view(self, request):
+        return self.view(request)
+
+    def test_incoming_request_id_is_reused_and_echoed(self):
+        response = RequestIDMiddleware(self.view)(self.factory.get('/', HTTP_X_REQUEST_ID='edge-1234'))
+
+        self.assertEqual(response[REQUEST_ID_HEADER], 'edge-1234')
+        self.assertEqual(self.seen, ['edge-1234'])
+        self.assertEqual(get_request_id(), '-')
+
+    def test_malformed_request_id_is_replaced(self):
+        for incoming in ('', 'has spaces', 'x' * 65, '<script>'):
+            with self.subTest(incoming=incoming):
+                response = RequestIDMiddleware(self.view)(self.factory.get('/', HTTP_X_REQUEST_ID=incoming))
+                self.assertRegex(response[REQUEST_ID_HEADER], r'^[0-9a-f]{32}$')
+                self.assertEqual(self.seen[-1], response[REQUEST_ID_HEADER])
+
+    async def test_async_requests_get_an_id(self):
+        response = await RequestIDMiddleware(self.async_view)(self.factory.get('/', HTTP_X_REQUEST_ID='edge-async'))
+
+        self.assertEqual(response[REQUEST_ID_HEADER], 'edge-async')
+        self.assertEqual(self.seen, ['edge-async'])
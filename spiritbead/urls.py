@@ -24,6 +24,8 @@ urlpatterns = [
     path('api/', include('products.urls')),
     path('api/payments/', include('payments.urls')),
     path('api/custom-orders/', include('custom_orders.urls')),
+    path('api/orders/', include('orders.urls')),
+    path('api/reports/', include('reports.urls')),
 ]
 
 if settings.DEBUG: